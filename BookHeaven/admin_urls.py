@@ -0,0 +1,6 @@
+from django.contrib import admin
+
+# With LEAN_STARTUP the admin app does not autodiscover at startup; do it on the first admin hit.
+admin.autodiscover()
+
+urlpatterns = admin.site.get_urls()
@@ -2,6 +2,11 @@
 ASGI config for BookHeaven project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Requests are routed through ``BookHeaven.asgi_urls``, which serves the public
+catalog reads (books, authors, categories) from async views and everything
+else from the regular URLconf. Run it with any ASGI server, e.g.
+
+    uvicorn BookHeaven.asgi:application --workers 4
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -9,8 +14,19 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+from django.core.handlers.asgi import ASGIHandler, ASGIRequest
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'BookHeaven.settings')
 
-application = get_asgi_application()
+
+class CatalogASGIRequest(ASGIRequest):
+    urlconf = 'BookHeaven.asgi_urls'
+
+
+class CatalogASGIHandler(ASGIHandler):
+    request_class = CatalogASGIRequest
+
+
+django.setup(set_prefix=False)
+application = CatalogASGIHandler()
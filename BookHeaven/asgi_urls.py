@@ -0,0 +1,15 @@
+from django.urls import path
+from book import async_views
+from BookHeaven.urls import urlpatterns as sync_urlpatterns
+
+
+# URLconf of the ASGI entry point: the public catalog reads are answered by
+# async views, everything else resolves exactly as under WSGI.
+urlpatterns = [
+    path('api/v1/books/', async_views.book_list),
+    path('api/v1/books/<int:pk>/', async_views.book_detail),
+    path('api/v1/authors/', async_views.author_list),
+    path('api/v1/authors/<int:pk>/', async_views.author_detail),
+    path('api/v1/categories/', async_views.category_list),
+    path('api/v1/categories/<int:pk>/', async_views.category_detail),
+] + sync_urlpatterns
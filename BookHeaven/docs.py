@@ -0,0 +1,20 @@
+from drf_yasg import openapi
+from rest_framework import permissions
+from drf_yasg.views import get_schema_view
+
+
+schema_view = get_schema_view(
+   openapi.Info(
+      title="BookHeaven - Library Management API",
+      default_version='v1',
+      description="API documentation for Library Management System.",
+      terms_of_service="https://www.google.com/policies/terms/",
+      contact=openapi.Contact(email="contact@bookheaven.com"),
+      license=openapi.License(name="BSD License"),
+   ),
+   public=True,
+   permission_classes=(permissions.AllowAny,),
+)
+
+swagger_view = schema_view.with_ui('swagger', cache_timeout=0)
+redoc_view = schema_view.with_ui('redoc', cache_timeout=0)
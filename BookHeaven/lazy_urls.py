@@ -0,0 +1,18 @@
+from django.urls import URLResolver
+from django.utils.module_loading import import_string
+from django.urls.resolvers import RoutePattern
+
+
+def lazy_include(route, urlconf, app_name=None, namespace=None):
+    """
+    Like path(route, include(urlconf)), but the urlconf module is only
+    imported the first time a URL under `route` is resolved or reversed.
+    """
+    return URLResolver(RoutePattern(route, is_endpoint=False), urlconf, app_name=app_name, namespace=namespace)
+
+
+def lazy_view(dotted_path):
+    """A view that imports the view at `dotted_path` the first time it is called."""
+    def view(request, *args, **kwargs):
+        return import_string(dotted_path)(request, *args, **kwargs)
+    return view
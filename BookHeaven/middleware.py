@@ -0,0 +1,108 @@
+import random
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from whitenoise.middleware import WhiteNoiseMiddleware
+from BookHeaven import profiling
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoiseMiddleware that also runs natively under ASGI. The stock one is
+    sync-only, which makes Django run the whole middleware chain, and any
+    async view behind it, on a single worker thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
+
+
+class ProfilingMiddleware:
+    """
+    Production-safe request profiling, enabled with PROFILING. A random
+    PROFILING_SAMPLE_RATE share of requests records wall time, query count
+    and time, serializer/render time and response size under its viewset
+    action (or URL pattern). Those requests get a Server-Timing header, and
+    the samples feed the staff-only /api/v1/profiling/ endpoint. Requests
+    that are not sampled only pay for one random() call.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.PROFILING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = settings.PROFILING_SAMPLE_RATE
+        profiling.instrument_serializers()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        profile = profiling.RequestProfile()
+        token = profiling.current_profile.set(profile)
+        try:
+            with profiling.wrap_queries(profile):
+                response = self.get_response(request)
+        finally:
+            profiling.current_profile.reset(token)
+        sample = self.sample(request, response, profile)
+        if sample is not None:
+            profiling.record(*sample)
+        return response
+
+    async def __acall__(self, request):
+        if random.random() >= self.sample_rate:
+            return await self.get_response(request)
+
+        profile = profiling.RequestProfile()
+        token = profiling.current_profile.set(profile)
+        # Async views run their queries on the request's thread-sensitive worker thread,
+        # whose connections are the ones to wrap.
+        queries = await sync_to_async(profiling.wrap_queries)(profile)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(queries.close)()
+            profiling.current_profile.reset(token)
+        sample = self.sample(request, response, profile)
+        if sample is not None:
+            await profiling.arecord(*sample)
+        return response
+
+    def process_template_response(self, request, response):
+        profile = profiling.current_profile.get()
+        if profile is not None:
+            profile.start_render(response)
+        return response
+
+    def sample(self, request, response, profile):
+        route = profiling.route_name(request)
+        if route is None:
+            return None
+        sample = profile.sample(response)
+        response['Server-Timing'] = profile.server_timing(sample)
+        return route, sample
@@ -0,0 +1,172 @@
+import time
+import hashlib
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import connections
+from django.core.cache import cache
+
+
+ROUTES_KEY = 'profile:routes'
+SAMPLES_KEY = 'profile:samples:{}'
+FIELDS = ('total_ms', 'queries', 'db_ms', 'serialize_ms', 'bytes')
+
+# The profile of the request being handled, if it was sampled; visible from sync_to_async threads too.
+current_profile = ContextVar('current_profile', default=None)
+
+
+class RequestProfile:
+    """Timings of one sampled request. `record_query` is installed with connection.execute_wrapper()."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.serialize_time = 0.0
+        self.serialize_depth = 0
+        self.render_started = None
+
+    def record_query(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += time.perf_counter() - started
+
+    def start_serializing(self):
+        self.serialize_depth += 1
+        return time.perf_counter()
+
+    def stop_serializing(self, started):
+        self.serialize_depth -= 1
+        if not self.serialize_depth:
+            self.serialize_time += time.perf_counter() - started
+
+    def start_render(self, response):
+        self.render_started = time.perf_counter()
+        response.add_post_render_callback(self.stop_render)
+
+    def stop_render(self, response):
+        self.serialize_time += time.perf_counter() - self.render_started
+
+    def sample(self, response):
+        if response.streaming:
+            size = int(response.get('Content-Length') or 0)
+        else:
+            size = len(response.content)
+        return (round((time.perf_counter() - self.started) * 1000, 3), self.queries,
+                round(self.db_time * 1000, 3), round(self.serialize_time * 1000, 3), size)
+
+    def server_timing(self, sample):
+        total, queries, db, serialize, _ = sample
+        return f'total;dur={total}, db;dur={db};desc="{queries} queries", serialize;dur={serialize}'
+
+
+def wrap_queries(profile):
+    """Install `profile.record_query` on this thread's connections; closing the returned stack removes it."""
+    stack = ExitStack()
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(profile.record_query))
+    return stack
+
+
+def view_route(match, method):
+    """`BookViewSet.list` for viewset actions, the URL pattern otherwise."""
+    view = match.func
+    cls, actions = getattr(view, 'cls', None), getattr(view, 'actions', None)
+    if cls is not None and actions:
+        return f'{cls.__name__}.{actions.get(method.lower(), method.lower())}'
+    if cls is not None:
+        return f'{cls.__name__}.{method.lower()}'
+    return f'{method} /{match.route}'
+
+
+def route_name(request):
+    match = request.resolver_match
+    return None if match is None else view_route(match, request.method)
+
+
+def samples_key(route):
+    return SAMPLES_KEY.format(hashlib.md5(route.encode()).hexdigest())
+
+
+def max_samples():
+    return getattr(settings, 'PROFILING_MAX_SAMPLES', 1000)
+
+
+def _append(samples, routes, route, sample):
+    samples = (samples or [])[-(max_samples() - 1):] + [sample]
+    routes = routes or set()
+    return samples, routes if route in routes else routes | {route}
+
+
+def record(route, sample):
+    # Read-modify-write, so concurrent samples can occasionally overwrite each other; fine for sampling.
+    key = samples_key(route)
+    stored = cache.get_many([key, ROUTES_KEY])
+    samples, routes = _append(stored.get(key), stored.get(ROUTES_KEY), route, sample)
+    cache.set_many({key: samples, ROUTES_KEY: routes}, timeout=None)
+
+
+async def arecord(route, sample):
+    key = samples_key(route)
+    stored = await cache.aget_many([key, ROUTES_KEY])
+    samples, routes = _append(stored.get(key), stored.get(ROUTES_KEY), route, sample)
+    await cache.aset_many({key: samples, ROUTES_KEY: routes}, timeout=None)
+
+
+def percentile(values, q):
+    return values[min(int(len(values) * q), len(values) - 1)]
+
+
+def summary():
+    """Per route: sample count and p50/p95/p99 of every recorded measure, slowest p95 first."""
+    routes = sorted(cache.get(ROUTES_KEY) or ())
+    stored = cache.get_many([samples_key(route) for route in routes])
+    rows = []
+    for route in routes:
+        samples = stored.get(samples_key(route))
+        if not samples:
+            continue
+        row = {'route': route, 'samples': len(samples)}
+        for index, field in enumerate(FIELDS):
+            values = sorted(sample[index] for sample in samples)
+            row[field] = {f'p{int(q * 100)}': percentile(values, q) for q in (0.5, 0.95, 0.99)}
+        rows.append(row)
+    return sorted(rows, key=lambda row: row['total_ms']['p95'], reverse=True)
+
+
+def reset():
+    routes = cache.get(ROUTES_KEY) or ()
+    cache.delete_many([samples_key(route) for route in routes] + [ROUTES_KEY])
+
+
+@contextmanager
+def serializing():
+    """Count the enclosed block as serializer time of the current sampled request."""
+    profile = current_profile.get()
+    if profile is None:
+        yield
+        return
+    started = profile.start_serializing()
+    try:
+        yield
+    finally:
+        profile.stop_serializing(started)
+
+
+def instrument_serializers():
+    """Time top-level `serializer.data` calls of sampled requests (nested serializers are part of their parent)."""
+    from rest_framework.serializers import BaseSerializer
+
+    data = BaseSerializer.data
+    if getattr(data.fget, 'profiled', False):
+        return
+
+    def profiled_data(serializer):
+        with serializing():
+            return data.fget(serializer)
+
+    profiled_data.profiled = True
+    BaseSerializer.data = property(profiled_data)
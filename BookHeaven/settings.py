@@ -1,9 +1,7 @@
 from pathlib import Path
+from decimal import Decimal
 from datetime import timedelta
-from decouple import config
-import cloudinary
-import cloudinary.uploader
-from cloudinary.utils import cloudinary_url
+from decouple import Csv, config
 
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -18,10 +16,14 @@ ALLOWED_HOSTS = [".vercel.app", '127.0.0.1']
 
 AUTH_USER_MODEL  = 'users.User'
 
+# Keep cold starts (e.g. a fresh serverless instance) small: admin modules are
+# discovered on the first admin request instead of at startup.
+LEAN_STARTUP = config('LEAN_STARTUP', default=True, cast=bool)
+
 
 INSTALLED_APPS = [
     'whitenoise.runserver_nostatic',
-    'django.contrib.admin',
+    'django.contrib.admin.apps.SimpleAdminConfig' if LEAN_STARTUP else 'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
     'django.contrib.sessions',
@@ -35,14 +37,14 @@ INSTALLED_APPS = [
     'api',
     'book',
     'users',
-    # "debug_toolbar",
+    'tasks',
 ]
 
 MIDDLEWARE = [
-    # "debug_toolbar.middleware.DebugToolbarMiddleware",
+    'BookHeaven.middleware.ProfilingMiddleware',
     "corsheaders.middleware.CorsMiddleware",
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'BookHeaven.middleware.AsyncWhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -85,26 +87,97 @@ CORS_ALLOWED_ORIGINS = [
     'https://book-heaven-client-xi.vercel.app',
 ] 
 
-# DATABASES = {
-#     'default': {
-#         'ENGINE': 'django.db.backends.sqlite3',
-#         'NAME': BASE_DIR / 'db.sqlite3',
-#     }
-# }
+# Offline runs (load tests, benchmarks, local development) can use SQLite instead:
+# SQLITE_PATH=bench.sqlite3. IMMEDIATE transactions take the write lock up front, so
+# concurrent writers queue for it instead of failing with "database is locked" midway.
+if config('SQLITE_PATH', default=''):
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': config('SQLITE_PATH'),
+            'OPTIONS': {
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': config('SQLITE_TIMEOUT', default=20, cast=float),
+                'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+            },
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': config('dbname'),
+            'USER': config('user'),
+            'PASSWORD': config('password'),
+            'HOST': config('host'),
+            'PORT': config('port'),
+            # Reuse connections across requests (and warm serverless invocations) instead of
+            # paying a TCP/TLS/auth handshake each time; health checks drop dead ones first.
+            'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=60, cast=int),
+            'CONN_HEALTH_CHECKS': config('DB_CONN_HEALTH_CHECKS', default=True, cast=bool),
+            'OPTIONS': {},
+        }
+    }
+
+    # Trigram lookups and the search indexes need it; it imports psycopg, so SQLite runs leave it out.
+    INSTALLED_APPS.append('django.contrib.postgres')
+
+    # Django's native connection pool (needs psycopg 3 with the pool extra: `psycopg[binary,pool]`).
+    # Pooled connections are returned to the pool after each request, so CONN_MAX_AGE must be 0.
+    if config('DB_POOL', default=False, cast=bool):
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': config('DB_POOL_MIN_SIZE', default=1, cast=int),
+            'max_size': config('DB_POOL_MAX_SIZE', default=5, cast=int),
+            'timeout': config('DB_POOL_TIMEOUT', default=10, cast=float),
+            'max_idle': config('DB_POOL_MAX_IDLE', default=300, cast=float),
+        }
 
 
-DATABASES = {
+
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': config('dbname'),
-        'USER': config('user'),
-        'PASSWORD': config('password'),
-        'HOST': config('host'),
-        'PORT': config('port')
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='bookheaven'),
     }
 }
 
+RESPONSE_CACHE_TIMEOUT = config('RESPONSE_CACHE_TIMEOUT', default=300, cast=int)
+
+# Sampled request profiling (Server-Timing headers and /api/v1/profiling/ for staff).
+PROFILING = config('PROFILING', default=False, cast=bool)
+PROFILING_SAMPLE_RATE = config('PROFILING_SAMPLE_RATE', default=0.05, cast=float)
+PROFILING_MAX_SAMPLES = config('PROFILING_MAX_SAMPLES', default=1000, cast=int)
+
+# Pre-rendered, precompressed book list pages under /api/v1/snapshots/, rebuilt in the background after catalog writes.
+CATALOG_SNAPSHOTS = config('CATALOG_SNAPSHOTS', default=False, cast=bool)
+CATALOG_SNAPSHOT_ROOT = config('CATALOG_SNAPSHOT_ROOT', default=str(BASE_DIR / 'snapshots'))
 
+# Default loan period (categories can set their own) and the late fee charged per overdue day, up to a cap.
+LOAN_PERIOD_DAYS = config('LOAN_PERIOD_DAYS', default=14, cast=int)
+OVERDUE_FINE_PER_DAY = config('OVERDUE_FINE_PER_DAY', default='0.25', cast=Decimal)
+OVERDUE_FINE_MAX = config('OVERDUE_FINE_MAX', default='10.00', cast=Decimal)
+
+# "Members who borrowed this also borrowed" (book/recommendations.py): books kept per book, and how many of
+# each member's distinct books (the first they borrowed) count towards co-borrowing, which bounds the work per member.
+RECOMMENDATIONS_TOP_K = config('RECOMMENDATIONS_TOP_K', default=10, cast=int)
+RECOMMENDATIONS_MEMBER_BOOKS = config('RECOMMENDATIONS_MEMBER_BOOKS', default=100, cast=int)
+
+# Background tasks (tasks/), run by `manage.py run_tasks` or the cron endpoint /api/v1/tasks/run/.
+# Failed tasks retry with exponential backoff; a task whose worker died is due again after the lease.
+TASKS_MAX_ATTEMPTS = config('TASKS_MAX_ATTEMPTS', default=5, cast=int)
+TASKS_RETRY_DELAY = config('TASKS_RETRY_DELAY', default=30, cast=int)
+TASKS_RETRY_MAX_DELAY = config('TASKS_RETRY_MAX_DELAY', default=3600, cast=int)
+TASKS_LEASE_SECONDS = config('TASKS_LEASE_SECONDS', default=300, cast=int)
+TASKS_CRON_SECRET = config('CRON_SECRET', default='')
+TASKS_CRON_SECONDS = config('TASKS_CRON_SECONDS', default=20, cast=float)
+# Uploads wait here for the worker. The default keeps them in the database, which every instance shares.
+TASKS_STAGING_STORAGE = {'BACKEND': config('TASKS_STAGING_STORAGE', default='tasks.storage.DatabaseStorage')}
+
+# Mail is queued with the request and sent by the task worker through TASKS_EMAIL_BACKEND.
+EMAIL_BACKEND = 'tasks.mail.QueuedEmailBackend'
+TASKS_EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.smtp.EmailBackend')
 
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -144,25 +217,43 @@ MEDIA_URL = '/media/'
 
 MEDIA_ROOT = BASE_DIR / 'media'
 
-cloudinary.config( 
-    cloud_name = config('cloud_name'),
-    api_key = config('api_key'), 
-    api_secret = config('api_secret'),
-    secure=True
-)
+# Applied by BookConfig.ready(), so importing settings does not pull in the Cloudinary SDK.
+CLOUDINARY = {
+    'cloud_name': config('cloud_name'),
+    'api_key': config('api_key'),
+    'api_secret': config('api_secret'),
+    'secure': True,
+}
+
+CLOUDINARY_STORAGE = {
+    'CLOUD_NAME': CLOUDINARY['cloud_name'],
+    'API_KEY': CLOUDINARY['api_key'],
+    'API_SECRET': CLOUDINARY['api_secret'],
+}
 
 DEFAULT_FILE_STORAGE = 'cloudinary_storage.storage.MediaCloudinaryStorage'
 
+# Resized WebP and JPEG/PNG renditions of book images (book/images.py) are stored through this backend;
+# django.core.files.storage.FileSystemStorage keeps them under MEDIA_ROOT instead, e.g. offline.
+BOOK_IMAGE_STORAGE = {'BACKEND': config('BOOK_IMAGE_STORAGE', default='cloudinary_storage.storage.MediaCloudinaryStorage')}
+BOOK_IMAGE_WIDTHS = config('BOOK_IMAGE_WIDTHS', default='160,320,640,1024', cast=Csv(int))
+
 
 
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
+# Stateless mode trusts the token's claims instead of loading the user on every request.
+JWT_STATELESS_AUTH = config('JWT_STATELESS_AUTH', default=False, cast=bool)
+# How long a worker may trust a cached token version; bounds how late a revocation is seen without a shared cache.
+JWT_TOKEN_VERSION_CACHE_TIMEOUT = config('JWT_TOKEN_VERSION_CACHE_TIMEOUT', default=60, cast=int)
+
 REST_FRAMEWORK = {
     'COERCE_DECIMAL_TO_STRING': False,
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.StatelessJWTAuthentication' if JWT_STATELESS_AUTH
+        else 'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
 }
 
@@ -170,6 +261,7 @@ REST_FRAMEWORK = {
 SIMPLE_JWT = {
    'AUTH_HEADER_TYPES': ('JWT',),
     "ACCESS_TOKEN_LIFETIME": timedelta(days=1),
+    "TOKEN_OBTAIN_SERIALIZER": 'users.serializers.TokenObtainPairSerializer',
 }
 
 DJOSER = {
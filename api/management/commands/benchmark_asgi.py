@@ -0,0 +1,122 @@
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref.util import setup_testing_defaults
+from django.test import override_settings
+from django.core.asgi import get_asgi_application
+from django.core.wsgi import get_wsgi_application
+from django.core.management.base import BaseCommand
+from book import synthetic
+from book.models import Category
+from BookHeaven.asgi import application as catalog_asgi_application
+
+
+class Command(BaseCommand):
+    help = ("Load-test the public catalog reads with N concurrent clients through the WSGI handler "
+            "(thread per client), the stock ASGI handler (sync DRF views) and the BookHeaven ASGI "
+            "entry point (async catalog views), and report requests/sec and tail latency. "
+            "The handlers are driven in-process, so the numbers compare the request paths without a "
+            "server in front; for an end-to-end run start `uvicorn BookHeaven.asgi:application` and "
+            "`gunicorn BookHeaven.wsgi:app` and point a load generator at both.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--concurrency', type=int, default=32)
+        parser.add_argument('--books', type=int, default=5_000, help="Synthetic catalog size.")
+        parser.add_argument('--path', action='append', dest='paths',
+                            help="Endpoint to request (repeatable); defaults to a mix of catalog reads.")
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--no-response-cache', action='store_true',
+                            help="Skip the shared response cache so every request reaches the database.")
+        parser.add_argument('--clear', action='store_true', help="Delete the synthetic data afterwards.")
+
+    def handle(self, *args, **options):
+        synthetic.generate_catalog(options['books'])
+        paths = options['paths'] or self.default_paths()
+        timeout = 0 if options['no_response_cache'] else 300
+        modes = [
+            ('wsgi (threads)', self.run_wsgi),
+            ('asgi (sync views)', lambda paths, options: self.run_asgi(get_asgi_application(), paths, options)),
+            ('asgi (async catalog)', lambda paths, options: self.run_asgi(catalog_asgi_application, paths, options)),
+        ]
+
+        self.stdout.write(f"{options['requests']} requests, {options['concurrency']} concurrent clients, "
+                          f"{len(paths)} endpoint(s), response cache {'off' if timeout == 0 else 'on'}")
+        self.stdout.write(f"{'mode':<22} {'req/sec':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+        with override_settings(RESPONSE_CACHE_TIMEOUT=timeout):
+            for label, run in modes:
+                run(paths[:1], {**options, 'requests': options['concurrency']})  # warm-up
+                started = time.perf_counter()
+                timings, errors = run(paths, options)
+                elapsed = time.perf_counter() - started
+                self.report(label, options['requests'] / elapsed, timings, errors)
+
+        if options['clear']:
+            synthetic.clear_catalog()
+
+    def default_paths(self):
+        books = synthetic.synthetic_books().order_by('id').values_list('id', flat=True)
+        category = Category.objects.order_by('id').values_list('id', flat=True).first()
+        paths = ['/api/v1/books/', '/api/v1/books/?page=2', '/api/v1/books/?fields=id,title',
+                 '/api/v1/authors/', '/api/v1/categories/']
+        paths += [f'/api/v1/books/{pk}/' for pk in books[:5]]
+        if category is not None:
+            paths += [f'/api/v1/categories/{category}/', f'/api/v1/books/?category={category}']
+        return paths
+
+    def run_wsgi(self, paths, options):
+        application = get_wsgi_application()
+
+        def request(index):
+            path, _, query = paths[index % len(paths)].partition('?')
+            environ = {'PATH_INFO': path, 'QUERY_STRING': query, 'HTTP_HOST': options['host']}
+            setup_testing_defaults(environ)
+            statuses = []
+            started = time.perf_counter()
+            response = application(environ, lambda status, headers, exc_info=None: statuses.append(status))
+            b''.join(response)
+            response.close()
+            return (time.perf_counter() - started) * 1000, not statuses[0].startswith('200')
+
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            results = list(pool.map(request, range(options['requests'])))
+        return [timing for timing, _ in results], sum(error for _, error in results)
+
+    def run_asgi(self, application, paths, options):
+        async def request(index, slots):
+            path, _, query = paths[index % len(paths)].partition('?')
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+                'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': query.encode(),
+                'root_path': '', 'headers': [(b'host', options['host'].encode())],
+                'server': (options['host'], 80), 'client': ('127.0.0.1', 50000),
+            }
+            received, statuses = [], []
+
+            async def receive():
+                if not received:
+                    received.append(True)
+                    return {'type': 'http.request', 'body': b'', 'more_body': False}
+                # The client never disconnects; Django cancels this once the response is sent.
+                await asyncio.Future()
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    statuses.append(message['status'])
+
+            async with slots:
+                started = time.perf_counter()
+                await application(scope, receive, send)
+                return (time.perf_counter() - started) * 1000, statuses[0] != 200
+
+        async def main():
+            slots = asyncio.Semaphore(options['concurrency'])
+            return await asyncio.gather(*(request(index, slots) for index in range(options['requests'])))
+
+        results = asyncio.run(main())
+        return [timing for timing, _ in results], sum(error for _, error in results)
+
+    def report(self, label, throughput, timings, errors):
+        timings = sorted(timings)
+        p50, p95, p99 = (timings[min(int(len(timings) * q), len(timings) - 1)] for q in (0.5, 0.95, 0.99))
+        self.stdout.write(f"{label:<22} {throughput:>9.0f} {p50:>8.2f} {p95:>8.2f} {p99:>8.2f} {errors:>7}")
@@ -0,0 +1,63 @@
+import time
+import statistics
+from wsgiref.util import setup_testing_defaults
+from django.core.wsgi import get_wsgi_application
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = ("Serve N requests through the WSGI handler and count how many database connections "
+            "(handshakes) they open, with the configured reuse settings and without any reuse.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--path', default='/api/v1/member/', help="An endpoint that queries the database.")
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        settings_dict = connection.settings_dict
+        pooled = bool(settings_dict['OPTIONS'].get('pool'))
+        configured = (f"pool {settings_dict['OPTIONS']['pool']}" if pooled else
+                      f"CONN_MAX_AGE={settings_dict['CONN_MAX_AGE']}, "
+                      f"CONN_HEALTH_CHECKS={settings_dict['CONN_HEALTH_CHECKS']}")
+
+        self.stdout.write(f"{options['requests']} x GET {options['path']} on {connection.vendor}")
+        self.stdout.write(f"{'mode':<48} {'handshakes':>10} {'mean ms':>9} {'p95 ms':>9}")
+        self.report(configured, *self.run(connection, options))
+        if pooled:
+            # The pool is created with the first connection and cannot be switched off in-process.
+            self.stdout.write("(no-reuse baseline skipped: run again with DB_POOL=False DB_CONN_MAX_AGE=0)")
+            return
+        max_age = settings_dict['CONN_MAX_AGE']
+        settings_dict['CONN_MAX_AGE'] = 0
+        try:
+            self.report('no reuse (CONN_MAX_AGE=0)', *self.run(connection, options))
+        finally:
+            settings_dict['CONN_MAX_AGE'] = max_age
+
+    def run(self, connection, options):
+        application = get_wsgi_application()
+        connection.close()
+        # Hold on to every DB-API connection seen so that object ids are never recycled;
+        # a pooled or persistent connection shows up again as the same object.
+        seen, timings = {}, []
+        for _ in range(options['requests']):
+            environ = {'PATH_INFO': options['path'], 'HTTP_HOST': options['host']}
+            setup_testing_defaults(environ)
+            started = time.perf_counter()
+            response = application(environ, lambda status, headers, exc_info=None: None)
+            raw = connection.connection
+            b''.join(response)
+            response.close()
+            timings.append((time.perf_counter() - started) * 1000)
+            if raw is not None:
+                seen.setdefault(id(raw), raw)
+        connection.close()
+        timings.sort()
+        return len(seen), statistics.mean(timings), timings[int(len(timings) * 0.95) - 1]
+
+    def report(self, label, handshakes, mean, p95):
+        self.stdout.write(f"{label:<48} {handshakes:>10} {mean:>9.2f} {p95:>9.2f}")
@@ -0,0 +1,84 @@
+import os
+import sys
+import json
+import time
+import statistics
+import subprocess
+from collections import defaultdict
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+# Runs in a fresh interpreter: import the WSGI entry point, then serve one request.
+SCRIPT = '''
+import sys, json, time
+started = time.perf_counter()
+from BookHeaven.wsgi import app
+loaded = time.perf_counter()
+from wsgiref.util import setup_testing_defaults
+environ = {'PATH_INFO': sys.argv[1], 'HTTP_HOST': sys.argv[2]}
+setup_testing_defaults(environ)
+statuses = []
+b''.join(app(environ, lambda status, headers, exc_info=None: statuses.append(status)))
+finished = time.perf_counter()
+print(json.dumps({'import': loaded - started, 'request': finished - loaded, 'status': statuses[0]}))
+'''
+
+
+def parse_importtime(stderr):
+    """Sum the self time (µs) of every module reported by -X importtime per top-level package."""
+    totals = defaultdict(int)
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        totals[name.strip().split('.')[0]] += int(self_us)
+    return totals
+
+
+class Command(BaseCommand):
+    help = "Measure cold-start cost: import time of the WSGI app and wall time to the first response."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/api/v1/books/', help="URL of the first request.")
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--top', type=int, default=15, help="Packages to list in the import breakdown.")
+        parser.add_argument('--budget-ms', type=float, help="Fail if the median time to first response exceeds this.")
+
+    def handle(self, *args, **options):
+        env = {
+            **os.environ,
+            'DJANGO_SETTINGS_MODULE': settings.SETTINGS_MODULE,
+            'PYTHONPATH': os.pathsep.join(filter(None, [str(settings.BASE_DIR), os.environ.get('PYTHONPATH')])),
+        }
+        walls, imports, requests, packages = [], [], [], defaultdict(list)
+        for _ in range(options['runs']):
+            started = time.perf_counter()
+            result = subprocess.run(
+                [sys.executable, '-X', 'importtime', '-c', SCRIPT, options['path'], options['host']],
+                cwd=settings.BASE_DIR, env=env, capture_output=True, text=True)
+            walls.append((time.perf_counter() - started) * 1000)
+            if result.returncode != 0:
+                raise CommandError(result.stderr.strip().splitlines()[-1])
+            timings = json.loads(result.stdout.strip().splitlines()[-1])
+            imports.append(timings['import'] * 1000)
+            requests.append(timings['request'] * 1000)
+            for package, self_us in parse_importtime(result.stderr).items():
+                packages[package].append(self_us / 1000)
+
+        self.stdout.write(f"First request: GET {options['path']} -> {timings['status']}")
+        self.stdout.write(f"{'':<28} {'median ms':>10} {'min ms':>10}")
+        for label, values in (('import BookHeaven.wsgi', imports), ('first request', requests),
+                              ('process wall time', walls)):
+            self.stdout.write(f"{label:<28} {statistics.median(values):>10.1f} {min(values):>10.1f}")
+
+        self.stdout.write(f"\nImport time by package (self, median of {options['runs']} runs):")
+        medians = sorted(((statistics.median(values), package) for package, values in packages.items()), reverse=True)
+        for value, package in medians[:options['top']]:
+            self.stdout.write(f"  {value:>8.1f} ms  {package}")
+
+        budget = options['budget_ms']
+        first_response = statistics.median(walls)
+        if budget is not None and first_response > budget:
+            raise CommandError(f"Time to first response {first_response:.1f} ms exceeds the {budget:.1f} ms budget.")
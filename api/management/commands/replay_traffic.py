@@ -0,0 +1,99 @@
+import json
+from django.db import connection
+from django.core.wsgi import get_wsgi_application
+from django.core.management.base import BaseCommand, CommandError
+from api import traffic
+from book.models import Book, BorrowRecord
+
+
+class Command(BaseCommand):
+    help = ("Replay a JSONL traffic log (api/benchmarks/traffic.jsonl by default, which touches every API route) "
+            "through the WSGI handler in-process and report throughput plus p50/p95/p99 latency, query counts "
+            "and status classes per endpoint. --write-baseline saves the numbers as JSON; --baseline compares "
+            "against a saved run and fails on server errors, extra queries or slower endpoints. Works offline "
+            "on whatever database is configured; fill it first with generate_synthetic_data.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--traffic', default=str(traffic.DEFAULT_LOG), help="JSONL traffic log to replay.")
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--warmup', type=int, default=50, help="Requests sent first and left out of the numbers.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--write-baseline', metavar='PATH', help="Save this run's numbers as a baseline.")
+        parser.add_argument('--baseline', metavar='PATH', help="Fail if this run regressed against a saved baseline.")
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help="Allowed relative slowdown of latency and throughput (default 0.25).")
+        parser.add_argument('--latency-slack-ms', type=float, default=5.0,
+                            help="Allowed absolute latency slowdown on top of --tolerance (default 5 ms).")
+        parser.add_argument('--percentile', choices=('p50', 'p95', 'p99'), default='p50',
+                            help="Latency percentile compared with the baseline. In-process tails are dominated by "
+                                 "thread scheduling, so p95/p99 want many requests per endpoint (default p50).")
+        parser.add_argument('--min-samples', type=int, default=20,
+                            help="Only compare the latency of endpoints with at least this many requests.")
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError("--requests and --concurrency must be positive.")
+        try:
+            entries = traffic.load_traffic(options['traffic'])
+        except (OSError, ValueError) as error:
+            raise CommandError(str(error))
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline'], encoding='utf-8') as stream:
+                    baseline = json.load(stream)
+            except (OSError, ValueError) as error:
+                raise CommandError(f"Can't read baseline: {error}")
+
+        application = get_wsgi_application()
+        fixtures = traffic.Fixtures()
+        run = dict(application=application, entries=entries, fixtures=fixtures,
+                   concurrency=options['concurrency'], host=options['host'])
+        try:
+            if options['warmup']:
+                traffic.replay(requests=options['warmup'], seed=options['seed'] - 1, **run)
+            results, elapsed = traffic.replay(requests=options['requests'], seed=options['seed'], **run)
+        except ValueError as error:
+            raise CommandError(str(error))
+
+        summary = traffic.summarize(results, elapsed)
+        summary.update({
+            'database': connection.vendor,
+            'books': Book.objects.count(),
+            'borrow_records': BorrowRecord.objects.count(),
+            'concurrency': options['concurrency'],
+            'seed': options['seed'],
+            'traffic': options['traffic'],
+        })
+        self.report(summary)
+
+        if options['write_baseline']:
+            with open(options['write_baseline'], 'w', encoding='utf-8') as stream:
+                json.dump(summary, stream, indent=2, sort_keys=True)
+                stream.write('\n')
+            self.stdout.write(f"baseline written to {options['write_baseline']}")
+
+        problems = [f"{endpoint}: {row['statuses']['5xx']['requests']} server errors"
+                    for endpoint, row in summary['endpoints'].items() if '5xx' in row['statuses']]
+        if baseline is not None:
+            for key in ('database', 'concurrency', 'books'):
+                if baseline.get(key) != summary[key]:
+                    self.stderr.write(f"note: baseline {key} was {baseline.get(key)}, this run {summary[key]}")
+            problems += traffic.regressions(summary, baseline, options['tolerance'],
+                                            options['latency_slack_ms'], options['min_samples'],
+                                            f"{options['percentile']}_ms")
+        if problems:
+            raise CommandError("Performance check failed:\n  " + "\n  ".join(problems))
+
+    def report(self, summary):
+        self.stdout.write(f"{summary['requests']} requests on {summary['database']} ({summary['books']} books), "
+                          f"{summary['concurrency']} concurrent: {summary['throughput']} req/sec")
+        self.stdout.write(f"{'endpoint':<40} {'reqs':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+                          f"{'queries':>8} {'max q':>6}  statuses")
+        for endpoint, row in summary['endpoints'].items():
+            statuses = ' '.join(f"{key}:{status['requests']}" for key, status in row['statuses'].items())
+            self.stdout.write(f"{endpoint:<40} {row['requests']:>6} {row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} "
+                              f"{row['p99_ms']:>8.2f} {row['queries_mean']:>8.1f} "
+                              f"{max(status['queries_max'] for status in row['statuses'].values()):>6}  {statuses}")
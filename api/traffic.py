@@ -0,0 +1,285 @@
+import io
+import json
+import time
+import random
+import secrets
+import itertools
+from pathlib import Path
+from datetime import timedelta
+from statistics import mean
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref.util import setup_testing_defaults
+from django.conf import settings
+from django.utils import timezone
+from django.urls import Resolver404, resolve
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from book.synthetic import WORDS
+from book.paginations import DefaultPagination
+from book.models import Author, Book, BookImage, BorrowRecord, Category, Member
+from users.serializers import TokenObtainPairSerializer
+from BookHeaven.profiling import RequestProfile, percentile, view_route, wrap_queries
+
+User = get_user_model()
+
+
+DEFAULT_LOG = Path(__file__).resolve().parent / 'benchmarks' / 'traffic.jsonl'
+CLIENTS = ('anonymous', 'member', 'staff')
+BENCHMARK_USERS = {'member': 'benchmark-member', 'staff': 'benchmark-staff'}
+BENCHMARK_PASSWORD = 'benchmark-password'
+POOL_SIZE = 1000
+PERCENTILES = {'p50_ms': 0.5, 'p95_ms': 0.95, 'p99_ms': 0.99}
+
+
+def load_traffic(path):
+    """
+    Read a JSONL traffic log, one request per line:
+    `{"method": "GET", "path": "/api/v1/books/{book}/", "as": "anonymous", "weight": 1}`
+    plus an optional JSON `body` or a multipart `upload` (`{"name", "content"}`, sent as `file`).
+    """
+    entries = []
+    with open(path, encoding='utf-8') as stream:
+        for number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError as error:
+                raise ValueError(f'{path}:{number}: invalid JSON: {error}')
+            if not isinstance(entry, dict) or not isinstance(entry.get('path'), str):
+                raise ValueError(f'{path}:{number}: expected an object with a `path`.')
+            client, weight = entry.get('as', 'anonymous'), entry.get('weight', 1)
+            if client not in CLIENTS:
+                raise ValueError(f'{path}:{number}: `as` must be one of {", ".join(CLIENTS)}.')
+            if not isinstance(weight, int) or weight < 1:
+                raise ValueError(f'{path}:{number}: `weight` must be a positive integer.')
+            entries.append({
+                'method': entry.get('method', 'GET').upper(),
+                'path': entry['path'],
+                'as': client,
+                'body': entry.get('body'),
+                'upload': entry.get('upload'),
+                'weight': weight,
+            })
+    if not entries:
+        raise ValueError(f'{path}: no requests.')
+    return entries
+
+
+def endpoint_name(method, path):
+    """The route a request lands on, named like profiling samples (`BookViewSet.list`)."""
+    try:
+        match = resolve(path.partition('?')[0], urlconf=settings.ROOT_URLCONF)
+    except Resolver404:
+        return f'{method} {path.partition("?")[0]} (unresolved)'
+    return view_route(match, method)
+
+
+def benchmark_user(username, staff):
+    user = User.objects.filter(username=username).first()
+    if user is None:
+        user = User.objects.create_user(username=username, email=f'{username}@example.com',
+                                        password=BENCHMARK_PASSWORD, is_staff=staff)
+    Member.objects.get_or_create(user=user)
+    return user
+
+
+def sample_ids(queryset, size=POOL_SIZE):
+    return list(queryset.order_by('?').values_list('id', flat=True)[:size])
+
+
+class Fixtures:
+    """
+    What the `{placeholder}`s of a traffic log are filled from: a random pool
+    of existing ids per model, the benchmark member and staff accounts (with
+    JWTs) and run-unique values for rows the traffic creates.
+    """
+
+    def __init__(self):
+        self.users = {client: benchmark_user(username, client == 'staff')
+                      for client, username in BENCHMARK_USERS.items()}
+        refresh = TokenObtainPairSerializer.get_token(self.users['member'])
+        self.tokens = {'refresh': str(refresh), 'access': str(refresh.access_token)}
+        self.headers = {client: f'JWT {TokenObtainPairSerializer.get_token(user).access_token}'
+                        for client, user in self.users.items()}
+
+        self.pools = {
+            'book': sample_ids(Book.objects.all()),
+            'available_book': sample_ids(Book.objects.filter(availability_status=True)),
+            'author': sample_ids(Author.objects.all()),
+            'category': sample_ids(Category.objects.all()),
+            'member': sample_ids(Member.objects.all()),
+            'record': sample_ids(BorrowRecord.objects.all()),
+        }
+        if self.pools['book'] and not BookImage.objects.exists():
+            BookImage.objects.create(book_id=self.pools['book'][0], image='books/benchmark-cover')
+        self.images = list(BookImage.objects.order_by('?').values_list('book_id', 'id')[:POOL_SIZE])
+        self.pages = max(1, min(50, -(-Book.objects.count() // DefaultPagination.page_size)))
+        self.recent_date = (timezone.localdate() - timedelta(days=30)).isoformat()
+        # Created rows get names and ISBNs unique to this run, so repeated runs don't collide.
+        self.run = secrets.randbelow(10 ** 6)
+        self.counter = itertools.count()
+
+    def value(self, key, rng, request):
+        if key in self.pools:
+            if not self.pools[key]:
+                raise ValueError(f'No rows to fill `{{{key}}}` from; run generate_synthetic_data first.')
+            return rng.choice(self.pools[key])
+        if key in ('image_book', 'image'):
+            # Both come from the same BookImage row within one request.
+            if 'image' not in request:
+                if not self.images:
+                    raise ValueError('No book images to fill `{image}` from.')
+                request['image_book'], request['image'] = rng.choice(self.images)
+            return request[key]
+        if key in ('n', 'isbn'):
+            number = f'{self.run:06d}{next(self.counter):06d}'
+            return number if key == 'n' else f'R{number}'
+        if key == 'page':
+            return rng.randint(1, self.pages)
+        if key == 'word':
+            return rng.choice(WORDS)
+        if key == 'user':
+            return self.users['member'].pk
+        if key == 'member_username':
+            return self.users['member'].username
+        if key == 'password':
+            return BENCHMARK_PASSWORD
+        if key in self.tokens:
+            return self.tokens[key]
+        if key == 'recent_date':
+            return self.recent_date
+        raise ValueError(f'Unknown placeholder `{{{key}}}`.')
+
+    def fill(self, value, rng, request=None):
+        """`value` (a string, or a JSON body of them) with every `{placeholder}` replaced."""
+        request = {} if request is None else request
+        if isinstance(value, str):
+            return value.format_map(_Lookup(self, rng, request))
+        if isinstance(value, list):
+            return [self.fill(item, rng, request) for item in value]
+        if isinstance(value, dict):
+            return {key: self.fill(item, rng, request) for key, item in value.items()}
+        return value
+
+
+class _Lookup(dict):
+    def __init__(self, fixtures, rng, request):
+        super().__init__()
+        self.fixtures, self.rng, self.request = fixtures, rng, request
+
+    def __missing__(self, key):
+        return self.fixtures.value(key, self.rng, self.request)
+
+
+def build_environ(method, path, body=None, upload=None, authorization=None, host='127.0.0.1'):
+    path, _, query = path.partition('?')
+    environ = {'REQUEST_METHOD': method, 'PATH_INFO': path, 'QUERY_STRING': query, 'HTTP_HOST': host}
+    if authorization:
+        environ['HTTP_AUTHORIZATION'] = authorization
+    content = b''
+    if upload is not None:
+        content = encode_multipart(BOUNDARY, {'file': SimpleUploadedFile(upload['name'], upload['content'].encode())})
+        environ['CONTENT_TYPE'] = MULTIPART_CONTENT
+    elif body is not None:
+        content = json.dumps(body).encode()
+        environ['CONTENT_TYPE'] = 'application/json'
+    environ['CONTENT_LENGTH'] = str(len(content))
+    environ['wsgi.input'] = io.BytesIO(content)
+    setup_testing_defaults(environ)
+    return environ
+
+
+def replay(application, entries, fixtures, requests, concurrency=1, seed=0, host='127.0.0.1'):
+    """
+    Send `requests` requests drawn from `entries` by weight through the WSGI
+    `application`, `concurrency` at a time. The draw and every placeholder
+    depend only on `seed` and the request's index, so runs are repeatable.
+    Returns (endpoint, milliseconds, queries, status code) per request, plus
+    the wall-clock seconds the run took.
+    """
+    plan = random.Random(seed).choices(entries, weights=[entry['weight'] for entry in entries], k=requests)
+
+    def send(index):
+        entry = plan[index]
+        rng, request = random.Random(f'{seed}:{index}'), {}
+        path = fixtures.fill(entry['path'], rng, request)
+        upload = entry['upload'] and {**entry['upload'], 'content': fixtures.fill(entry['upload']['content'], rng, request)}
+        environ = build_environ(entry['method'], path, fixtures.fill(entry['body'], rng, request), upload,
+                                fixtures.headers.get(entry['as']), host)
+        statuses, profile = [], RequestProfile()
+        # Streamed bodies run their queries while being read, so the wrapper stays on until the end.
+        with wrap_queries(profile):
+            response = application(environ, lambda status, headers, exc_info=None: statuses.append(status))
+            try:
+                for _ in response:
+                    pass
+            finally:
+                response.close()
+        elapsed = (time.perf_counter() - profile.started) * 1000
+        return endpoint_name(entry['method'], path), elapsed, profile.queries, int(statuses[0].split()[0])
+
+    started = time.perf_counter()
+    if concurrency == 1:
+        results = [send(index) for index in range(requests)]
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(send, range(requests)))
+    return results, time.perf_counter() - started
+
+
+def summarize(results, elapsed):
+    """
+    Throughput overall, and per endpoint latency percentiles, mean queries and,
+    per status class, the request count and most queries any request took
+    (a 404 and a success run different code, so their budgets differ).
+    """
+    grouped = defaultdict(list)
+    for endpoint, milliseconds, queries, status in results:
+        grouped[endpoint].append((milliseconds, queries, f'{status // 100}xx'))
+    endpoints = {}
+    for endpoint, rows in sorted(grouped.items()):
+        timings = sorted(milliseconds for milliseconds, _, _ in rows)
+        statuses = defaultdict(lambda: {'requests': 0, 'queries_max': 0})
+        for _, queries, status in rows:
+            statuses[status]['requests'] += 1
+            statuses[status]['queries_max'] = max(statuses[status]['queries_max'], queries)
+        endpoints[endpoint] = {
+            'requests': len(rows),
+            **{name: round(percentile(timings, q), 3) for name, q in PERCENTILES.items()},
+            'queries_mean': round(mean(queries for _, queries, _ in rows), 2),
+            'statuses': dict(sorted(statuses.items())),
+        }
+    return {
+        'requests': len(results),
+        'elapsed_s': round(elapsed, 3),
+        'throughput': round(len(results) / elapsed, 1) if elapsed else 0.0,
+        'endpoints': endpoints,
+    }
+
+
+def regressions(current, baseline, tolerance=0.25, latency_slack_ms=5.0, min_samples=20, latency='p50_ms'):
+    """
+    What got worse than `baseline`: more queries than before for any endpoint
+    and status class, lower overall throughput, or a `latency` percentile
+    above the baseline's by more than `tolerance` plus a fixed slack. Latency
+    is only compared for endpoints with `min_samples` requests in both runs.
+    """
+    problems = []
+    if current['throughput'] < baseline['throughput'] * (1 - tolerance):
+        problems.append(f"throughput {current['throughput']} req/s, baseline {baseline['throughput']} req/s")
+    for endpoint, now in current['endpoints'].items():
+        before = baseline['endpoints'].get(endpoint)
+        if before is None:
+            continue
+        for status, row in now['statuses'].items():
+            budget = before['statuses'].get(status, {}).get('queries_max')
+            if budget is not None and row['queries_max'] > budget:
+                problems.append(f"{endpoint}: up to {row['queries_max']} queries ({status}), baseline {budget}")
+        if min(now['requests'], before['requests']) < min_samples:
+            continue
+        if now[latency] > before[latency] * (1 + tolerance) + latency_slack_ms:
+            problems.append(f"{endpoint}: {latency[:-3]} {now[latency]} ms, baseline {before[latency]} ms")
+    return problems
@@ -1,6 +1,8 @@
 from django.urls import path, include
 from rest_framework_nested import routers
-from book.views import AuthorViewSet, BookViewSet, BorrowRecordViewSet, MemberViewSet, CategoryViewSet, BookImageViewSet
+from BookHeaven.lazy_urls import lazy_include
+from api.views import ProfilingViewSet, TaskViewSet
+from book.views import AuthorViewSet, BookViewSet, BorrowRecordViewSet, MemberViewSet, CategoryViewSet, BookImageViewSet, CatalogViewSet, ReportViewSet, catalog_snapshot
 
 
 router = routers.DefaultRouter()
@@ -9,6 +11,10 @@ router.register('categories', CategoryViewSet)
 router.register('member', MemberViewSet, basename='members')
 router.register('borrowrecords', BorrowRecordViewSet, basename='borrowrecords')
 router.register('authors', AuthorViewSet)
+router.register('catalog', CatalogViewSet, basename='catalog')
+router.register('reports', ReportViewSet, basename='reports')
+router.register('profiling', ProfilingViewSet, basename='profiling')
+router.register('tasks', TaskViewSet, basename='tasks')
 
 book_router = routers.NestedDefaultRouter(router, 'books', lookup='book')
 book_router.register('images', BookImageViewSet, basename='book-images')
@@ -16,6 +22,7 @@ book_router.register('images', BookImageViewSet, basename='book-images')
 urlpatterns = [
     path('', include(router.urls)),
     path('', include(book_router.urls)),
-    path('auth/', include('djoser.urls')),
-    path('auth/', include('djoser.urls.jwt')),
+    path('snapshots/<path:name>', catalog_snapshot, name='catalog-snapshot'),
+    lazy_include('auth/', 'djoser.urls'),
+    lazy_include('auth/', 'djoser.urls.jwt'),
 ]
\ No newline at end of file
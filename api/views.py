@@ -1,3 +1,52 @@
-from django.shortcuts import render
+import time
+import hmac
+from django.conf import settings
+from django.db.models import Count
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework.viewsets import ViewSet
+from rest_framework.permissions import BasePermission, IsAdminUser
+from BookHeaven import profiling
+from tasks.models import Task
+from tasks.queue import run_pending
 
-# Create your views here.
+
+class ProfilingViewSet(ViewSet):
+    """Per-route percentiles of the requests sampled by ProfilingMiddleware, slowest p95 first."""
+    permission_classes = [IsAdminUser]
+
+    def list(self, request):
+        return Response({
+            "enabled": settings.PROFILING,
+            "sample_rate": settings.PROFILING_SAMPLE_RATE,
+            "routes": profiling.summary(),
+        })
+
+    @action(detail=False, methods=['post'])
+    def reset(self, request):
+        profiling.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class HasCronSecret(BasePermission):
+    """`Authorization: Bearer <CRON_SECRET>`, as sent by Vercel Cron."""
+
+    def has_permission(self, request, view):
+        secret = settings.TASKS_CRON_SECRET
+        header = request.headers.get('Authorization', '')
+        return bool(secret) and hmac.compare_digest(header.encode(), f'Bearer {secret}'.encode())
+
+
+class TaskViewSet(ViewSet):
+    """Background task counts for staff, and a cron hook that runs due tasks where no worker process can."""
+    permission_classes = [IsAdminUser]
+
+    def list(self, request):
+        counts = dict(Task.objects.order_by().values_list('status').annotate(total=Count('id')))
+        return Response({choice: counts.get(choice, 0) for choice, _ in Task.STATUS_CHOICES})
+
+    @action(detail=False, methods=['get', 'post'], permission_classes=[IsAdminUser | HasCronSecret])
+    def run(self, request):
+        totals = run_pending(deadline=time.monotonic() + settings.TASKS_CRON_SECONDS)
+        return Response(totals)
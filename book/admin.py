@@ -1,8 +1,9 @@
 from django.contrib import admin
-from book.models import Author, Book, BorrowRecord, Category, Member
+from book.models import Author, Book, BorrowRecord, Category, Hold, Member
 
 admin.site.register(Author)
 admin.site.register(Book)
 admin.site.register(BorrowRecord)
 admin.site.register(Category)
+admin.site.register(Hold)
 admin.site.register(Member)
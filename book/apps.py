@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class BookConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'book'
+
+    def ready(self):
+        import cloudinary
+        from django.conf import settings
+
+        cloudinary.config(**settings.CLOUDINARY)
+        import book.signals  # noqa: F401
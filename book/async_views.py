@@ -0,0 +1,173 @@
+import math
+from functools import wraps
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.urls import resolve
+from django.http import HttpResponse
+from django.core.cache import cache
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.exceptions import ValidationError
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from book.models import Author, Book, Category
+from book.paginations import DefaultPagination
+from book.representations import BookRepresentation
+from book.serializers import AuthorSerializer, BookSerializer, CategorySerializer
+from book.cache import acatalog_version, is_not_modified, response_cache_entry, response_cache_key, set_validators
+from BookHeaven.profiling import serializing
+
+
+BOOLEAN_VALUES = {'true': True, '1': True, 'false': False, '0': False}
+
+
+class Fallback(Exception):
+    """The request needs something only the DRF view does (auth, search, the browsable API, error bodies)."""
+
+
+async def sync_view(request):
+    # Resolve against the regular URLconf, not the ASGI one, so this never lands back here.
+    match = resolve(request.path_info, urlconf=settings.ROOT_URLCONF)
+    return await sync_to_async(match.func)(request, *match.args, **match.kwargs)
+
+
+def is_anonymous_json_read(request, params):
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    if 'HTTP_AUTHORIZATION' in request.META or 'text/html' in request.headers.get('Accept', ''):
+        return False
+    return all(name in params and len(values) == 1 for name, values in request.GET.lists())
+
+
+def catalog_view(basename, params=()):
+    """
+    Turn an async `build(request, **kwargs) -> data` into a view that answers
+    anonymous JSON GETs for the catalog natively on the event loop. It shares
+    cache entries, ETags and validators with CachedResponseMixin (same keys
+    under the viewset's `basename`), so a response cached by either path is
+    served by both. Anything it does not handle itself (other methods, auth,
+    query params outside `params`, invalid values, 404s) is handed to the
+    DRF view, which produces the exact same response it always has.
+    """
+    def decorator(build):
+        @csrf_exempt
+        @wraps(build)
+        async def view(request, **kwargs):
+            if not is_anonymous_json_read(request, params):
+                return await sync_view(request)
+
+            version = await acatalog_version()
+            key = response_cache_key(basename, request, version)
+            entry = await cache.aget(key)
+            if entry is None:
+                try:
+                    data = await build(request, **kwargs)
+                except Fallback:
+                    return await sync_view(request)
+                with serializing():
+                    entry = response_cache_entry(data)
+                await cache.aset(key, entry, timeout=getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 300))
+
+            if is_not_modified(request, entry['etag'], int(version / 1000)):
+                response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+            else:
+                with serializing():
+                    body = JSONRenderer().render(entry['data'])
+                response = HttpResponse(body, content_type='application/json')
+            response['Vary'] = 'Accept'
+            return set_validators(response, entry['etag'], version)
+        return view
+    return decorator
+
+
+async def filter_by_pk(queryset, request, name, model):
+    value = request.GET.get(name)
+    if value is None:
+        return queryset
+    # django-filter answers an unknown id with a 400; leave that to the DRF view.
+    if not (value.isascii() and value.isdigit()) or not await model.objects.filter(pk=value).aexists():
+        raise Fallback
+    return queryset.filter(**{f'{name}_id': int(value)})
+
+
+def page_links(request, number, num_pages):
+    param = DefaultPagination.page_query_param
+    url = request.build_absolute_uri()
+    next_link = replace_query_param(url, param, number + 1) if number < num_pages else None
+    if number == 1:
+        previous_link = None
+    elif number == 2:
+        previous_link = remove_query_param(url, param)
+    else:
+        previous_link = replace_query_param(url, param, number - 1)
+    return next_link, previous_link
+
+
+@catalog_view('books', params=('page', 'category', 'author', 'availability_status', 'fields', 'expand'))
+async def book_list(request):
+    books = Book.objects.all()
+    books = await filter_by_pk(books, request, 'category', Category)
+    books = await filter_by_pk(books, request, 'author', Author)
+    if 'availability_status' in request.GET:
+        available = BOOLEAN_VALUES.get(request.GET['availability_status'].lower())
+        if available is None:
+            raise Fallback
+        books = books.filter(availability_status=available)
+    try:
+        representation = BookRepresentation.from_request(request)
+    except ValidationError:
+        raise Fallback
+
+    page = request.GET.get(DefaultPagination.page_query_param, '1')
+    if not (page.isascii() and page.isdigit()):
+        raise Fallback
+    number, size = int(page), DefaultPagination.page_size
+    count = await books.acount()
+    num_pages = max(1, math.ceil(count / size))
+    if not 1 <= number <= num_pages:
+        raise Fallback
+
+    rows = [row async for row in representation.values(books)[(number - 1) * size:number * size]]
+    images = await representation.arelated(rows)
+    next_link, previous_link = page_links(request, number, num_pages)
+    with serializing():
+        results = representation.render(rows, images)
+    return {'count': count, 'next': next_link, 'previous': previous_link, 'results': results}
+
+
+@catalog_view('books')
+async def book_detail(request, pk):
+    books = Book.objects.select_related('author', 'category').prefetch_related('images').defer('search_vector')
+    try:
+        book = await books.aget(pk=pk)
+    except Book.DoesNotExist:
+        raise Fallback
+    return BookSerializer(book, context={'request': request}).data
+
+
+@catalog_view('author')
+async def author_list(request):
+    return [row async for row in Author.objects.values('id', 'name', 'biography')]
+
+
+@catalog_view('author')
+async def author_detail(request, pk):
+    try:
+        author = await Author.objects.aget(pk=pk)
+    except Author.DoesNotExist:
+        raise Fallback
+    return AuthorSerializer(author).data
+
+
+@catalog_view('category')
+async def category_list(request):
+    return [row async for row in Category.objects.values('id', 'name', 'book_count', 'loan_period_days')]
+
+
+@catalog_view('category')
+async def category_detail(request, pk):
+    try:
+        category = await Category.objects.aget(pk=pk)
+    except Category.DoesNotExist:
+        raise Fallback
+    return CategorySerializer(category).data
@@ -0,0 +1,111 @@
+import time
+import hashlib
+from urllib.parse import urlencode
+from django.conf import settings
+from django.dispatch import Signal
+from django.core.cache import cache
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.renderers import JSONRenderer
+
+
+CATALOG_VERSION_KEY = 'catalog:version'
+
+# Sent by invalidate_catalog() after every catalog write, with the new version.
+catalog_invalidated = Signal()
+
+
+def catalog_version():
+    """Millisecond timestamp of the last catalog write; part of every cache key."""
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        version = int(time.time() * 1000)
+        cache.add(CATALOG_VERSION_KEY, version, timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY, version)
+    return version
+
+
+async def acatalog_version():
+    version = await cache.aget(CATALOG_VERSION_KEY)
+    if version is None:
+        version = int(time.time() * 1000)
+        await cache.aadd(CATALOG_VERSION_KEY, version, timeout=None)
+        version = await cache.aget(CATALOG_VERSION_KEY, version)
+    return version
+
+
+def invalidate_catalog():
+    # Bumping the version orphans every cached response at once; the old entries age out on their own.
+    version = max(int(time.time() * 1000), (cache.get(CATALOG_VERSION_KEY) or 0) + 1)
+    cache.set(CATALOG_VERSION_KEY, version, timeout=None)
+    catalog_invalidated.send(sender=None, version=version)
+    return version
+
+
+def response_cache_key(basename, request, version):
+    query = urlencode(sorted(request.GET.lists()), doseq=True)
+    raw = f'{request.get_host()}{request.path}?{query}'
+    return f'response:{basename}:{version}:{hashlib.md5(raw.encode()).hexdigest()}'
+
+
+def response_cache_entry(data):
+    etag = hashlib.md5(JSONRenderer().render(data)).hexdigest()
+    return {'data': data, 'etag': quote_etag(etag)}
+
+
+def is_not_modified(request, etag, last_modified):
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match is not None:
+        return etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
+    if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    return if_modified_since is not None and last_modified <= if_modified_since
+
+
+def set_validators(response, etag, version):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(int(version / 1000))
+    response['Cache-Control'] = 'public, max-age=0, must-revalidate'
+    return response
+
+
+class CachedResponseMixin:
+    """
+    Caches the serialized data of `list`/`retrieve` responses, keyed on the
+    catalog version, host, path and query string, and answers conditional
+    requests (If-None-Match / If-Modified-Since) with 304 before any ORM or
+    serializer work happens.
+    """
+    cached_actions = ('list', 'retrieve')
+
+    def get_response_cache_timeout(self):
+        return getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 300)
+
+    def get_response_cache_key(self, request, version):
+        return response_cache_key(self.basename, request, version)
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if self.action not in self.cached_actions:
+            return handler(request, *args, **kwargs)
+
+        version = catalog_version()
+        key = self.get_response_cache_key(request, version)
+        entry = cache.get(key)
+        if entry is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            entry = response_cache_entry(response.data)
+            cache.set(key, entry, timeout=self.get_response_cache_timeout())
+        else:
+            response = Response(entry['data'])
+
+        if is_not_modified(request, entry['etag'], int(version / 1000)):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        return set_validators(response, entry['etag'], version)
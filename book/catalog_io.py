@@ -0,0 +1,307 @@
+import io
+import csv
+import json
+from itertools import islice
+from collections import defaultdict
+from django.db import transaction
+from django.core.serializers.json import DjangoJSONEncoder
+from book.cache import invalidate_catalog
+from book.search import refresh_search_index
+from book.models import Author, Book, BookImage, BorrowRecord, Category
+
+
+CATALOG_FIELDS = ['isbn', 'title', 'author', 'author_biography', 'category', 'availability_status', 'images']
+FORMATS = ('csv', 'jsonl')
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 't'}
+FALSE_VALUES = {'0', 'false', 'no', 'n', 'f'}
+
+
+def detect_format(filename, default='csv'):
+    for fmt in FORMATS:
+        if filename and filename.lower().endswith(f'.{fmt}'):
+            return fmt
+    if filename and filename.lower().endswith('.ndjson'):
+        return 'jsonl'
+    return default
+
+
+def read_rows(stream, fmt):
+    """Yield (line_number, row) pairs from a text stream without reading it all."""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == 'jsonl':
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as error:
+                row = {'_error': f'Invalid JSON: {error}'}
+            yield line_number, row if isinstance(row, dict) else {'_error': 'Expected a JSON object.'}
+    else:
+        raise ValueError(f'Unsupported format: {fmt}')
+
+
+def text_stream(binary):
+    return io.TextIOWrapper(binary, encoding='utf-8-sig', newline='')
+
+
+def parse_bool(value):
+    if isinstance(value, bool) or value is None:
+        return value
+    value = str(value).strip().lower()
+    if value == '':
+        return None
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    raise ValueError(f'Invalid availability_status: {value!r}')
+
+
+def normalize_image(value):
+    # 'books/cover' and 'image/upload/books/cover' name the same Cloudinary resource.
+    resource = BookImage._meta.get_field('image').to_python(value)
+    return resource.get_prep_value() if resource else None
+
+
+def parse_images(value):
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split('|')
+    return [normalize_image(image.strip()) for image in value if image and str(image).strip()]
+
+
+class ImportReport:
+    def __init__(self, max_errors=1000):
+        self.max_errors = max_errors
+        self.rows = 0
+        self.created = 0
+        self.updated = 0
+        self.images = 0
+        self.failed = 0
+        self.errors = []
+
+    def add_error(self, line, isbn, message):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'line': line, 'isbn': isbn, 'error': message})
+
+    def as_dict(self):
+        return {
+            'rows': self.rows,
+            'created': self.created,
+            'updated': self.updated,
+            'images': self.images,
+            'failed': self.failed,
+            'errors': self.errors,
+        }
+
+
+class CatalogImporter:
+    """
+    Upserts books by ISBN in chunks with bulk_create/bulk_update. Author and
+    category names are resolved through in-memory maps loaded once, so a
+    chunk costs a fixed handful of queries regardless of its size. Maintained
+    state that bulk writes bypass (category counts, search index, response
+    cache) is refreshed per chunk. Books out on loan keep their
+    availability_status, which circulation owns while they are lent.
+    """
+    book_fields = ['title', 'author', 'category', 'availability_status']
+
+    def __init__(self, chunk_size=2000, progress=None, max_errors=1000):
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self.report = ImportReport(max_errors=max_errors)
+        self.authors = {}
+        self.categories = {}
+        for pk, name in Author.objects.order_by('-id').values_list('id', 'name').iterator(chunk_size=10_000):
+            self.authors[name.casefold()] = pk
+        for pk, name in Category.objects.order_by('-id').values_list('id', 'name'):
+            self.categories[name.casefold()] = pk
+
+    def run(self, rows):
+        rows = iter(rows)
+        try:
+            while True:
+                chunk = list(islice(rows, self.chunk_size))
+                if not chunk:
+                    break
+                self.import_chunk(chunk)
+                if self.progress:
+                    self.progress(self.report)
+        finally:
+            # Chunks imported before a failure are committed, so the cache must not keep serving the old catalog.
+            invalidate_catalog()
+        return self.report
+
+    def clean_row(self, line, row):
+        if '_error' in row:
+            raise ValueError(row['_error'])
+        isbn = str(row.get('isbn') or '').strip()
+        title = str(row.get('title') or '').strip()
+        if not isbn:
+            raise ValueError('isbn is required.')
+        if len(isbn) > Book._meta.get_field('isbn').max_length:
+            raise ValueError('isbn is longer than 13 characters.')
+        if not title:
+            raise ValueError('title is required.')
+        if len(title) > Book._meta.get_field('title').max_length:
+            raise ValueError('title is longer than 200 characters.')
+        author = str(row.get('author') or '').strip()[:100]
+        category = str(row.get('category') or '').strip()[:100]
+        return {
+            'isbn': isbn,
+            'title': title,
+            'author': author or None,
+            'author_biography': str(row.get('author_biography') or ''),
+            'category': category or None,
+            'availability_status': parse_bool(row.get('availability_status')),
+            'images': parse_images(row.get('images')),
+        }
+
+    def resolve(self, lookup, model, names, defaults=None):
+        missing = {}
+        for name in names:
+            if name and name.casefold() not in lookup:
+                missing.setdefault(name.casefold(), name)
+        if missing:
+            created = model.objects.bulk_create(
+                model(name=name, **(defaults or {}).get(key, {})) for key, name in missing.items())
+            if all(obj.pk for obj in created):
+                lookup.update((obj.name.casefold(), obj.pk) for obj in created)
+            else:
+                for pk, name in model.objects.filter(name__in=missing.values()).values_list('id', 'name'):
+                    lookup[name.casefold()] = pk
+
+    def import_chunk(self, chunk):
+        cleaned = {}
+        for line, row in chunk:
+            self.report.rows += 1
+            try:
+                data = self.clean_row(line, row)
+            except ValueError as error:
+                self.report.add_error(line, row.get('isbn'), str(error))
+                continue
+            cleaned[data['isbn']] = data
+
+        if not cleaned:
+            return
+
+        with transaction.atomic():
+            biographies = {data['author'].casefold(): {'biography': data['author_biography']}
+                           for data in cleaned.values() if data['author']}
+            self.resolve(self.authors, Author, [data['author'] for data in cleaned.values()], biographies)
+            self.resolve(self.categories, Category, [data['category'] for data in cleaned.values()])
+
+            existing = {book.isbn: book for book in Book.objects.filter(isbn__in=cleaned).only(
+                'id', 'isbn', 'title', 'author_id', 'category_id', 'availability_status')}
+            touched_categories = {book.category_id for book in existing.values()}
+            lent = set(BorrowRecord.objects.filter(
+                book__in=[book.pk for book in existing.values()], status='BORROWED').values_list('book_id', flat=True))
+            to_create, to_update = [], []
+            for isbn, data in cleaned.items():
+                author_id = self.authors.get(data['author'].casefold()) if data['author'] else None
+                category_id = self.categories.get(data['category'].casefold()) if data['category'] else None
+                touched_categories.add(category_id)
+                book = existing.get(isbn)
+                if book is None:
+                    available = data['availability_status']
+                    to_create.append(Book(
+                        isbn=isbn, title=data['title'], author_id=author_id, category_id=category_id,
+                        availability_status=True if available is None else available))
+                else:
+                    book.title, book.author_id, book.category_id = data['title'], author_id, category_id
+                    if data['availability_status'] is not None and book.pk not in lent:
+                        book.availability_status = data['availability_status']
+                    to_update.append(book)
+
+            Book.objects.bulk_create(to_create, batch_size=self.chunk_size)
+            Book.objects.bulk_update(to_update, self.book_fields, batch_size=self.chunk_size)
+            self.report.created += len(to_create)
+            self.report.updated += len(to_update)
+
+            book_ids = dict(Book.objects.filter(isbn__in=cleaned).values_list('isbn', 'id'))
+            self.import_images(cleaned, book_ids)
+            touched_categories.discard(None)
+            Category.rebuild_book_counts(touched_categories)
+            refresh_search_index(list(book_ids.values()))
+
+    def import_images(self, cleaned, book_ids):
+        wanted = {(book_ids[isbn], image) for isbn, data in cleaned.items() for image in data['images']}
+        if not wanted:
+            return
+        existing = {
+            (book_id, image.get_prep_value() if image else None)
+            for book_id, image in BookImage.objects.filter(
+                book_id__in={book_id for book_id, _ in wanted}).values_list('book_id', 'image')
+        }
+        new = [BookImage(book_id=book_id, image=image) for book_id, image in sorted(wanted - existing)]
+        BookImage.objects.bulk_create(new, batch_size=self.chunk_size)
+        self.report.images += len(new)
+
+
+def export_rows(chunk_size=2000):
+    """Yield one plain dict per book, paging through the table by id one chunk at a time."""
+    books = Book.objects.order_by('id').values_list(
+        'id', 'isbn', 'title', 'author__name', 'author__biography', 'category__name', 'availability_status')
+    last_id = 0
+    while True:
+        chunk = list(books.filter(id__gt=last_id)[:chunk_size])
+        if not chunk:
+            return
+        last_id = chunk[-1][0]
+        images = defaultdict(list)
+        for book_id, image in (BookImage.objects.filter(book_id__in=[row[0] for row in chunk])
+                               .order_by('id').values_list('book_id', 'image')):
+            if image:
+                images[book_id].append(image.get_prep_value())
+        for book_id, isbn, title, author, biography, category, available in chunk:
+            yield {
+                'isbn': isbn,
+                'title': title,
+                'author': author or '',
+                'author_biography': biography or '',
+                'category': category or '',
+                'availability_status': available,
+                'images': images[book_id],
+            }
+
+
+HISTORY_FIELDS = ['id', 'status', 'borrow_date', 'return_date', 'book_id', 'isbn', 'title', 'member_id', 'username', 'email']
+
+
+def export_history(queryset, chunk_size=2000):
+    """
+    Yield one flat dict per borrow record in `queryset`, streamed through a
+    server-side cursor (where the database has one) so memory stays flat
+    regardless of the number of rows.
+    """
+    rows = queryset.values_list(
+        'id', 'status', 'borrow_date', 'return_date', 'book_id', 'book__isbn', 'book__title',
+        'member_id', 'member__user__username', 'member__user__email')
+    for row in rows.iterator(chunk_size=chunk_size):
+        yield dict(zip(HISTORY_FIELDS, row))
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def export_lines(rows, fmt, fieldnames=CATALOG_FIELDS):
+    """Serialize flat rows to CSV or JSONL one line at a time; list values become `|`-joined CSV cells."""
+    if fmt == 'csv':
+        writer = csv.DictWriter(_Echo(), fieldnames=fieldnames)
+        yield writer.writeheader()
+        for row in rows:
+            yield writer.writerow({key: '|'.join(value) if isinstance(value, list) else value
+                                   for key, value in row.items()})
+    elif fmt == 'jsonl':
+        for row in rows:
+            yield json.dumps(row, cls=DjangoJSONEncoder) + '\n'
+    else:
+        raise ValueError(f'Unsupported format: {fmt}')
@@ -0,0 +1,267 @@
+from collections import defaultdict
+from django.utils import timezone
+from django.dispatch import Signal
+from django.db.models import F, Min, Q, Subquery
+from django.db import IntegrityError, transaction
+from book import recommendations, stats
+from book.models import Book, BorrowRecord, Hold
+from book.overdue import due_date, fine_for, loan_period, loan_periods
+
+
+# Sent after commit whenever borrow/return flips a book's availability_status.
+availability_changed = Signal()
+
+# Sent after commit when returned books are checked out to the next member in their hold queue,
+# with `holds` (fulfilled Hold instances, `borrow_record` set). Connect notifications here.
+hold_fulfilled = Signal()
+
+
+class CirculationError(Exception):
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def borrow_book(book, member):
+    """
+    Check `book` out to `member` in one transaction.
+
+    Availability is claimed with a conditional UPDATE, so of any number of
+    concurrent requests for the same copy exactly one sees a row updated; the
+    partial unique index on active borrows backs up the per-member rule.
+    """
+    with transaction.atomic():
+        claimed = Book.objects.filter(pk=book.pk, availability_status=True).update(
+            availability_status=False, borrow_count=F('borrow_count') + 1)
+        if not claimed:
+            if BorrowRecord.objects.filter(book_id=book.pk, member=member, status='BORROWED').exists():
+                raise CirculationError("You already borrowed this book")
+            raise CirculationError("Book is currently not available")
+        try:
+            with transaction.atomic():
+                record = BorrowRecord.objects.create(book=book, member=member, status='BORROWED',
+                                                     due_date=due_date(loan_period(book)))
+        except IntegrityError:
+            raise CirculationError("You already borrowed this book")
+        stats.record_borrows(member.pk, [book.category_id], record.borrow_date)
+        recommendations.record_borrows(member.pk, [record])
+        transaction.on_commit(lambda: availability_changed.send(sender=Book, book_ids=[book.pk]))
+
+    book.availability_status = False
+    return record
+
+
+def return_book(book, member):
+    """Close `member`'s active borrow of `book` in place and make the book available again."""
+    with transaction.atomic():
+        try:
+            # Joining the book locks its row too, which orders this against reserve_book.
+            record = (BorrowRecord.objects.select_for_update().select_related('book')
+                      .only('id', 'borrow_date', 'due_date', 'book__id')
+                      .get(book_id=book.pk, member=member, status='BORROWED'))
+        except BorrowRecord.DoesNotExist:
+            raise CirculationError("You have no active borrow for this book", status_code=404)
+        record.status = 'RETURNED'
+        record.return_date = timezone.localdate()
+        _settle(record)
+        record.save(update_fields=['status', 'return_date', 'overdue', 'fine'])
+        stats.record_returns(member.pk, [record.borrow_date])
+        promoted = _fulfill_holds({book.pk: book.category_id})
+        if not promoted:
+            Book.objects.filter(pk=book.pk).update(availability_status=True)
+            transaction.on_commit(lambda: availability_changed.send(sender=Book, book_ids=[book.pk]))
+
+    record.book = book
+    record.member = member
+    book.availability_status = not promoted
+    return record
+
+
+def _settle(record):
+    # The fine is final once the book is back.
+    record.overdue = record.due_date is not None and record.return_date > record.due_date
+    record.fine = fine_for(record.due_date, record.return_date)
+
+
+def reserve_book(book, member):
+    """
+    Put `member` at the back of `book`'s hold queue. Only books that are out
+    can be reserved; the book row is locked so a concurrent return either
+    sees the new hold or makes the book available before it is checked.
+    """
+    with transaction.atomic():
+        available = (Book.objects.select_for_update().filter(pk=book.pk)
+                     .values_list('availability_status', flat=True).first())
+        if available:
+            raise CirculationError("Book is available, borrow it instead")
+        if BorrowRecord.objects.filter(book_id=book.pk, member=member, status='BORROWED').exists():
+            raise CirculationError("You already borrowed this book")
+        try:
+            with transaction.atomic():
+                hold = Hold.objects.create(book_id=book.pk, member=member)
+        except IntegrityError:
+            raise CirculationError("You already reserved this book")
+    hold.position = Hold.objects.filter(book_id=book.pk, status='WAITING', id__lte=hold.pk).count()
+    return hold
+
+
+def cancel_hold(book, member):
+    """Withdraw `member`'s hold on `book`; the book row is locked as in reserve_book, so a concurrent return cannot hand it on."""
+    with transaction.atomic():
+        Book.objects.select_for_update().filter(pk=book.pk).values_list('pk', flat=True).first()
+        cancelled = Hold.objects.filter(book_id=book.pk, member=member, status='WAITING').update(
+            status='CANCELLED', resolved_at=timezone.now())
+    if not cancelled:
+        raise CirculationError("You have no hold on this book", status_code=404)
+
+
+def _fulfill_holds(categories):
+    """
+    Check each of the books just returned ({book id: category id}, rows
+    locked by the caller) out to the first member waiting for it. This takes
+    a fixed number of queries however long the queues are. Returns the ids
+    of the books handed on, which stay unavailable.
+    """
+    first = (Hold.objects.filter(book_id__in=list(categories), status='WAITING').order_by()
+             .values('book_id').annotate(first=Min('id')).values('first'))
+    # Locked and re-checked, so a hold cancelled since the queue was read is not fulfilled.
+    holds = list(Hold.objects.select_for_update().filter(pk__in=Subquery(first), status='WAITING').order_by('id'))
+    if not holds:
+        return set()
+
+    periods = loan_periods(categories[hold.book_id] for hold in holds)
+    records = BorrowRecord.objects.bulk_create(
+        BorrowRecord(book_id=hold.book_id, member_id=hold.member_id, status='BORROWED',
+                     due_date=due_date(periods[categories[hold.book_id]])) for hold in holds)
+    resolved_at = timezone.now()
+    for hold, record in zip(holds, records):
+        hold.status, hold.resolved_at, hold.borrow_record = 'FULFILLED', resolved_at, record
+    Hold.objects.bulk_update(holds, ['status', 'resolved_at', 'borrow_record'])
+    promoted = [hold.book_id for hold in holds]
+    Book.objects.filter(pk__in=promoted).update(borrow_count=F('borrow_count') + 1)
+
+    by_member = defaultdict(list)
+    for hold, record in zip(holds, records):
+        by_member[hold.member_id].append((categories[hold.book_id], record))
+    for member_id, loans in by_member.items():
+        stats.record_borrows(member_id, [category_id for category_id, _ in loans], records[0].borrow_date)
+        recommendations.record_borrows(member_id, [record for _, record in loans])
+    transaction.on_commit(lambda: hold_fulfilled.send(sender=Hold, holds=holds))
+    return set(promoted)
+
+
+def _resolve_items(book_ids, isbns):
+    """Map each requested item, in request order, to a Book (or None), locking the found rows."""
+    items = [('book', book_id) for book_id in book_ids or []] + [('isbn', isbn) for isbn in isbns or []]
+    books = (
+        Book.objects.select_for_update()
+        .filter(Q(pk__in=[value for key, value in items if key == 'book']) | Q(isbn__in=[value for key, value in items if key == 'isbn']))
+        .only('id', 'isbn', 'availability_status', 'category_id')
+        .order_by('id')
+    )
+    by_id, by_isbn = {}, {}
+    for book in books:
+        by_id[book.pk] = by_isbn[book.isbn] = book
+    resolved, seen = [], set()
+    for key, value in items:
+        book = by_id.get(value) if key == 'book' else by_isbn.get(value)
+        duplicate = book is not None and book.pk in seen
+        if book is not None:
+            seen.add(book.pk)
+        resolved.append((key, value, book, duplicate))
+    return resolved
+
+
+def _result(key, value, book, status, error=None, record=None):
+    result = {key: value, 'book_id': book.pk if book else None, 'status': status}
+    if error:
+        result['error'] = error
+    if record is not None:
+        result['record_id'] = record
+    return result
+
+
+def bulk_borrow(member, book_ids=None, isbns=None):
+    """
+    Check a stack of books out to `member` in one transaction with set-based
+    queries, applying the same rules as borrow_book per item.
+    """
+    with transaction.atomic():
+        resolved = _resolve_items(book_ids, isbns)
+        found = [book.pk for _, _, book, _ in resolved if book is not None]
+        active = set(BorrowRecord.objects.filter(
+            member=member, status='BORROWED', book_id__in=found).values_list('book_id', flat=True))
+
+        results, eligible = [], []
+        for key, value, book, duplicate in resolved:
+            if book is None:
+                results.append(_result(key, value, None, 'failed', "Book not found"))
+            elif duplicate:
+                results.append(_result(key, value, book, 'failed', "Book listed more than once"))
+            elif book.pk in active:
+                results.append(_result(key, value, book, 'failed', "You already borrowed this book"))
+            elif not book.availability_status:
+                results.append(_result(key, value, book, 'failed', "Book is currently not available"))
+            else:
+                eligible.append(book.pk)
+                results.append(_result(key, value, book, 'borrowed'))
+
+        if eligible:
+            claimed = Book.objects.filter(pk__in=eligible, availability_status=True).update(
+                availability_status=False, borrow_count=F('borrow_count') + 1)
+            if claimed != len(eligible):
+                raise CirculationError("Availability changed during the request, please retry", status_code=409)
+            categories = {book.pk: book.category_id for _, _, book, _ in resolved if book is not None}
+            periods = loan_periods(categories[book_id] for book_id in eligible)
+            records = BorrowRecord.objects.bulk_create(
+                BorrowRecord(book_id=book_id, member=member, status='BORROWED',
+                             due_date=due_date(periods[categories[book_id]])) for book_id in eligible)
+            stats.record_borrows(member.pk, [categories[book_id] for book_id in eligible], records[0].borrow_date)
+            recommendations.record_borrows(member.pk, records)
+            record_ids = {record.book_id: record.pk for record in records}
+            for result in results:
+                if result['status'] == 'borrowed':
+                    result['record_id'] = record_ids.get(result['book_id'])
+            transaction.on_commit(lambda: availability_changed.send(sender=Book, book_ids=eligible))
+    return results
+
+
+def bulk_return(member, book_ids=None, isbns=None):
+    """Return a stack of books for `member` in one transaction, updating the records in place."""
+    with transaction.atomic():
+        resolved = _resolve_items(book_ids, isbns)
+        found = [book.pk for _, _, book, _ in resolved if book is not None]
+        active = {
+            record.book_id: record for record in
+            BorrowRecord.objects.select_for_update()
+            .filter(member=member, status='BORROWED', book_id__in=found)
+            .only('id', 'book_id', 'borrow_date', 'due_date')
+        }
+
+        results, returning = [], []
+        for key, value, book, duplicate in resolved:
+            if book is None:
+                results.append(_result(key, value, None, 'failed', "Book not found"))
+            elif duplicate:
+                results.append(_result(key, value, book, 'failed', "Book listed more than once"))
+            elif book.pk not in active:
+                results.append(_result(key, value, book, 'failed', "You have no active borrow for this book"))
+            else:
+                returning.append(book.pk)
+                results.append(_result(key, value, book, 'returned', record=active[book.pk].pk))
+
+        if returning:
+            records, today = [active[book_id] for book_id in returning], timezone.localdate()
+            for record in records:
+                record.status, record.return_date = 'RETURNED', today
+                _settle(record)
+            BorrowRecord.objects.bulk_update(records, ['status', 'return_date', 'overdue', 'fine'])
+            stats.record_returns(member.pk, [record.borrow_date for record in records])
+            categories = {book.pk: book.category_id for _, _, book, _ in resolved if book is not None}
+            promoted = _fulfill_holds({book_id: categories[book_id] for book_id in returning})
+            available = [book_id for book_id in returning if book_id not in promoted]
+            if available:
+                Book.objects.filter(pk__in=available).update(availability_status=True)
+                transaction.on_commit(lambda: availability_changed.send(sender=Book, book_ids=available))
+    return results
@@ -0,0 +1,123 @@
+import io
+import base64
+import hashlib
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import storages
+from PIL import ExifTags, Image, ImageOps
+from book.models import BookImage
+
+WEBP = ('WEBP', 'image/webp', 'webp', {'quality': 80, 'method': 4})
+JPEG = ('JPEG', 'image/jpeg', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True})
+PNG = ('PNG', 'image/png', 'png', {})
+PLACEHOLDER_WIDTH = 16
+# Written by process(); a BookImage without variants has not been processed yet.
+FIELDS = ['width', 'height', 'placeholder', 'variants']
+ROTATED = (5, 6, 7, 8)
+
+
+def image_storage():
+    """Where the renditions are kept (BOOK_IMAGE_STORAGE)."""
+    return storages.create_storage(settings.BOOK_IMAGE_STORAGE)
+
+
+def variant_widths(width):
+    # No upscaling: widths past the original's collapse into the original width.
+    return sorted({min(size, width) for size in settings.BOOK_IMAGE_WIDTHS}, reverse=True)
+
+
+def render(data):
+    """
+    Decode an original once and encode every rendition: each width in
+    BOOK_IMAGE_WIDTHS as WebP and as JPEG (PNG for images with transparency),
+    plus a tiny WebP placeholder. Returns (width, height, placeholder,
+    [(width, height, format, bytes)]), dimensions as displayed (EXIF
+    orientation applied).
+    """
+    with Image.open(io.BytesIO(data)) as source:
+        width, height = source.size
+        if source.getexif().get(ExifTags.Base.Orientation) in ROTATED:
+            width, height = height, width
+        # JPEGs decode straight at a reduced scale when even the largest variant is much smaller.
+        scale = max(variant_widths(width)) / width
+        source.draft(None, (round(source.width * scale), round(source.height * scale)))
+        image = ImageOps.exif_transpose(source)
+        alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+        image = image.convert('RGBA' if alpha else 'RGB')
+
+    files = []
+    for size in variant_widths(width):
+        # Each variant is scaled from the previous, larger one rather than from the full-size original.
+        image = image.resize((size, max(1, round(height * size / width))), Image.Resampling.LANCZOS, reducing_gap=3.0)
+        for fmt in (WEBP, PNG if alpha else JPEG):
+            files.append((image.width, image.height, fmt, encode(image, fmt)))
+
+    thumbnail = image.resize((PLACEHOLDER_WIDTH, max(1, round(height * PLACEHOLDER_WIDTH / width))), Image.Resampling.BILINEAR)
+    placeholder = 'data:image/webp;base64,' + base64.b64encode(encode(thumbnail, WEBP, quality=30)).decode()
+    return width, height, placeholder, files
+
+
+def encode(image, fmt, **options):
+    stream = io.BytesIO()
+    image.save(stream, fmt[0], **{**fmt[3], **options})
+    return stream.getvalue()
+
+
+def process(image, data, storage=None):
+    """
+    Render `data` (the original's bytes) and store the renditions of
+    `image` under names derived from the content, setting FIELDS without
+    saving the instance. Returns the names of renditions it replaced,
+    to delete once the new ones are committed.
+    """
+    storage = storage or image_storage()
+    width, height, placeholder, files = render(data)
+    digest = hashlib.sha256(data).hexdigest()[:12]
+
+    def store(file):
+        size, size_height, fmt, content = file
+        name = storage.save(f'book-images/{image.pk}/{digest}-{size}w.{fmt[2]}', ContentFile(content))
+        return {'name': name, 'url': storage.url(name), 'type': fmt[1], 'width': size, 'height': size_height}
+
+    # Storage writes are network round trips on Cloudinary, so they overlap.
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        variants = list(pool.map(store, files))
+
+    kept = {variant['name'] for variant in variants}
+    stale = [variant['name'] for variant in image.variants if variant['name'] not in kept]
+    image.width, image.height, image.placeholder, image.variants = width, height, placeholder, variants
+    return stale
+
+
+def download_original(image):
+    """The original's bytes, fetched from its delivery URL."""
+    response = requests.get(image.image_url or image.image.build_url(), timeout=30)
+    response.raise_for_status()
+    return response.content
+
+
+def reprocess(images, read=download_original, workers=4, storage=None):
+    """
+    Process a batch of BookImages from the originals `read(image)` returns,
+    `workers` images at a time (Pillow releases the GIL while resizing and
+    encoding), and write them with one bulk_update. Returns the processed
+    images, {image id: error} for the ones that failed, and the names of
+    the renditions that were replaced.
+    """
+    storage = storage or image_storage()
+
+    def attempt(image):
+        try:
+            return image, process(image, read(image), storage), None
+        except Exception as error:
+            return image, [], error
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(attempt, images))
+    processed = [image for image, _, error in results if error is None]
+    if processed:
+        BookImage.objects.bulk_update(processed, FIELDS)
+    failed = {image.pk: error for image, _, error in results if error is not None}
+    return processed, failed, [name for _, names, _ in results for name in names]
@@ -0,0 +1,63 @@
+import time
+import random
+import statistics
+from django.db import connection
+from django.core.management.base import BaseCommand
+from book import synthetic
+from book.models import BorrowRecord
+
+
+class Command(BaseCommand):
+    help = "Time the borrow/return hot-path lookups while the synthetic borrow history grows."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10000,100000,1000000',
+                            help="Comma-separated borrow history sizes to measure at.")
+        parser.add_argument('--books', type=int, default=20_000)
+        parser.add_argument('--members', type=int, default=5_000)
+        parser.add_argument('--samples', type=int, default=500)
+        parser.add_argument('--explain', action='store_true', help="Print the query plan of each lookup.")
+        parser.add_argument('--clear', action='store_true', help="Delete the synthetic data afterwards.")
+
+    def handle(self, *args, **options):
+        synthetic.generate_catalog(options['books'])
+        synthetic.generate_members(options['members'])
+        book_ids = list(synthetic.synthetic_books().values_list('id', flat=True))
+        member_ids = list(synthetic.synthetic_members().values_list('id', flat=True))
+        rng = random.Random(0)
+
+        lookups = {
+            'active borrow (book, member)': lambda b, m: BorrowRecord.objects.filter(
+                book_id=b, member_id=m, status='BORROWED').exists(),
+            'member history, first page': lambda b, m: list(BorrowRecord.objects.filter(
+                member_id=m).order_by('-borrow_date', '-id')[:8]),
+            'staff history, first page': lambda b, m: list(BorrowRecord.objects.order_by('-borrow_date', '-id')[:8]),
+        }
+
+        self.stdout.write(f"{'records':>10}  {'lookup':<30} {'mean µs':>10} {'p95 µs':>10}")
+        for size in sorted(int(value) for value in options['sizes'].split(',')):
+            synthetic.generate_borrow_history(size)
+            pairs = [(rng.choice(book_ids), rng.choice(member_ids)) for _ in range(options['samples'])]
+            for label, lookup in lookups.items():
+                timings = []
+                for book_id, member_id in pairs:
+                    started = time.perf_counter()
+                    lookup(book_id, member_id)
+                    timings.append((time.perf_counter() - started) * 1_000_000)
+                timings.sort()
+                p95 = timings[int(len(timings) * 0.95) - 1]
+                self.stdout.write(f"{size:>10}  {label:<30} {statistics.mean(timings):>10.1f} {p95:>10.1f}")
+            if options['explain']:
+                self.explain(*pairs[0])
+
+        if options['clear']:
+            synthetic.clear_catalog()
+
+    def explain(self, book_id, member_id):
+        queryset = BorrowRecord.objects.filter(book_id=book_id, member_id=member_id, status='BORROWED')
+        sql, params = queryset.query.sql_with_params()
+        prefix = 'EXPLAIN QUERY PLAN' if connection.vendor == 'sqlite' else 'EXPLAIN'
+        with connection.cursor() as cursor:
+            cursor.execute(f'{prefix} {sql}', params)
+            for row in cursor.fetchall():
+                self.stdout.write(f"    {row}")
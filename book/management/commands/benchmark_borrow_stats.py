@@ -0,0 +1,72 @@
+import time
+import statistics
+from django.utils import timezone
+from django.db.models import Count
+from django.db.models.functions import TruncMonth
+from django.core.management.base import BaseCommand
+from book import stats, synthetic
+from book.models import BorrowRecord
+
+
+def on_the_fly(today):
+    """The reports computed by scanning BorrowRecord instead of reading the maintained statistics."""
+    since = stats.months_back(today, 12)
+    return {
+        'most borrowed': lambda: list(BorrowRecord.objects.values('book').annotate(total=Count('id'))
+                                      .order_by('-total', 'book')[:10]),
+        'active loans per member': lambda: list(BorrowRecord.objects.filter(status='BORROWED').values('member')
+                                                .annotate(total=Count('id')).order_by('-total', 'member')[:10]),
+        'overdue': lambda: BorrowRecord.objects.filter(status='BORROWED', due_date__lt=today).count(),
+        'category per month': lambda: list(BorrowRecord.objects.filter(borrow_date__gte=since)
+                                           .annotate(month=TruncMonth('borrow_date'))
+                                           .values('book__category', 'month').annotate(total=Count('id'))),
+    }
+
+
+def maintained(today):
+    return {
+        'most borrowed': stats.most_borrowed_books,
+        'active loans per member': stats.active_loans_by_member,
+        'overdue': lambda: stats.overdue_summary(today),
+        'category per month': lambda: stats.category_monthly_borrows(12, today),
+    }
+
+
+class Command(BaseCommand):
+    help = "Time the circulation reports on the maintained statistics against aggregating BorrowRecord on the fly."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='100000,1000000,10000000',
+                            help="Comma-separated borrow history sizes to measure at.")
+        parser.add_argument('--books', type=int, default=50_000)
+        parser.add_argument('--members', type=int, default=10_000)
+        parser.add_argument('--samples', type=int, default=5)
+        parser.add_argument('--clear', action='store_true', help="Delete the synthetic data afterwards.")
+
+    def handle(self, *args, **options):
+        synthetic.generate_catalog(options['books'])
+        synthetic.generate_members(options['members'])
+        today = timezone.localdate()
+
+        self.stdout.write(f"{'records':>10}  {'report':<24} {'on the fly ms':>14} {'maintained ms':>14}")
+        for size in sorted(int(value) for value in options['sizes'].split(',')):
+            synthetic.generate_borrow_history(size)
+            started = time.perf_counter()
+            stats.rebuild_borrow_stats()
+            self.stdout.write(f"{size:>10}  rebuild_borrow_stats took {(time.perf_counter() - started):.1f} s")
+            fly, kept = on_the_fly(today), maintained(today)
+            for report in fly:
+                self.stdout.write(f"{size:>10}  {report:<24} {self.time(fly[report], options['samples']):>14.2f} "
+                                  f"{self.time(kept[report], options['samples']):>14.2f}")
+
+        if options['clear']:
+            synthetic.clear_catalog()
+            stats.rebuild_borrow_stats()
+
+    def time(self, report, samples):
+        timings = []
+        for _ in range(samples):
+            started = time.perf_counter()
+            report()
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
@@ -0,0 +1,77 @@
+import io
+import time
+import tempfile
+from PIL import Image, ImageFilter
+from django.core.files.storage import FileSystemStorage
+from django.core.management.base import BaseCommand, CommandError
+from book import images, synthetic
+from book.models import BookImage
+
+
+def synthetic_original(width, height, seed):
+    """A grainy JPEG of the given size, roughly as hard to resize and compress as a scanned cover."""
+    noise = Image.effect_noise((width, height), 24 + seed * 8).filter(ImageFilter.GaussianBlur(2))
+    gradient = Image.linear_gradient('L').rotate(seed * 45).resize((width, height))
+    stream = io.BytesIO()
+    Image.merge('RGB', (noise, gradient, noise.transpose(Image.Transpose.FLIP_LEFT_RIGHT))).save(stream, 'JPEG', quality=90)
+    return stream.getvalue()
+
+
+class Command(BaseCommand):
+    help = ("Measure batch re-processing throughput of the book image pipeline: synthetic originals are "
+            "rendered into every configured width and format, stored in a temporary directory, and the "
+            "images written back with bulk_update. No network is used.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--images', type=int, default=100)
+        parser.add_argument('--size', default='1600x2400', help="Original size, WIDTHxHEIGHT.")
+        parser.add_argument('--workers', default='1,2,4,8', help="Comma-separated worker counts to measure.")
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--clear', action='store_true', help="Delete the synthetic data afterwards.")
+
+    def handle(self, *args, **options):
+        try:
+            width, height = (int(value) for value in options['size'].lower().split('x'))
+            worker_counts = [int(value) for value in options['workers'].split(',')]
+        except ValueError:
+            raise CommandError("--size must be WIDTHxHEIGHT and --workers comma-separated integers.")
+        if min([width, height, options['images'], options['batch_size'], *worker_counts]) < 1:
+            raise CommandError("Sizes, counts and worker counts must be positive.")
+
+        synthetic.generate_catalog(options['images'])
+        book_ids = list(synthetic.synthetic_books().order_by('id').values_list('id', flat=True)[:options['images']])
+        existing = set(BookImage.objects.filter(book_id__in=book_ids, image__startswith='books/synthetic-')
+                       .values_list('book_id', flat=True))
+        BookImage.objects.bulk_create(BookImage(book_id=book_id, image=f'books/synthetic-{book_id}-cover')
+                                      for book_id in book_ids if book_id not in existing)
+        queryset = BookImage.objects.filter(book_id__in=book_ids, image__startswith='books/synthetic-').order_by('id')
+
+        originals = [synthetic_original(width, height, seed) for seed in range(4)]
+        read = lambda image: originals[image.pk % len(originals)]
+        source_bytes = sum(len(read(image)) for image in queryset)
+        megapixels = width * height / 1e6
+
+        self.stdout.write(f"{queryset.count()} originals of {width}x{height} ({source_bytes / queryset.count() / 1024:.0f} KiB each), "
+                          f"widths {', '.join(str(size) for size in images.variant_widths(width))}")
+        self.stdout.write(f"{'workers':>7} {'images/sec':>11} {'ms/image':>9} {'MP/sec':>8} {'KiB out/image':>14}")
+        with tempfile.TemporaryDirectory() as directory:
+            storage = FileSystemStorage(location=directory)
+            for workers in worker_counts:
+                done, stored, elapsed = 0, 0, 0.0
+                batch_size = options['batch_size']
+                for offset in range(0, len(book_ids), batch_size):
+                    batch = list(queryset[offset:offset + batch_size])
+                    started = time.perf_counter()
+                    processed, failed, stale = images.reprocess(batch, read, workers=workers, storage=storage)
+                    elapsed += time.perf_counter() - started
+                    if failed:
+                        raise CommandError(f"Processing failed: {next(iter(failed.values()))}")
+                    done += len(processed)
+                    stored += sum(storage.size(variant['name']) for image in processed for variant in image.variants)
+                    for name in stale:
+                        storage.delete(name)
+                self.stdout.write(f"{workers:>7} {done / elapsed:>11.1f} {elapsed / done * 1000:>9.1f} "
+                                  f"{done * megapixels / elapsed:>8.1f} {stored / done / 1024:>14.1f}")
+
+        if options['clear']:
+            synthetic.clear_catalog()
@@ -0,0 +1,55 @@
+import time
+import random
+import statistics
+from django.core.management.base import BaseCommand
+from book import recommendations, synthetic
+from book.models import BorrowRecord, CoBorrow, SimilarBook
+
+
+class Command(BaseCommand):
+    help = ("Time rebuilding the co-borrowing matrix and similar books from synthetic borrow histories of "
+            "growing size, then adding single borrows incrementally and reading /books/{id}/similar/.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='100000,1000000,10000000',
+                            help="Comma-separated borrow history sizes to measure at.")
+        parser.add_argument('--books', type=int, default=50_000)
+        parser.add_argument('--members', type=int, default=200_000)
+        parser.add_argument('--samples', type=int, default=100)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--clear', action='store_true', help="Delete the synthetic data afterwards.")
+
+    def handle(self, *args, **options):
+        synthetic.generate_catalog(options['books'])
+        synthetic.generate_members(options['members'])
+        rng = random.Random(options['seed'])
+        book_ids = list(synthetic.synthetic_books().values_list('id', flat=True))
+        member_ids = list(synthetic.synthetic_members().values_list('id', flat=True))
+
+        self.stdout.write(f"{'records':>10} {'rebuild s':>10} {'matrix cells':>13} {'similar rows':>13} "
+                          f"{'add borrow ms':>14} {'similar ms':>11}")
+        for size in sorted(int(value) for value in options['sizes'].split(',')):
+            synthetic.generate_borrow_history(size)
+            started = time.perf_counter()
+            recommendations.rebuild()
+            rebuilt = time.perf_counter() - started
+
+            adds = []
+            for _ in range(options['samples']):
+                record = BorrowRecord.objects.create(book_id=rng.choice(book_ids), member_id=rng.choice(member_ids),
+                                                     status='RETURNED')
+                started = time.perf_counter()
+                recommendations.apply_borrows(record.member_id, [record.pk])
+                adds.append((time.perf_counter() - started) * 1000)
+            lookups = []
+            for _ in range(options['samples']):
+                started = time.perf_counter()
+                recommendations.similar_books(rng.choice(book_ids))
+                lookups.append((time.perf_counter() - started) * 1000)
+
+            self.stdout.write(f"{size:>10} {rebuilt:>10.1f} {CoBorrow.objects.count():>13} {SimilarBook.objects.count():>13} "
+                              f"{statistics.median(adds):>14.2f} {statistics.median(lookups):>11.2f}")
+
+        if options['clear']:
+            synthetic.clear_catalog()
+            recommendations.rebuild()
@@ -0,0 +1,56 @@
+import time
+import random
+import statistics
+from django.core.management.base import BaseCommand
+from rest_framework.filters import SearchFilter
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from book import synthetic
+from book.views import BookViewSet
+from book.search import FullTextSearchFilter, search_backend
+
+
+class Command(BaseCommand):
+    help = "Compare catalog search latency of the icontains SearchFilter and the full-text search filter."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=100_000, help="Size of the synthetic catalog (e.g. 1000000).")
+        parser.add_argument('--queries', type=int, default=50, help="Number of search terms to time per filter.")
+        parser.add_argument('--page-size', type=int, default=8)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--clear', action='store_true', help="Delete the synthetic catalog afterwards.")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Search backend: {search_backend() or 'icontains fallback'}")
+        synthetic.generate_catalog(options['books'], authors=max(options['books'] // 100, 1), log=self.log_progress)
+
+        rng = random.Random(options['seed'])
+        terms = [' '.join(rng.sample(synthetic.WORDS, rng.randint(1, 2))) for _ in range(options['queries'])]
+        view = BookViewSet(action='list', format_kwarg=None)
+        view.search_fields = BookViewSet.search_fields
+
+        for label, backend in (('icontains', SearchFilter()), ('full-text', FullTextSearchFilter())):
+            timings = [self.time_query(backend, view, term, options['page_size']) for term in terms]
+            self.report(label, timings)
+
+        if options['clear']:
+            synthetic.clear_catalog()
+
+    def time_query(self, backend, view, term, page_size):
+        request = Request(APIRequestFactory().get('/api/v1/books/', {'search': term}))
+        view.request = request
+        started = time.perf_counter()
+        queryset = backend.filter_queryset(request, BookViewSet.queryset.all(), view)
+        queryset.count()
+        list(queryset[:page_size])
+        return (time.perf_counter() - started) * 1000
+
+    def report(self, label, timings):
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        self.stdout.write(
+            f"{label:>10}: mean {statistics.mean(timings):8.2f} ms  "
+            f"p50 {statistics.median(timings):8.2f} ms  p95 {p95:8.2f} ms")
+
+    def log_progress(self, message):
+        self.stdout.write(message)
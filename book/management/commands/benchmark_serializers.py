@@ -0,0 +1,65 @@
+import time
+import json
+import statistics
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+from book import synthetic
+from book.models import BookImage
+from book.views import BookViewSet
+from book.serializers import BookSerializer, BorrowRecordSerializer
+from book.representations import BookRepresentation, BorrowRecordRepresentation
+
+
+class Command(BaseCommand):
+    help = "Compare list serialization throughput of the nested ModelSerializers and the compact row representations."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, default=100)
+        parser.add_argument('--rounds', type=int, default=50)
+        parser.add_argument('--clear', action='store_true', help="Delete the synthetic data afterwards.")
+
+    def handle(self, *args, **options):
+        size = options['page_size']
+        synthetic.generate_catalog(max(size, 1_000))
+        synthetic.generate_members(200)
+        synthetic.generate_borrow_history(max(size, 1_000))
+        books = synthetic.synthetic_books()
+        page_ids = list(books.order_by('availability_status', 'title', 'id').values_list('id', flat=True)[:size])
+        if not BookImage.objects.filter(book_id__in=page_ids).exists():
+            BookImage.objects.bulk_create(
+                BookImage(book_id=book_id, image=f'books/synthetic-{book_id}-{side}')
+                for book_id in page_ids for side in ('cover', 'back'))
+
+        book_queryset = BookViewSet.queryset.filter(pk__in=books).order_by('availability_status', 'title', 'id')
+        record_queryset = (
+            synthetic.synthetic_borrow_records()
+            .select_related('book__author', 'book__category', 'member__user')
+            .prefetch_related('book__images').defer('book__search_vector').order_by('-borrow_date', '-id')
+        )
+        cases = [
+            ('books', 'serializer', lambda: BookSerializer(list(book_queryset[:size]), many=True).data),
+            ('books', 'compact', lambda: self.compact(BookRepresentation(), book_queryset, size)),
+            ('books', 'trimmed', lambda: self.compact(BookRepresentation(expand=()), book_queryset, size)),
+            ('borrow records', 'serializer', lambda: BorrowRecordSerializer(list(record_queryset[:size]), many=True).data),
+            ('borrow records', 'compact', lambda: self.compact(BorrowRecordRepresentation(), record_queryset, size)),
+            ('borrow records', 'trimmed', lambda: self.compact(BorrowRecordRepresentation(expand=()), record_queryset, size)),
+        ]
+
+        self.stdout.write(f"Page of {size} rows, {options['rounds']} rounds (query + serialize)")
+        self.stdout.write(f"{'list':<16} {'path':<12} {'rows/sec':>10} {'ms/page':>9} {'bytes/row':>10}")
+        for resource, label, serialize in cases:
+            serialize()
+            timings = []
+            for _ in range(options['rounds']):
+                started = time.perf_counter()
+                data = serialize()
+                timings.append(time.perf_counter() - started)
+            per_page = statistics.median(timings)
+            payload = len(json.dumps(data, cls=DjangoJSONEncoder)) / max(len(data), 1)
+            self.stdout.write(f"{resource:<16} {label:<12} {size / per_page:>10.0f} {per_page * 1000:>9.2f} {payload:>10.0f}")
+
+        if options['clear']:
+            synthetic.clear_catalog()
+
+    def compact(self, representation, queryset, size):
+        return representation.render(list(representation.values(queryset)[:size]))
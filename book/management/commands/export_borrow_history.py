@@ -0,0 +1,33 @@
+import sys
+from django.core.management.base import BaseCommand
+from book.models import BorrowRecord
+from book.catalog_io import FORMATS, HISTORY_FIELDS, detect_format, export_history, export_lines
+
+
+class Command(BaseCommand):
+    help = "Stream the borrow history out as CSV or JSONL without loading it into memory."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-', help="Output file, or - for stdout.")
+        parser.add_argument('--format', choices=FORMATS, help="Defaults to the file extension, then csv.")
+        parser.add_argument('--status', choices=[choice for choice, _ in BorrowRecord.STATUS_CHOICES])
+        parser.add_argument('--from', dest='borrowed_from', help="First borrow date to include (YYYY-MM-DD).")
+        parser.add_argument('--to', dest='borrowed_to', help="Last borrow date to include (YYYY-MM-DD).")
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or detect_format(options['path'])
+        records = BorrowRecord.objects.order_by('borrow_date', 'id')
+        if options['status']:
+            records = records.filter(status=options['status'])
+        if options['borrowed_from']:
+            records = records.filter(borrow_date__gte=options['borrowed_from'])
+        if options['borrowed_to']:
+            records = records.filter(borrow_date__lte=options['borrowed_to'])
+
+        lines = export_lines(export_history(records, chunk_size=options['chunk_size']), fmt, HISTORY_FIELDS)
+        if options['path'] == '-':
+            sys.stdout.writelines(lines)
+        else:
+            with open(options['path'], 'w', encoding='utf-8', newline='') as output:
+                output.writelines(lines)
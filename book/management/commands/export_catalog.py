@@ -0,0 +1,21 @@
+import sys
+from django.core.management.base import BaseCommand
+from book.catalog_io import FORMATS, detect_format, export_lines, export_rows
+
+
+class Command(BaseCommand):
+    help = "Stream the catalog out as CSV or JSONL without loading it into memory."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-', help="Output file, or - for stdout.")
+        parser.add_argument('--format', choices=FORMATS, help="Defaults to the file extension, then csv.")
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or detect_format(options['path'])
+        lines = export_lines(export_rows(chunk_size=options['chunk_size']), fmt)
+        if options['path'] == '-':
+            sys.stdout.writelines(lines)
+        else:
+            with open(options['path'], 'w', encoding='utf-8', newline='') as output:
+                output.writelines(lines)
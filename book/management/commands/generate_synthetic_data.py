@@ -0,0 +1,63 @@
+import time
+from django.db.models import Exists, OuterRef
+from django.core.management.base import BaseCommand, CommandError
+from book import recommendations, stats, synthetic
+from book.cache import invalidate_catalog
+from book.models import Book, BorrowRecord
+
+
+# (books, authors, categories, members, borrow records) per --scale preset.
+SCALES = {
+    '10k': (10_000, 100, 20, 1_000, 10_000),
+    '100k': (100_000, 1_000, 50, 10_000, 100_000),
+    '1m': (1_000_000, 10_000, 100, 100_000, 1_000_000),
+    '10m': (2_000_000, 50_000, 200, 500_000, 10_000_000),
+}
+
+
+class Command(BaseCommand):
+    help = ("Top the synthetic catalog, members and borrow history up to a preset scale (or explicit sizes) "
+            "with bulk inserts, then rebuild the maintained statistics and recommendations. Reruns only add what is missing, "
+            "so the same command brings a database to a known size for benchmarks and load tests.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=SCALES, default='10k')
+        parser.add_argument('--books', type=int)
+        parser.add_argument('--authors', type=int)
+        parser.add_argument('--categories', type=int)
+        parser.add_argument('--members', type=int)
+        parser.add_argument('--borrows', type=int, help="Borrow history rows.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--clear', action='store_true', help="Delete the existing synthetic data first.")
+
+    def handle(self, *args, **options):
+        defaults = dict(zip(('books', 'authors', 'categories', 'members', 'borrows'), SCALES[options['scale']]))
+        sizes = {name: default if options[name] is None else options[name] for name, default in defaults.items()}
+        if min(sizes.values()) < 0 or not sizes['authors'] or not sizes['categories']:
+            raise CommandError("Sizes must be positive (at least one author and one category).")
+        if sizes['borrows'] and not (sizes['books'] and sizes['members']):
+            raise CommandError("Borrow history needs books and members.")
+
+        if options['clear']:
+            synthetic.clear_catalog()
+
+        started = time.perf_counter()
+        log = lambda message: self.stdout.write(message)
+        synthetic.generate_catalog(sizes['books'], authors=sizes['authors'], categories=sizes['categories'],
+                                   seed=options['seed'], log=log)
+        synthetic.generate_members(sizes['members'])
+        if sizes['borrows']:
+            synthetic.generate_borrow_history(sizes['borrows'], seed=options['seed'], log=log)
+
+        # Synthetic history is bulk-inserted, so bring what circulation maintains in line with it.
+        active = BorrowRecord.objects.filter(book=OuterRef('pk'), status='BORROWED')
+        synthetic.synthetic_books().filter(Exists(active), availability_status=True).update(availability_status=False)
+        stats.rebuild_borrow_stats()
+        recommendations.rebuild()
+        invalidate_catalog()
+
+        self.stdout.write(f"{'books':<16} {synthetic.synthetic_books().count():>12}")
+        self.stdout.write(f"{'members':<16} {synthetic.synthetic_members().count():>12}")
+        self.stdout.write(f"{'borrow records':<16} {synthetic.synthetic_borrow_records().count():>12}")
+        self.stdout.write(f"{'available':<16} {Book.objects.filter(availability_status=True).count():>12}")
+        self.stdout.write(f"done in {time.perf_counter() - started:.1f} s")
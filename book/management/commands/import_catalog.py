@@ -0,0 +1,38 @@
+import sys
+import time
+from django.core.management.base import BaseCommand, CommandError
+from book.catalog_io import FORMATS, CatalogImporter, detect_format, read_rows, text_stream
+
+
+class Command(BaseCommand):
+    help = "Stream a CSV or JSONL catalog into the database, upserting books by ISBN."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Catalog file, or - for stdin.")
+        parser.add_argument('--format', choices=FORMATS, help="Defaults to the file extension, then csv.")
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or detect_format(options['path'])
+        self.started = time.perf_counter()
+        importer = CatalogImporter(chunk_size=options['chunk_size'], progress=self.log_progress)
+        try:
+            if options['path'] == '-':
+                report = importer.run(read_rows(text_stream(sys.stdin.buffer), fmt))
+            else:
+                with open(options['path'], 'rb') as binary:
+                    report = importer.run(read_rows(text_stream(binary), fmt))
+        except FileNotFoundError:
+            raise CommandError(f"No such file: {options['path']}")
+        except UnicodeDecodeError:
+            raise CommandError(f"The catalog must be UTF-8 encoded; stopped after {importer.report.rows} rows.")
+
+        for error in report.errors:
+            self.stderr.write(f"line {error['line']} ({error['isbn']}): {error['error']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {report.rows} rows: {report.created} created, {report.updated} updated, "
+            f"{report.images} images, {report.failed} failed."))
+
+    def log_progress(self, report):
+        elapsed = time.perf_counter() - self.started
+        self.stdout.write(f"{report.rows} rows in {elapsed:.1f}s ({report.rows / max(elapsed, 1e-9):.0f} rows/s)")
@@ -0,0 +1,35 @@
+import time
+from django.utils.dateparse import parse_date
+from django.core.management.base import BaseCommand, CommandError
+from book.overdue import process_overdue_loans
+
+
+class Command(BaseCommand):
+    help = ("Flag active loans past their due date and bring their fines up to date. Meant to run daily "
+            "from cron, e.g. `15 0 * * * python manage.py process_overdue_loans`; only overdue loans are "
+            "read, and a second run on the same day writes nothing.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help="Process as of this day (YYYY-MM-DD) instead of today.")
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        today = None
+        if options['date']:
+            try:
+                today = parse_date(options['date'])
+            except ValueError:
+                today = None
+            if today is None:
+                raise CommandError("--date must be a date (YYYY-MM-DD).")
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size must be positive.")
+
+        started = time.perf_counter()
+        progress = lambda totals: self.stdout.write(f"{totals['overdue']} overdue loans processed", ending='\r')
+        totals = process_overdue_loans(today, chunk_size=options['chunk_size'],
+                                       progress=progress if options['verbosity'] > 1 else None)
+        self.stdout.write(f"{'overdue loans':<16} {totals['overdue']:>10}")
+        self.stdout.write(f"{'newly overdue':<16} {totals['flagged']:>10}")
+        self.stdout.write(f"{'updated':<16} {totals['updated']:>10}")
+        self.stdout.write(self.style.SUCCESS(f"Processed overdue loans in {time.perf_counter() - started:.2f} s."))
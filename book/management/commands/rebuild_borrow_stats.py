@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from book.stats import rebuild_borrow_stats
+
+
+class Command(BaseCommand):
+    help = ("Recompute the borrowing statistics (book/member counters, monthly category borrows, "
+            "active loans per day) from BorrowRecord.")
+
+    def handle(self, *args, **options):
+        rebuild_borrow_stats()
+        self.stdout.write(self.style.SUCCESS("Rebuilt borrowing statistics."))
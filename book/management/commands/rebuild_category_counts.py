@@ -0,0 +1,15 @@
+from django.db import transaction
+from django.core.management.base import BaseCommand
+from book.models import Category
+
+
+class Command(BaseCommand):
+    help = "Recompute Category.book_count from the books table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('category_ids', nargs='*', type=int, help="Only rebuild these categories.")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            updated = Category.rebuild_book_counts(options['category_ids'] or None)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt book counts for {updated} categories."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from book.recommendations import rebuild
+
+
+class Command(BaseCommand):
+    help = ("Recompute the co-borrowing matrix and every book's similar books from BorrowRecord. "
+            "Borrows are added as they happen; a rebuild also refreshes the scores of books left untouched.")
+
+    def handle(self, *args, **options):
+        rebuild()
+        self.stdout.write(self.style.SUCCESS("Rebuilt book recommendations."))
@@ -0,0 +1,47 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from book import images
+from book.models import BookImage
+
+
+class Command(BaseCommand):
+    help = ("Render the resized renditions and placeholders of existing book images from their originals: "
+            "by default the images that have none (e.g. imported ones), with --all every image, e.g. after "
+            "changing BOOK_IMAGE_WIDTHS.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="Re-render images that already have renditions too.")
+        parser.add_argument('--workers', type=int, default=4, help="Images downloaded and rendered at a time.")
+        parser.add_argument('--batch-size', type=int, default=50)
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1 or options['batch_size'] < 1:
+            raise CommandError("--workers and --batch-size must be positive.")
+
+        queryset = BookImage.objects.exclude(image='').order_by('id')
+        if not options['all']:
+            queryset = queryset.filter(variants=[])
+        storage = images.image_storage()
+        started = time.perf_counter()
+        done = failed = 0
+        last = 0
+        while True:
+            batch = list(queryset.filter(pk__gt=last)[:options['batch_size']])
+            if not batch:
+                break
+            last = batch[-1].pk
+            processed, errors, stale = images.reprocess(batch, workers=options['workers'], storage=storage)
+            for name in stale:
+                storage.delete(name)
+            for pk, error in errors.items():
+                self.stderr.write(f"Image {pk}: {error}")
+            done += len(processed)
+            failed += len(errors)
+            if options['verbosity'] > 1:
+                self.stdout.write(f"{done} images processed", ending='\r')
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"{'processed':<10} {done:>8}")
+        self.stdout.write(f"{'failed':<10} {failed:>8}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Re-processed book images in {elapsed:.2f} s ({done / elapsed if elapsed else 0:.1f} images/s)."))
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:37
+
+import book.models
+from django.db import migrations
+
+
+def populate_image_urls(apps, schema_editor):
+    BookImage = apps.get_model('book', 'BookImage')
+    batch = []
+    for book_image in BookImage.objects.exclude(image='').iterator(chunk_size=500):
+        book_image.image_url = book_image.image.build_url()
+        batch.append(book_image)
+        if len(batch) >= 500:
+            BookImage.objects.bulk_update(batch, ['image_url'])
+            batch = []
+    if batch:
+        BookImage.objects.bulk_update(batch, ['image_url'])
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0005_alter_book_options'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bookimage',
+            name='image_url',
+            field=book.models.CloudinaryURLField(blank=True, editable=False, max_length=500, source_field='image'),
+        ),
+        migrations.RunPython(populate_image_urls, migrations.RunPython.noop),
+    ]
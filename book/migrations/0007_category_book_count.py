@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:38
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def populate_book_counts(apps, schema_editor):
+    Book = apps.get_model('book', 'Book')
+    Category = apps.get_model('book', 'Category')
+    counts = Book.objects.filter(category=OuterRef('pk')).order_by().values('category').annotate(total=Count('id')).values('total')
+    Category.objects.update(book_count=Coalesce(Subquery(counts), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0006_bookimage_image_url'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='book_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of books in this category, maintained on book writes.'),
+        ),
+        migrations.RunPython(populate_book_counts, migrations.RunPython.noop),
+    ]
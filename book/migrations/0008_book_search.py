@@ -0,0 +1,73 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:39
+
+import django.contrib.postgres.search
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.operations import TrigramExtension
+from django.contrib.postgres.search import SearchVector
+
+
+SEARCH_CONFIG = 'english'
+
+
+def postgres_indexes(apps):
+    Author = apps.get_model('book', 'Author')
+    Book = apps.get_model('book', 'Book')
+    return [
+        (Book, GinIndex(fields=['search_vector'], name='book_search_vector_gin')),
+        (Book, GinIndex(OpClass('title', name='gin_trgm_ops'), name='book_title_trgm')),
+        (Author, GinIndex(SearchVector('name', 'biography', config=SEARCH_CONFIG), name='author_search_gin')),
+        (Author, GinIndex(OpClass('name', name='gin_trgm_ops'), name='author_name_trgm')),
+    ]
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        for model, index in postgres_indexes(apps):
+            schema_editor.add_index(model, index)
+        Author = apps.get_model('book', 'Author')
+        Book = apps.get_model('book', 'Book')
+        author = Author.objects.filter(pk=OuterRef('author_id'))
+        Book.objects.update(search_vector=(
+            SearchVector('title', weight='A', config=SEARCH_CONFIG)
+            + SearchVector(Subquery(author.values('name')[:1]), weight='B', config=SEARCH_CONFIG)
+            + SearchVector(Subquery(author.values('biography')[:1]), weight='D', config=SEARCH_CONFIG)
+        ))
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE book_book_fts USING fts5("
+            "title, author_name, biography, tokenize='porter unicode61')"
+        )
+        schema_editor.execute(
+            "INSERT INTO book_book_fts (rowid, title, author_name, biography) "
+            "SELECT b.id, b.title, COALESCE(a.name, ''), COALESCE(a.biography, '') "
+            "FROM book_book b LEFT JOIN book_author a ON a.id = b.author_id"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        for model, index in postgres_indexes(apps):
+            schema_editor.remove_index(model, index)
+    elif vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS book_book_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0007_category_book_count'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='book',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, help_text='Full-text document (title, author name and biography) used on PostgreSQL.', null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
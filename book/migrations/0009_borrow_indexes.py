@@ -0,0 +1,44 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:41
+
+from django.db import migrations, models
+from django.db.models import Count, F, Max
+
+
+def close_duplicate_active_borrows(apps, schema_editor):
+    # Only racing borrow requests could produce these; keep the newest active row per (book, member).
+    BorrowRecord = apps.get_model('book', 'BorrowRecord')
+    duplicates = (
+        BorrowRecord.objects.filter(status='BORROWED')
+        .values('book', 'member').annotate(rows=Count('id'), keep=Max('id')).filter(rows__gt=1)
+    )
+    for duplicate in duplicates.iterator():
+        BorrowRecord.objects.filter(
+            book=duplicate['book'], member=duplicate['member'], status='BORROWED', id__lt=duplicate['keep'],
+        ).update(status='RETURNED', return_date=F('borrow_date'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0008_book_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['availability_status', 'title', 'id'], name='book_catalog_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='borrowrecord',
+            index=models.Index(fields=['-borrow_date', '-id'], name='borrow_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='borrowrecord',
+            index=models.Index(fields=['member', '-borrow_date', '-id'], name='borrow_member_recent_idx'),
+        ),
+        migrations.RunPython(close_duplicate_active_borrows, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='borrowrecord',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'BORROWED')), fields=('book', 'member'), name='unique_active_borrow'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+from collections import defaultdict
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+
+def collapse_returned_records(apps, schema_editor):
+    # return_book used to insert a second RETURNED row and leave the original BORROWED row behind.
+    # Fold each such pair into the original row, which is what return_book now updates in place.
+    # The RETURNED row's borrow_date was stamped on the return day (auto_now_add), so pairs are matched
+    # on (book, member) alone: in one scan by id, each RETURNED row closes the earliest still-open
+    # BORROWED row before it and lends it its return_date. The writes are then batched.
+    BorrowRecord = apps.get_model('book', 'BorrowRecord')
+    rows = (BorrowRecord.objects.filter(status__in=['BORROWED', 'RETURNED']).order_by('id')
+            .values_list('id', 'book_id', 'member_id', 'status', 'return_date'))
+    pairs, open_ids = [], defaultdict(list)
+    for pk, book_id, member_id, status, return_date in rows.iterator(chunk_size=BATCH_SIZE):
+        if status == 'BORROWED':
+            open_ids[book_id, member_id].append(pk)
+        elif open_ids[book_id, member_id]:
+            pairs.append((open_ids[book_id, member_id].pop(0), pk, return_date))
+
+    for start in range(0, len(pairs), BATCH_SIZE):
+        batch = pairs[start:start + BATCH_SIZE]
+        BorrowRecord.objects.bulk_update(
+            [BorrowRecord(pk=original, status='RETURNED', return_date=return_date)
+             for original, _, return_date in batch],
+            ['status', 'return_date'])
+        BorrowRecord.objects.filter(pk__in=[returned for _, returned, _ in batch]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0009_borrow_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(collapse_returned_records, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,95 @@
+# Generated by Django 5.2.4 on 2026-10-18 12:01
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, TruncMonth
+
+
+def populate_borrow_stats(apps, schema_editor):
+    Book = apps.get_model('book', 'Book')
+    Member = apps.get_model('book', 'Member')
+    BorrowRecord = apps.get_model('book', 'BorrowRecord')
+    ActiveLoanDay = apps.get_model('book', 'ActiveLoanDay')
+    CategoryMonthlyBorrows = apps.get_model('book', 'CategoryMonthlyBorrows')
+
+    borrows = BorrowRecord.objects.filter(book=OuterRef('pk')).order_by().values('book').annotate(total=Count('id')).values('total')
+    Book.objects.update(borrow_count=Coalesce(Subquery(borrows), Value(0)))
+    records = BorrowRecord.objects.filter(member=OuterRef('pk')).order_by().values('member')
+    Member.objects.update(
+        borrow_count=Coalesce(Subquery(records.annotate(total=Count('id')).values('total')), Value(0)),
+        active_loan_count=Coalesce(Subquery(records.filter(status='BORROWED').annotate(total=Count('id')).values('total')), Value(0)),
+    )
+    monthly = BorrowRecord.objects.annotate(month=TruncMonth('borrow_date')).order_by().values('book__category', 'month').annotate(total=Count('id'))
+    CategoryMonthlyBorrows.objects.bulk_create(
+        (CategoryMonthlyBorrows(category_id=row['book__category'], month=row['month'], borrow_count=row['total']) for row in monthly.iterator()),
+        batch_size=5000)
+    active = BorrowRecord.objects.filter(status='BORROWED').order_by().values('borrow_date').annotate(total=Count('id'))
+    ActiveLoanDay.objects.bulk_create(
+        (ActiveLoanDay(borrow_date=row['borrow_date'], active_count=row['total']) for row in active.iterator()),
+        batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0010_collapse_returned_borrow_records'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActiveLoanDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('borrow_date', models.DateField(unique=True)),
+                ('active_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CategoryMonthlyBorrows',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the month.')),
+                ('borrow_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='borrow_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Times this book has been borrowed, maintained by book/stats.py.'),
+        ),
+        migrations.AddField(
+            model_name='member',
+            name='active_loan_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Books currently on loan, maintained by book/stats.py.'),
+        ),
+        migrations.AddField(
+            model_name='member',
+            name='borrow_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Books borrowed so far, maintained by book/stats.py.'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['-borrow_count', 'id'], name='book_most_borrowed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='member',
+            index=models.Index(fields=['-active_loan_count', 'id'], name='member_active_loans_idx'),
+        ),
+        migrations.AddField(
+            model_name='categorymonthlyborrows',
+            name='category',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='monthly_borrows', to='book.category'),
+        ),
+        migrations.AddConstraint(
+            model_name='categorymonthlyborrows',
+            constraint=models.UniqueConstraint(fields=('category', 'month'), name='unique_category_month'),
+        ),
+        migrations.AddConstraint(
+            model_name='categorymonthlyborrows',
+            constraint=models.UniqueConstraint(condition=models.Q(('category__isnull', True)), fields=('month',), name='unique_uncategorized_month'),
+        ),
+        migrations.RunPython(populate_borrow_stats, migrations.RunPython.noop),
+    ]
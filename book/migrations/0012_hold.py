@@ -0,0 +1,30 @@
+# Generated by Django 5.2.4 on 2026-10-18 12:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0011_borrow_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Hold',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('WAITING', 'Waiting'), ('FULFILLED', 'Fulfilled'), ('CANCELLED', 'Cancelled')], default='WAITING', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('resolved_at', models.DateTimeField(blank=True, null=True)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='holds', to='book.book')),
+                ('borrow_record', models.OneToOneField(blank=True, help_text='The loan the hold was fulfilled with.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='hold', to='book.borrowrecord')),
+                ('member', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='holds', to='book.member')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('status', 'WAITING')), fields=['book', 'id'], name='hold_queue_idx'), models.Index(fields=['member', '-id'], name='hold_member_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status', 'WAITING')), fields=('book', 'member'), name='unique_waiting_hold')],
+            },
+        ),
+    ]
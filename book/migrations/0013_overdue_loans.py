@@ -0,0 +1,50 @@
+# Generated by Django 5.2.4 on 2026-10-18 12:26
+
+import django.core.validators
+from datetime import timedelta
+from django.conf import settings
+from django.db import migrations, models
+
+
+def set_due_dates(apps, schema_editor):
+    # Loans still out get the default loan period; one UPDATE per borrow day keeps this set-based.
+    BorrowRecord = apps.get_model('book', 'BorrowRecord')
+    active = BorrowRecord.objects.filter(status='BORROWED', due_date__isnull=True)
+    period = timedelta(days=settings.LOAN_PERIOD_DAYS)
+    for day in active.order_by().values_list('borrow_date', flat=True).distinct():
+        active.filter(borrow_date=day).update(due_date=day + period)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0012_hold'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='borrowrecord',
+            name='due_date',
+            field=models.DateField(blank=True, help_text="Set at checkout from the loan period of the book's category.", null=True),
+        ),
+        migrations.AddField(
+            model_name='borrowrecord',
+            name='fine',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Late fee accrued so far, final once returned.', max_digits=8),
+        ),
+        migrations.AddField(
+            model_name='borrowrecord',
+            name='overdue',
+            field=models.BooleanField(default=False, help_text='Kept past its due date; set by book/overdue.py.'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='loan_period_days',
+            field=models.PositiveSmallIntegerField(blank=True, help_text='Days books in this category may be kept; LOAN_PERIOD_DAYS when empty.', null=True, validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+        migrations.AddIndex(
+            model_name='borrowrecord',
+            index=models.Index(condition=models.Q(('status', 'BORROWED')), fields=['due_date', 'id'], name='borrow_active_due_idx'),
+        ),
+        migrations.RunPython(set_due_dates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.4 on 2026-10-18 12:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0013_overdue_loans'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bookimage',
+            name='height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='bookimage',
+            name='placeholder',
+            field=models.TextField(blank=True, editable=False, help_text='Tiny blurred WebP data URI to show while the image loads.'),
+        ),
+        migrations.AddField(
+            model_name='bookimage',
+            name='variants',
+            field=models.JSONField(blank=True, default=list, editable=False, help_text='Resized WebP and JPEG/PNG renditions (name, url, type, width, height), written by book/images.py.'),
+        ),
+        migrations.AddField(
+            model_name='bookimage',
+            name='width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+    ]
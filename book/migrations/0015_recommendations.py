@@ -0,0 +1,81 @@
+# Generated by Django 5.2.4 on 2026-10-18 12:59
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_recommendations(apps, schema_editor):
+    statements = [
+        '''
+        CREATE TEMPORARY TABLE coborrow_history AS
+        WITH firsts AS (
+            SELECT member_id, book_id, MIN(id) AS first_id FROM book_borrowrecord GROUP BY member_id, book_id
+        ), ranked AS (
+            SELECT member_id, book_id, ROW_NUMBER() OVER (PARTITION BY member_id ORDER BY first_id) AS place FROM firsts
+        )
+        SELECT member_id, book_id FROM ranked WHERE place <= %(limit)s
+        ''',
+        'CREATE INDEX coborrow_history_member ON coborrow_history (member_id, book_id)',
+        '''
+        INSERT INTO book_coborrow (book_id, other_id, members)
+        SELECT a.book_id, b.book_id, COUNT(*)
+        FROM coborrow_history a JOIN coborrow_history b ON b.member_id = a.member_id AND b.book_id > a.book_id
+        GROUP BY a.book_id, b.book_id
+        ''',
+        'INSERT INTO book_coborrow (book_id, other_id, members) SELECT other_id, book_id, members FROM book_coborrow WHERE book_id < other_id',
+        'INSERT INTO book_coborrow (book_id, other_id, members) SELECT book_id, book_id, COUNT(*) FROM coborrow_history GROUP BY book_id',
+        'DROP TABLE coborrow_history',
+        '''
+        INSERT INTO book_similarbook (book_id, similar_id, score, rank)
+        SELECT book_id, other_id, score, place FROM (
+            SELECT p.book_id, p.other_id, p.members / SQRT(CAST(d.members AS FLOAT) * e.members) AS score,
+                   ROW_NUMBER() OVER (PARTITION BY p.book_id
+                                      ORDER BY p.members / SQRT(CAST(d.members AS FLOAT) * e.members) DESC, p.other_id) AS place
+            FROM book_coborrow p
+            JOIN book_coborrow d ON d.book_id = p.book_id AND d.other_id = p.book_id
+            JOIN book_coborrow e ON e.book_id = p.other_id AND e.other_id = p.other_id
+            WHERE p.book_id <> p.other_id
+        ) ranked WHERE place <= %(top_k)s
+        ''',
+    ]
+    params = {'limit': settings.RECOMMENDATIONS_MEMBER_BOOKS, 'top_k': settings.RECOMMENDATIONS_TOP_K}
+    with schema_editor.connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql, params)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0014_bookimage_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CoBorrow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('members', models.PositiveIntegerField(default=0)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='book.book')),
+                ('other', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='book.book')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('book', 'other'), name='unique_coborrow_pair')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SimilarBook',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(help_text="Cosine similarity of the two books' borrower sets.")),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_books', to='book.book')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='book.book')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('book', 'rank'), name='unique_similar_book_rank')],
+            },
+        ),
+        migrations.RunPython(populate_recommendations, migrations.RunPython.noop),
+    ]
@@ -1,14 +1,49 @@
-from django.db import models
 from django.conf import settings
+from django.db import models, transaction
+from django.core.validators import MinValueValidator
+from django.db.models import Count, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
 from cloudinary.models import CloudinaryField
+from django.contrib.postgres.search import SearchVectorField
+
+
+class CloudinaryURLField(models.URLField):
+    """Stores the delivery URL of a sibling CloudinaryField, resolved once at save time."""
+
+    def __init__(self, *args, source_field='image', **kwargs):
+        self.source_field = source_field
+        kwargs.setdefault('max_length', 500)
+        kwargs.setdefault('blank', True)
+        kwargs.setdefault('editable', False)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs['source_field'] = self.source_field
+        return name, path, args, kwargs
+
+    def pre_save(self, model_instance, add):
+        source = model_instance._meta.get_field(self.source_field)
+        resource = source.to_python(getattr(model_instance, source.attname))
+        url = resource.build_url() if resource else ''
+        setattr(model_instance, self.attname, url)
+        return url
 
 
 class Category(models.Model):
     name = models.CharField(max_length=100)
+    book_count = models.PositiveIntegerField(default=0, editable=False, help_text="Number of books in this category, maintained on book writes.")
+    loan_period_days = models.PositiveSmallIntegerField(null=True, blank=True, validators=[MinValueValidator(1)], help_text="Days books in this category may be kept; LOAN_PERIOD_DAYS when empty.")
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def rebuild_book_counts(cls, category_ids=None):
+        counts = Book.objects.filter(category=OuterRef('pk')).order_by().values('category').annotate(total=Count('id')).values('total')
+        categories = cls.objects.all() if category_ids is None else cls.objects.filter(pk__in=category_ids)
+        return categories.update(book_count=Coalesce(Subquery(counts), Value(0)))
+
 
 class Author(models.Model):
     name = models.CharField(max_length=100)
@@ -24,21 +59,44 @@ class Book(models.Model):
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, related_name='books')
     isbn = models.CharField(max_length=13, unique=True, help_text="Unique 10 or 13-digit ISBN.")
     availability_status = models.BooleanField(default=True, help_text="True if available for borrowing.")
+    search_vector = SearchVectorField(null=True, editable=False, help_text="Full-text document (title, author name and biography) used on PostgreSQL.")
+    borrow_count = models.PositiveIntegerField(default=0, editable=False, help_text="Times this book has been borrowed, maintained by book/stats.py.")
 
     class Meta:
         ordering = ['availability_status', 'title']
+        indexes = [
+            models.Index(fields=['availability_status', 'title', 'id'], name='book_catalog_order_idx'),
+            models.Index(fields=['-borrow_count', 'id'], name='book_most_borrowed_idx'),
+        ]
 
     def __str__(self):
         return self.title
+
+    def save(self, *args, **kwargs):
+        # Keeps the insert/update and the Category.book_count bookkeeping in book/signals.py atomic.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
     
 class BookImage(models.Model):
     book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='images')
     image = CloudinaryField('image')
+    image_url = CloudinaryURLField(source_field='image')
+    width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    placeholder = models.TextField(blank=True, editable=False, help_text="Tiny blurred WebP data URI to show while the image loads.")
+    variants = models.JSONField(default=list, blank=True, editable=False, help_text="Resized WebP and JPEG/PNG renditions (name, url, type, width, height), written by book/images.py.")
 
 
 class Member(models.Model):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     membership_date = models.DateField(auto_now_add=True)
+    borrow_count = models.PositiveIntegerField(default=0, editable=False, help_text="Books borrowed so far, maintained by book/stats.py.")
+    active_loan_count = models.PositiveIntegerField(default=0, editable=False, help_text="Books currently on loan, maintained by book/stats.py.")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-active_loan_count', 'id'], name='member_active_loans_idx'),
+        ]
 
     def __str__(self):
         return self.user.username
@@ -55,9 +113,99 @@ class BorrowRecord(models.Model):
     book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='borrow_records')
     member = models.ForeignKey(Member, on_delete=models.CASCADE)
     borrow_date = models.DateField(auto_now_add=True)
+    due_date = models.DateField(null=True, blank=True, help_text="Set at checkout from the loan period of the book's category.")
     return_date = models.DateField(null=True, blank=True)
+    overdue = models.BooleanField(default=False, help_text="Kept past its due date; set by book/overdue.py.")
+    fine = models.DecimalField(max_digits=8, decimal_places=2, default=0, help_text="Late fee accrued so far, final once returned.")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['book', 'member'], condition=Q(status='BORROWED'), name='unique_active_borrow'),
+        ]
+        indexes = [
+            models.Index(fields=['-borrow_date', '-id'], name='borrow_recent_idx'),
+            models.Index(fields=['member', '-borrow_date', '-id'], name='borrow_member_recent_idx'),
+            models.Index(fields=['due_date', 'id'], condition=Q(status='BORROWED'), name='borrow_active_due_idx'),
+        ]
 
     def __str__(self):
         return f"{self.member} borrowed {self.book}"
 
 
+class Hold(models.Model):
+    """A member's place in the waitlist for a book that is out; each queue is served in id order."""
+    STATUS_CHOICES = [
+        ('WAITING', 'Waiting'),
+        ('FULFILLED', 'Fulfilled'),
+        ('CANCELLED', 'Cancelled'),
+    ]
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='holds')
+    member = models.ForeignKey(Member, on_delete=models.CASCADE, related_name='holds')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='WAITING')
+    created_at = models.DateTimeField(auto_now_add=True)
+    resolved_at = models.DateTimeField(null=True, blank=True)
+    borrow_record = models.OneToOneField(BorrowRecord, on_delete=models.SET_NULL, null=True, blank=True,
+                                         related_name='hold', help_text="The loan the hold was fulfilled with.")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['book', 'member'], condition=Q(status='WAITING'), name='unique_waiting_hold'),
+        ]
+        indexes = [
+            models.Index(fields=['book', 'id'], condition=Q(status='WAITING'), name='hold_queue_idx'),
+            models.Index(fields=['member', '-id'], name='hold_member_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.member} is waiting for {self.book}"
+
+
+class CategoryMonthlyBorrows(models.Model):
+    """Borrows per category (None for uncategorized books) per calendar month."""
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, null=True, related_name='monthly_borrows')
+    month = models.DateField(help_text="First day of the month.")
+    borrow_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['category', 'month'], name='unique_category_month'),
+            models.UniqueConstraint(fields=['month'], condition=Q(category__isnull=True), name='unique_uncategorized_month'),
+        ]
+
+
+class ActiveLoanDay(models.Model):
+    """Loans still out, grouped by the day they were borrowed; the reports sum them into the active loan total."""
+    borrow_date = models.DateField(unique=True)
+    active_count = models.PositiveIntegerField(default=0)
+
+
+class CoBorrow(models.Model):
+    """
+    One nonzero cell of the sparse book-by-book co-occurrence matrix: how many
+    members borrowed both `book` and `other`. Both orientations are stored so
+    each book's row is one index range; the diagonal (book == other) holds the
+    number of members who borrowed the book. Maintained by book/recommendations.py.
+    """
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+')
+    other = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+')
+    members = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['book', 'other'], name='unique_coborrow_pair'),
+        ]
+
+
+class SimilarBook(models.Model):
+    """The precomputed top RECOMMENDATIONS_TOP_K books borrowed by the members who borrowed `book`, best first."""
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='similar_books')
+    similar = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField(help_text="Cosine similarity of the two books' borrower sets.")
+    rank = models.PositiveSmallIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['book', 'rank'], name='unique_similar_book_rank'),
+        ]
@@ -0,0 +1,85 @@
+from decimal import Decimal
+from datetime import date, timedelta
+from django.conf import settings
+from django.utils import timezone
+from django.dispatch import Signal
+from django.db.models import Q
+from book.models import Book, BorrowRecord, Category
+
+
+# Sent after each processed chunk with `record_ids` of the loans that just became overdue. Connect reminders here.
+loans_overdue = Signal()
+
+
+def loan_periods(category_ids):
+    """{category id: days a loan lasts} for `category_ids`, falling back to LOAN_PERIOD_DAYS (and for None)."""
+    category_ids = set(category_ids)
+    ids = category_ids - {None}
+    own = dict(Category.objects.filter(pk__in=ids, loan_period_days__isnull=False)
+               .values_list('id', 'loan_period_days')) if ids else {}
+    return {pk: own.get(pk, settings.LOAN_PERIOD_DAYS) for pk in category_ids}
+
+
+def loan_period(book):
+    if book.category_id is not None and Book.category.is_cached(book):
+        return book.category.loan_period_days or settings.LOAN_PERIOD_DAYS
+    return loan_periods([book.category_id])[book.category_id]
+
+
+def due_date(days, borrow_date=None):
+    # Same clock as BorrowRecord.borrow_date's auto_now_add.
+    return (borrow_date or date.today()) + timedelta(days=days)
+
+
+def fine_for(due, day):
+    """OVERDUE_FINE_PER_DAY for every day past `due` up to `day`, capped at OVERDUE_FINE_MAX."""
+    late = (day - due).days if due else 0
+    if late <= 0:
+        return Decimal('0.00')
+    return min(settings.OVERDUE_FINE_PER_DAY * late, settings.OVERDUE_FINE_MAX)
+
+
+def is_overdue(today=None):
+    """Loans still out past their due date: a range over the borrow_active_due_idx index."""
+    return Q(status='BORROWED', due_date__lt=today or timezone.localdate())
+
+
+def process_overdue_loans(today=None, chunk_size=2000, progress=None):
+    """
+    Flag the active loans past their due date and bring their fines up to
+    `today`. Walks the overdue range of the active-loan index one keyset
+    chunk at a time and writes each chunk with a single bulk_update, skipping
+    loans that are already up to date, so a run costs two queries per chunk
+    of overdue loans however large the borrow history is. Returns the totals.
+    """
+    today = today or timezone.localdate()
+    loans = BorrowRecord.objects.filter(is_overdue(today)).order_by('due_date', 'id').only('id', 'due_date', 'overdue', 'fine')
+    totals = {'overdue': 0, 'flagged': 0, 'updated': 0}
+    last = None
+    while True:
+        chunk = loans if last is None else loans.filter(Q(due_date__gt=last.due_date) | Q(due_date=last.due_date, id__gt=last.pk))
+        chunk = list(chunk[:chunk_size])
+        if not chunk:
+            break
+        last = chunk[-1]
+
+        changed, flagged = [], []
+        for record in chunk:
+            fine = fine_for(record.due_date, today)
+            if record.overdue and record.fine == fine:
+                continue
+            if not record.overdue:
+                flagged.append(record.pk)
+            record.overdue, record.fine = True, fine
+            changed.append(record)
+        # A loan returned since the read gets the same values return_book just wrote for today.
+        BorrowRecord.objects.bulk_update(changed, ['overdue', 'fine'], batch_size=chunk_size)
+        if flagged:
+            loans_overdue.send(sender=BorrowRecord, record_ids=flagged)
+
+        totals['overdue'] += len(chunk)
+        totals['flagged'] += len(flagged)
+        totals['updated'] += len(changed)
+        if progress:
+            progress(totals)
+    return totals
@@ -1,5 +1,169 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from functools import reduce
+from operator import and_, or_
+from django.db.models import Q
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, Cursor, CursorPagination, PageNumberPagination
 
 
 class DefaultPagination(PageNumberPagination):
-    page_size = 8
\ No newline at end of file
+    page_size = 8
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination over a composite, unique ordering.
+
+    DRF's CursorPagination only keys on the first ordering field and falls back
+    to an offset for ties, which degrades to an OFFSET scan on low-cardinality
+    fields such as `availability_status`. Here the cursor carries the full
+    ordering tuple, so every page is a single range query with no COUNT.
+    """
+    page_size = 8
+
+    def get_ordering(self, request, queryset, view):
+        return tuple(self.ordering)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse = bool(self.cursor and self.cursor.reverse)
+
+        ordering = self.reverse_ordering() if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        try:
+            position = self.decode_position(self.cursor, queryset.model)
+            if position is not None:
+                queryset = queryset.filter(self.position_filter(position, ordering))
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+
+        if reverse:
+            self.page = list(reversed(self.page))
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+
+        self.display_page_controls = self.has_next or self.has_previous
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        cursor = Cursor(offset=0, reverse=False, position=self.encode_position(self.page[-1]))
+        return self.encode_cursor(cursor)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        cursor = Cursor(offset=0, reverse=True, position=self.encode_position(self.page[0]))
+        return self.encode_cursor(cursor)
+
+    def reverse_ordering(self):
+        return tuple(field[1:] if field.startswith('-') else '-' + field for field in self.ordering)
+
+    def position_filter(self, position, ordering):
+        # (a, b, c) > (x, y, z)  ==  a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z)
+        clauses = []
+        for index, field in enumerate(ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            equal = [Q(**{ordering[i].lstrip('-'): position[i]}) for i in range(index)]
+            clauses.append(reduce(and_, equal + [Q(**{f'{name}__{lookup}': position[index]})]))
+        return reduce(or_, clauses)
+
+    def encode_position(self, instance):
+        # Pages hold model instances or, for compact lists, `.values()` rows.
+        get = instance.get if isinstance(instance, dict) else lambda name: getattr(instance, name)
+        values = [get(field.lstrip('-')) for field in self.ordering]
+        return json.dumps(values, cls=DjangoJSONEncoder)
+
+    def decode_position(self, cursor, model):
+        """The ordering values of a cursor, converted by their model fields; raises ValueError or ValidationError when it was tampered with."""
+        if cursor is None or cursor.position is None:
+            return None
+        position = json.loads(cursor.position)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise ValueError(cursor.position)
+        values = []
+        for field, value in zip(self.ordering, position):
+            if value is None or isinstance(value, (dict, list)):
+                raise ValueError(cursor.position)
+            values.append(model._meta.get_field(field.lstrip('-')).to_python(value))
+        return values
+
+
+class BookCursorPagination(KeysetPagination):
+    ordering = ('availability_status', 'title', 'id')
+
+
+class BorrowRecordCursorPagination(KeysetPagination):
+    ordering = ('-borrow_date', '-id')
+
+
+class OverdueLoanPagination(KeysetPagination):
+    ordering = ('due_date', 'id')
+
+
+class CursorOptInPagination(BasePagination):
+    """
+    Page-number pagination by default; `?pagination=cursor` (or following a
+    cursor link) switches to keyset pagination.
+    """
+    mode_query_param = 'pagination'
+    page_number_class = DefaultPagination
+    cursor_class = BookCursorPagination
+
+    def use_cursor(self, request):
+        return (request.query_params.get(self.mode_query_param) == 'cursor'
+                or self.cursor_class.cursor_query_param in request.query_params)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        paginator_class = self.cursor_class if self.use_cursor(request) else self.page_number_class
+        self.paginator = paginator_class()
+        return self.paginator.paginate_queryset(queryset, request, view=view)
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return self.page_number_class().get_paginated_response_schema(schema)
+
+    def get_schema_operation_parameters(self, view):
+        parameters = self.page_number_class().get_schema_operation_parameters(view)
+        parameters += self.cursor_class().get_schema_operation_parameters(view)
+        parameters.append({
+            'name': self.mode_query_param,
+            'required': False,
+            'in': 'query',
+            'description': 'Set to `cursor` to use keyset pagination instead of page numbers.',
+            'schema': {'type': 'string', 'enum': ['page', 'cursor']},
+        })
+        return parameters
+
+    def to_html(self):
+        return self.paginator.to_html()
+
+    @property
+    def display_page_controls(self):
+        return getattr(self.paginator, 'display_page_controls', False)
+
+
+class BookPagination(CursorOptInPagination):
+    cursor_class = BookCursorPagination
+
+
+class BorrowRecordPagination(CursorOptInPagination):
+    cursor_class = BorrowRecordCursorPagination
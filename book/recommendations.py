@@ -0,0 +1,153 @@
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Min
+from book.models import BorrowRecord, CoBorrow, SimilarBook
+from book.stats import _increment
+from tasks.models import Task
+from tasks.queue import enqueue
+
+# Co-borrowing is counted by the task worker, keeping the shared matrix rows out of the borrow transaction.
+TASKS = ('book.record_co_borrows',)
+
+
+def _columns():
+    quote = connection.ops.quote_name
+    column = lambda model, name: quote(model._meta.get_field(name).column)
+    return {
+        'records': quote(BorrowRecord._meta.db_table),
+        'record_id': column(BorrowRecord, 'id'),
+        'record_member': column(BorrowRecord, 'member'),
+        'record_book': column(BorrowRecord, 'book'),
+        'pairs': quote(CoBorrow._meta.db_table),
+        'book': column(CoBorrow, 'book'),
+        'other': column(CoBorrow, 'other'),
+        'members': column(CoBorrow, 'members'),
+    }
+
+
+# The sparse product AᵀA of the member-by-book borrow matrix A, computed by the database in a few
+# set-based statements. A member's books are ranked by their first borrow and only the first
+# RECOMMENDATIONS_MEMBER_BOOKS count, as in apply_borrows(). The history is staged in an indexed
+# temporary table so the self-join is an index range per member (SQLite cannot hash-join), and only
+# the upper triangle is aggregated, then mirrored.
+REBUILD_SQL = [
+    '''
+    CREATE TEMPORARY TABLE coborrow_history AS
+    WITH firsts AS (
+        SELECT {record_member} AS member_id, {record_book} AS book_id, MIN({record_id}) AS first_id
+        FROM {records} GROUP BY {record_member}, {record_book}
+    ), ranked AS (
+        SELECT member_id, book_id, ROW_NUMBER() OVER (PARTITION BY member_id ORDER BY first_id) AS place
+        FROM firsts
+    )
+    SELECT member_id, book_id FROM ranked WHERE place <= %(limit)s
+    ''',
+    'CREATE INDEX coborrow_history_member ON coborrow_history (member_id, book_id)',
+    '''
+    INSERT INTO {pairs} ({book}, {other}, {members})
+    SELECT a.book_id, b.book_id, COUNT(*)
+    FROM coborrow_history a JOIN coborrow_history b ON b.member_id = a.member_id AND b.book_id > a.book_id
+    GROUP BY a.book_id, b.book_id
+    ''',
+    'INSERT INTO {pairs} ({book}, {other}, {members}) SELECT {other}, {book}, {members} FROM {pairs} WHERE {book} < {other}',
+    '''
+    INSERT INTO {pairs} ({book}, {other}, {members})
+    SELECT book_id, book_id, COUNT(*) FROM coborrow_history GROUP BY book_id
+    ''',
+    'DROP TABLE coborrow_history',
+]
+
+# Cosine similarity of two books' borrower sets: co-borrowers over the geometric mean of their borrowers (the diagonal).
+TOP_K_SQL = '''
+    SELECT book_id, other_id, score, place FROM (
+        SELECT p.{book} AS book_id, p.{other} AS other_id,
+               p.{members} / SQRT(CAST(d.{members} AS FLOAT) * e.{members}) AS score,
+               ROW_NUMBER() OVER (PARTITION BY p.{book}
+                                  ORDER BY p.{members} / SQRT(CAST(d.{members} AS FLOAT) * e.{members}) DESC, p.{other}) AS place
+        FROM {pairs} p
+        JOIN {pairs} d ON d.{book} = p.{book} AND d.{other} = p.{book}
+        JOIN {pairs} e ON e.{book} = p.{other} AND e.{other} = p.{other}
+        WHERE p.{book} <> p.{other} {where}
+    ) ranked
+    WHERE place <= %s
+'''
+
+
+def record_borrows(member_id, records):
+    """Queue counting the new BorrowRecords `records` of `member_id` into the co-borrowing matrix. Call inside the borrow transaction."""
+    if records:
+        enqueue(TASKS[0], {'member_id': member_id, 'record_ids': [record.pk for record in records]})
+
+
+def apply_borrows(member_id, record_ids):
+    """
+    Add the borrows `record_ids` to the matrix and refresh the top books of
+    every book whose row changed. A borrow counts when it is the member's
+    first of its book and that book is among their first
+    RECOMMENDATIONS_MEMBER_BOOKS; it pairs with the member's books first
+    borrowed before it, so every pair is counted once, whichever order the
+    tasks run in, exactly as rebuild() counts it. Books that were not
+    touched keep their list until the next rebuild, even though the scores
+    of their pairs with a newly borrowed book have moved slightly.
+    """
+    history = list(BorrowRecord.objects.filter(member_id=member_id).order_by().values('book_id')
+                   .annotate(first=Min('id')).order_by('first')
+                   .values_list('book_id', 'first')[:settings.RECOMMENDATIONS_MEMBER_BOOKS])
+    new = set(record_ids)
+    counts, touched = {}, set()
+    for place, (book_id, first) in enumerate(history):
+        if first not in new:
+            continue
+        counts[(book_id, book_id)] = 1
+        touched.add(book_id)
+        for other_id, _ in history[:place]:
+            counts[(book_id, other_id)] = counts[(other_id, book_id)] = 1
+            touched.add(other_id)
+    _increment(CoBorrow, ['book', 'other'], counts, 'members')
+    if touched:
+        refresh_similar(touched)
+
+
+def refresh_similar(book_ids=None, batch_size=5000):
+    """Recompute the top RECOMMENDATIONS_TOP_K similar books of `book_ids` (every book when None) from the matrix."""
+    columns = _columns()
+    similar, where, params = SimilarBook.objects.all(), '', []
+    if book_ids is not None:
+        book_ids = sorted(book_ids)
+        similar = similar.filter(book_id__in=book_ids)
+        where = f"AND p.{columns['book']} IN ({', '.join(['%s'] * len(book_ids))})"
+        params = book_ids
+    similar.delete()
+    with connection.cursor() as cursor:
+        cursor.execute(TOP_K_SQL.format(where=where, **columns), params + [settings.RECOMMENDATIONS_TOP_K])
+        while rows := cursor.fetchmany(batch_size):
+            SimilarBook.objects.bulk_create(
+                SimilarBook(book_id=book_id, similar_id=other_id, score=score, rank=rank)
+                for book_id, other_id, score, rank in rows)
+
+
+def rebuild():
+    """Recompute the co-borrowing matrix and every book's similar books from BorrowRecord."""
+    limit = settings.RECOMMENDATIONS_MEMBER_BOOKS
+    with transaction.atomic():
+        # Queued borrows are already part of the history being counted.
+        Task.objects.filter(name__in=TASKS, status__in=[Task.PENDING, Task.RUNNING]).delete()
+        CoBorrow.objects.all().delete()
+        columns = _columns()
+        with connection.cursor() as cursor:
+            for sql in REBUILD_SQL:
+                cursor.execute(sql.format(**columns), {'limit': limit})
+        refresh_similar()
+
+
+def similar_books(book_id):
+    """`book_id`'s similar books, best first: one range read on the (book, rank) index."""
+    rows = (SimilarBook.objects.filter(book_id=book_id).order_by('rank')
+            .values('similar_id', 'similar__title', 'similar__isbn', 'similar__availability_status', 'score'))
+    return [{
+        'id': row['similar_id'],
+        'title': row['similar__title'],
+        'isbn': row['similar__isbn'],
+        'availability_status': row['similar__availability_status'],
+        'score': round(row['score'], 4),
+    } for row in rows]
@@ -0,0 +1,228 @@
+from collections import defaultdict
+from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError
+from book.models import BookImage
+from BookHeaven.profiling import serializing
+
+
+def parse_list_param(request, name):
+    values = set()
+    # request.GET rather than query_params, so plain Django (async) views can use it too.
+    for value in request.GET.getlist(name):
+        values.update(part.strip() for part in value.split(',') if part.strip())
+    return values
+
+
+# <picture> uses the first <source> the browser supports, so WebP comes first.
+SOURCE_ORDER = ('image/webp', 'image/jpeg', 'image/png')
+IMAGE_COLUMNS = ('book_id', 'id', 'image_url', 'image', 'width', 'height', 'placeholder', 'variants')
+
+
+def image_url(url, image):
+    # Same fallback as CachedImageField: the stored URL, else build it from the Cloudinary resource.
+    return url or (image.url if image else None)
+
+
+def sources(variants):
+    """Renditions as `<picture>` sources, preferred type first: [{'type': ..., 'srcset': 'url 160w, url 320w'}]."""
+    srcsets = {}
+    for variant in sorted(variants, key=lambda variant: variant['width']):
+        srcsets.setdefault(variant['type'], []).append(f"{variant['url']} {variant['width']}w")
+    return [{'type': mimetype, 'srcset': ', '.join(srcsets[mimetype])} for mimetype in SOURCE_ORDER if mimetype in srcsets]
+
+
+def image_row(pk, url, image, width, height, placeholder, variants):
+    return {'id': pk, 'image': image_url(url, image), 'width': width, 'height': height,
+            'placeholder': placeholder or None, 'sources': sources(variants)}
+
+
+def images_by_book(book_ids):
+    images = defaultdict(list)
+    rows = BookImage.objects.filter(book_id__in=book_ids).order_by('id').values_list(*IMAGE_COLUMNS)
+    for book_id, *row in rows:
+        images[book_id].append(image_row(*row))
+    return images
+
+
+async def aimages_by_book(book_ids):
+    images = defaultdict(list)
+    rows = BookImage.objects.filter(book_id__in=book_ids).order_by('id').values_list(*IMAGE_COLUMNS)
+    async for book_id, *row in rows:
+        images[book_id].append(image_row(*row))
+    return images
+
+
+class CompactRepresentation:
+    """
+    Renders list rows straight from `.values()` into plain dicts instead of
+    nested ModelSerializers, in the same shape the serializers give. Trimming
+    is opt-in: with `?expand=`, only the nested objects it names keep their
+    detail and the others are cut to their id and name (an empty `?expand=`
+    trims them all), and `?fields=` keeps only the listed top-level keys
+    (skipping the queries for anything left out).
+    """
+    available_fields = ()
+    expandable = ()
+    fields_param = 'fields'
+    expand_param = 'expand'
+
+    def __init__(self, fields=(), expand=None):
+        self.fields = self.selected(set(fields), self.available_fields, self.fields_param) or list(self.available_fields)
+        # Everything is expanded unless the client asks for less.
+        self.expand = list(self.expandable) if expand is None else self.selected(set(expand), self.expandable, self.expand_param)
+
+    @classmethod
+    def from_request(cls, request):
+        expand = parse_list_param(request, cls.expand_param) if cls.expand_param in request.GET else None
+        return cls(parse_list_param(request, cls.fields_param), expand)
+
+    @staticmethod
+    def selected(requested, allowed, param):
+        unknown = requested - set(allowed)
+        if unknown:
+            raise ValidationError({param: f"Unknown field(s): {', '.join(sorted(unknown))}. "
+                                          f"Choose from: {', '.join(allowed)}."})
+        return [field for field in allowed if field in requested]
+
+    def wants(self, field):
+        return field in self.fields
+
+    def columns(self):
+        raise NotImplementedError
+
+    def values(self, queryset):
+        rows = queryset.values(*dict.fromkeys(self.columns()))
+        # The paginator's COUNT does not need the joins the related columns add.
+        rows.count = queryset.count
+        return rows
+
+    def render(self, rows):
+        raise NotImplementedError
+
+    def pick(self, row):
+        return {field: row[field] for field in self.fields}
+
+
+class BookRepresentation(CompactRepresentation):
+    available_fields = ('id', 'images', 'title', 'author', 'isbn', 'category', 'availability_status')
+    expandable = ('author', 'category')
+
+    def __init__(self, fields=(), expand=None, prefix=''):
+        super().__init__(fields, expand)
+        self.prefix = prefix
+
+    def columns(self):
+        p = self.prefix
+        # The keyset cursor reads its position from the row, so the ordering columns are always selected.
+        columns = [f'{p}id', f'{p}title', f'{p}isbn', f'{p}availability_status']
+        if self.wants('author'):
+            columns += [f'{p}author_id', f'{p}author__name']
+            if 'author' in self.expand:
+                columns.append(f'{p}author__biography')
+        if self.wants('category'):
+            columns += [f'{p}category_id', f'{p}category__name']
+            if 'category' in self.expand:
+                columns += [f'{p}category__book_count', f'{p}category__loan_period_days']
+        return columns
+
+    def related(self, rows):
+        if not self.wants('images'):
+            return {}
+        return images_by_book({row[f'{self.prefix}id'] for row in rows})
+
+    async def arelated(self, rows):
+        if not self.wants('images'):
+            return {}
+        return await aimages_by_book({row[f'{self.prefix}id'] for row in rows})
+
+    def build(self, row, images):
+        p = self.prefix
+        book = {
+            'id': row[f'{p}id'],
+            'title': row[f'{p}title'],
+            'isbn': row[f'{p}isbn'],
+            'availability_status': row[f'{p}availability_status'],
+        }
+        if self.wants('images'):
+            book['images'] = images.get(row[f'{p}id'], [])
+        if self.wants('author'):
+            author = None
+            if row[f'{p}author_id'] is not None:
+                author = {'id': row[f'{p}author_id'], 'name': row[f'{p}author__name']}
+                if 'author' in self.expand:
+                    author['biography'] = row[f'{p}author__biography']
+            book['author'] = author
+        if self.wants('category'):
+            category = None
+            if row[f'{p}category_id'] is not None:
+                category = {'id': row[f'{p}category_id'], 'name': row[f'{p}category__name']}
+                if 'category' in self.expand:
+                    category['book_count'] = row[f'{p}category__book_count']
+                    category['loan_period_days'] = row[f'{p}category__loan_period_days']
+            book['category'] = category
+        return self.pick(book)
+
+    def render(self, rows, images=None):
+        images = self.related(rows) if images is None else images
+        return [self.build(row, images) for row in rows]
+
+
+class BorrowRecordRepresentation(CompactRepresentation):
+    available_fields = ('id', 'book', 'member', 'borrow_date', 'due_date', 'return_date', 'status', 'display_date',
+                        'overdue', 'fine')
+    expandable = ('member', 'book.author', 'book.category')
+
+    def __init__(self, fields=(), expand=None):
+        super().__init__(fields, expand)
+        book_expand = [field.split('.', 1)[1] for field in self.expand if field.startswith('book.')]
+        self.book = BookRepresentation(expand=book_expand, prefix='book__')
+
+    def columns(self):
+        columns = ['id', 'borrow_date', 'due_date', 'return_date', 'status', 'overdue', 'fine']
+        if self.wants('book'):
+            columns += self.book.columns()
+        if self.wants('member'):
+            columns += ['member_id', 'member__user__username']
+            if 'member' in self.expand:
+                columns += ['member__user__email', 'member__membership_date']
+        return columns
+
+    def render(self, rows):
+        images = self.book.related(rows) if self.wants('book') else {}
+        data = []
+        for row in rows:
+            record = {
+                'id': row['id'],
+                'borrow_date': row['borrow_date'],
+                'due_date': row['due_date'],
+                'return_date': row['return_date'],
+                'status': row['status'],
+                'display_date': row['return_date'] if row['status'] == 'RETURNED' else row['borrow_date'],
+                'overdue': row['overdue'],
+                'fine': row['fine'],
+            }
+            if self.wants('book'):
+                record['book'] = self.book.build(row, images)
+            if self.wants('member'):
+                member = {'id': row['member_id'], 'name': row['member__user__username']}
+                if 'member' in self.expand:
+                    member['email'] = row['member__user__email']
+                    member['membership_date'] = row['member__membership_date']
+                record['member'] = member
+            data.append(self.pick(record))
+        return data
+
+
+class CompactListMixin:
+    """ViewSet mixin: serve `list` through a CompactRepresentation instead of the serializer."""
+    representation_class = None
+
+    def list(self, request, *args, **kwargs):
+        representation = self.representation_class.from_request(request)
+        queryset = representation.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        with serializing():
+            data = representation.render(queryset if page is None else page)
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
@@ -0,0 +1,152 @@
+import re
+from django.db import connection
+from django.db.models import F, OuterRef, Q, Subquery
+from rest_framework.filters import SearchFilter
+
+
+# PostgreSQL's search expressions are imported in the branches that use them, only once that backend is in use.
+SEARCH_CONFIG = 'english'
+SQLITE_FTS_TABLE = 'book_book_fts'
+
+
+_fts_databases = set()
+
+
+def search_backend():
+    if connection.vendor == 'postgresql':
+        return 'postgresql'
+    if connection.vendor == 'sqlite':
+        name = connection.settings_dict['NAME']
+        if name not in _fts_databases and SQLITE_FTS_TABLE in connection.introspection.table_names():
+            _fts_databases.add(name)
+        if name in _fts_databases:
+            return 'sqlite'
+    return None
+
+
+def book_search_vector(author_queryset):
+    from django.contrib.postgres.search import SearchVector
+
+    author = author_queryset.filter(pk=OuterRef('author_id'))
+    return (
+        SearchVector('title', weight='A', config=SEARCH_CONFIG)
+        + SearchVector(Subquery(author.values('name')[:1]), weight='B', config=SEARCH_CONFIG)
+        + SearchVector(Subquery(author.values('biography')[:1]), weight='D', config=SEARCH_CONFIG)
+    )
+
+
+def author_search_vector():
+    # Must stay identical to the expression index created in migration 0008.
+    from django.contrib.postgres.search import SearchVector
+
+    return SearchVector('name', 'biography', config=SEARCH_CONFIG)
+
+
+def refresh_search_index(book_ids=None):
+    """Rebuild the full-text document for the given books (all books if None)."""
+    from book.models import Author, Book
+
+    backend = search_backend()
+    if backend == 'postgresql':
+        books = Book.objects.all() if book_ids is None else Book.objects.filter(pk__in=book_ids)
+        books.update(search_vector=book_search_vector(Author.objects.all()))
+    elif backend == 'sqlite':
+        with connection.cursor() as cursor:
+            if book_ids is None:
+                cursor.execute(f'DELETE FROM {SQLITE_FTS_TABLE}')
+                where, params = '', []
+            else:
+                book_ids = list(book_ids)
+                if not book_ids:
+                    return
+                placeholders = ', '.join(['%s'] * len(book_ids))
+                cursor.execute(f'DELETE FROM {SQLITE_FTS_TABLE} WHERE rowid IN ({placeholders})', book_ids)
+                where, params = f'WHERE b.id IN ({placeholders})', book_ids
+            cursor.execute(
+                f"INSERT INTO {SQLITE_FTS_TABLE} (rowid, title, author_name, biography) "
+                f"SELECT b.id, b.title, COALESCE(a.name, ''), COALESCE(a.biography, '') "
+                f"FROM book_book b LEFT JOIN book_author a ON a.id = b.author_id {where}",
+                params,
+            )
+
+
+def remove_from_search_index(book_ids):
+    if search_backend() != 'sqlite' or not book_ids:
+        return
+    placeholders = ', '.join(['%s'] * len(book_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SQLITE_FTS_TABLE} WHERE rowid IN ({placeholders})', list(book_ids))
+
+
+def fts5_query(terms, prefix=False):
+    words = re.findall(r'\w+', terms)
+    suffix = '*' if prefix else ''
+    return ' '.join(f'"{word}"{suffix}' for word in words)
+
+
+class FullTextSearchFilter(SearchFilter):
+    """
+    Drop-in replacement for SearchFilter that uses the database's full-text
+    engine when one is available: a ranked tsvector match on PostgreSQL (plus
+    trigram similarity with `?fuzzy=true`) or the FTS5 index on SQLite.
+    Other backends fall back to SearchFilter's icontains lookups.
+    """
+    fuzzy_param = 'fuzzy'
+
+    def is_fuzzy(self, request):
+        return request.query_params.get(self.fuzzy_param, '').lower() in ('1', 'true', 'yes')
+
+    def get_search_text(self, request):
+        return request.query_params.get(self.search_param, '').replace('\x00', '').strip()
+
+    def filter_queryset(self, request, queryset, view):
+        text = self.get_search_text(request)
+        backend = search_backend() if text else None
+        if backend is None:
+            return super().filter_queryset(request, queryset, view)
+
+        fuzzy = self.is_fuzzy(request)
+        search = getattr(self, f'search_{queryset.model._meta.model_name}', None)
+        if search is None:
+            return super().filter_queryset(request, queryset, view)
+        return search(backend, queryset, text, fuzzy)
+
+    def search_book(self, backend, queryset, text, fuzzy):
+        if backend == 'postgresql':
+            from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramSimilarity
+
+            query = SearchQuery(text, search_type='websearch', config=SEARCH_CONFIG)
+            queryset = queryset.annotate(rank=SearchRank(F('search_vector'), query))
+            if fuzzy:
+                queryset = queryset.annotate(similarity=TrigramSimilarity('title', text))
+                return queryset.filter(Q(search_vector=query) | Q(title__trigram_similar=text)).order_by('-rank', '-similarity', 'id')
+            return queryset.filter(search_vector=query).order_by('-rank', 'id')
+
+        match = fts5_query(text, prefix=fuzzy)
+        if not match:
+            return queryset.none()
+        return queryset.extra(
+            tables=[SQLITE_FTS_TABLE],
+            where=[f'{SQLITE_FTS_TABLE}.rowid = book_book.id', f'{SQLITE_FTS_TABLE} MATCH %s'],
+            params=[match],
+            select={'rank': f'bm25({SQLITE_FTS_TABLE}, 10.0, 4.0, 1.0)'},
+        ).order_by('rank', 'id')
+
+    def search_author(self, backend, queryset, text, fuzzy):
+        if backend == 'postgresql':
+            from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramSimilarity
+
+            query = SearchQuery(text, search_type='websearch', config=SEARCH_CONFIG)
+            vector = author_search_vector()
+            queryset = queryset.annotate(document=vector, rank=SearchRank(vector, query))
+            if fuzzy:
+                queryset = queryset.annotate(similarity=TrigramSimilarity('name', text))
+                return queryset.filter(Q(document=query) | Q(name__trigram_similar=text)).order_by('-rank', '-similarity', 'id')
+            return queryset.filter(document=query).order_by('-rank', 'id')
+
+        words = re.findall(r'\w+', text)
+        if not words:
+            return queryset.none()
+        for word in words:
+            queryset = queryset.filter(Q(name__icontains=word) | Q(biography__icontains=word))
+        return queryset
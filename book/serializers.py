@@ -2,7 +2,8 @@ from decimal import Decimal
 from django.conf import settings
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
-from book.models import Author, Book, BorrowRecord, Category, Member, BookImage
+from book.models import Author, Book, BorrowRecord, Category, Hold, Member, BookImage
+from book.representations import sources
 
 User = get_user_model()
 
@@ -12,7 +13,7 @@ class CategorySerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Category
-        fields = ['id', 'name', 'book_count']
+        fields = ['id', 'name', 'book_count', 'loan_period_days']
 
     
 
@@ -22,11 +23,37 @@ class AuthorSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'biography']
 
 
+class CachedImageField(serializers.ImageField):
+    """Serves the URL stored on the instance, falling back to building it from storage."""
+
+    def __init__(self, url_source='image_url', **kwargs):
+        self.url_source = url_source
+        super().__init__(**kwargs)
+
+    def get_attribute(self, instance):
+        return getattr(instance, self.url_source, None) or super().get_attribute(instance)
+
+    def to_representation(self, value):
+        if isinstance(value, str):
+            return value or None
+        return super().to_representation(value)
+
+
 class BookImageSerializer(serializers.ModelSerializer):
-    image = serializers.ImageField()
+    image = CachedImageField()
+    placeholder = serializers.SerializerMethodField(help_text="Tiny blurred data URI to show while the image loads.")
+    sources = serializers.SerializerMethodField(help_text="Resized renditions as <picture> sources: type and srcset.")
+
     class Meta:
         model = BookImage
-        fields = ['id', 'image']
+        fields = ['id', 'image', 'width', 'height', 'placeholder', 'sources']
+        read_only_fields = ['width', 'height']
+
+    def get_placeholder(self, obj):
+        return obj.placeholder or None
+
+    def get_sources(self, obj):
+        return sources(obj.variants)
 
 
 
@@ -63,8 +90,32 @@ class BorrowRecordSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = BorrowRecord
-        fields = ['id', 'book', 'member', 'borrow_date', 'return_date', 'status', 'display_date']
+        fields = ['id', 'book', 'member', 'borrow_date', 'due_date', 'return_date', 'status', 'display_date', 'overdue', 'fine']
+        read_only_fields = ['due_date', 'overdue', 'fine']
 
     def get_display_date(self, obj):
         return obj.return_date if obj.status == 'RETURNED' else obj.borrow_date
 
+
+class HoldSerializer(serializers.ModelSerializer):
+    position = serializers.IntegerField(read_only=True, help_text="Place in the book's queue; 1 is served next.")
+
+    class Meta:
+        model = Hold
+        fields = ['id', 'book', 'member', 'status', 'created_at', 'position']
+
+
+class BulkCirculationSerializer(serializers.Serializer):
+    MAX_ITEMS = 200
+
+    member = serializers.PrimaryKeyRelatedField(queryset=Member.objects.all())
+    books = serializers.ListField(child=serializers.IntegerField(), required=False, default=list, help_text="Book ids")
+    isbns = serializers.ListField(child=serializers.CharField(max_length=13), required=False, default=list)
+
+    def validate(self, attrs):
+        count = len(attrs['books']) + len(attrs['isbns'])
+        if not count:
+            raise serializers.ValidationError("Provide at least one book id or ISBN.")
+        if count > self.MAX_ITEMS:
+            raise serializers.ValidationError(f"At most {self.MAX_ITEMS} books per request.")
+        return attrs
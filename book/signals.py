@@ -0,0 +1,110 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import DEFERRED, F
+from django.dispatch import receiver
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete, pre_save
+from book.models import Author, Book, BookImage, Category
+from book import snapshots
+from book.cache import catalog_invalidated, invalidate_catalog
+from book.circulation import availability_changed
+from book.search import refresh_search_index, remove_from_search_index
+
+
+@receiver(post_init, sender=Book)
+def remember_loaded_values(sender, instance, **kwargs):
+    # Read through __dict__ so deferred fields stay deferred instead of costing a query each.
+    values = instance.__dict__
+    instance._loaded_category_id = values.get('category_id', DEFERRED)
+    instance._loaded_search_values = (values.get('title', DEFERRED), values.get('author_id', DEFERRED))
+
+
+@receiver(pre_save, sender=Book)
+def load_deferred_category(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding:
+        return
+    if instance._loaded_category_id is DEFERRED and 'category_id' in instance.__dict__:
+        instance._loaded_category_id = Book.objects.filter(pk=instance.pk).values_list('category_id', flat=True).first()
+
+
+@receiver(post_save, sender=Book)
+def update_category_count_on_save(sender, instance, created, raw=False, **kwargs):
+    current = instance.__dict__.get('category_id', DEFERRED)
+    if raw or current is DEFERRED:
+        return
+    previous = None if created else instance._loaded_category_id
+    if previous != current:
+        if previous is not None:
+            Category.objects.filter(pk=previous).update(book_count=F('book_count') - 1)
+        if current is not None:
+            Category.objects.filter(pk=current).update(book_count=F('book_count') + 1)
+    instance._loaded_category_id = current
+
+
+@receiver(post_save, sender=Book)
+def update_search_index_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    values = (instance.__dict__.get('title', DEFERRED), instance.__dict__.get('author_id', DEFERRED))
+    changed = any(value is not DEFERRED and value != loaded
+                  for value, loaded in zip(values, instance._loaded_search_values))
+    if created or changed:
+        refresh_search_index([instance.pk])
+    instance._loaded_search_values = values
+
+
+@receiver(pre_delete, sender=Book)
+def load_category_before_delete(sender, instance, **kwargs):
+    if instance._loaded_category_id is DEFERRED:
+        instance._loaded_category_id = Book.objects.filter(pk=instance.pk).values_list('category_id', flat=True).first()
+
+
+@receiver(post_delete, sender=Book)
+def update_category_count_on_delete(sender, instance, **kwargs):
+    category_id = instance._loaded_category_id
+    if category_id is not None:
+        Category.objects.filter(pk=category_id).update(book_count=F('book_count') - 1)
+
+
+@receiver(post_delete, sender=Book)
+def update_search_index_on_delete(sender, instance, **kwargs):
+    remove_from_search_index([instance.pk])
+
+
+@receiver(post_save, sender=Author)
+def update_search_index_on_author_save(sender, instance, created, raw=False, **kwargs):
+    if raw or created:
+        return
+    refresh_search_index(list(instance.book_set.values_list('id', flat=True)))
+
+
+@receiver(pre_delete, sender=Author)
+def remember_author_books(sender, instance, **kwargs):
+    instance._book_ids = list(instance.book_set.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Author)
+def update_search_index_on_author_delete(sender, instance, **kwargs):
+    refresh_search_index(getattr(instance, '_book_ids', []))
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_save, sender=Author)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=BookImage)
+@receiver(post_delete, sender=Book)
+@receiver(post_delete, sender=Author)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=BookImage)
+def invalidate_cached_catalog(sender, **kwargs):
+    transaction.on_commit(invalidate_catalog)
+
+
+@receiver(availability_changed)
+def invalidate_cached_availability(sender, **kwargs):
+    invalidate_catalog()
+
+
+@receiver(catalog_invalidated)
+def rebuild_catalog_snapshot(sender, **kwargs):
+    if settings.CATALOG_SNAPSHOTS:
+        snapshots.schedule_rebuild()
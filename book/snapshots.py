@@ -0,0 +1,212 @@
+import os
+import gzip
+import json
+import uuid
+import shutil
+import hashlib
+from pathlib import Path
+from django.urls import reverse
+from django.conf import settings
+from django.db.models import Count
+from rest_framework.renderers import JSONRenderer
+from book.cache import catalog_version
+from book.models import Author, Book, Category
+from book.paginations import DefaultPagination
+from book.representations import BookRepresentation, images_by_book
+from tasks.models import Task
+from tasks.queue import enqueue
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# Same pages as `/api/v1/books/` (ties on title broken by id so pages are stable).
+TASKS = ('book.build_catalog_snapshot',)
+PAGE_SIZE = DefaultPagination.page_size
+ORDERING = ('availability_status', 'title', 'id')
+CURRENT = 'CURRENT'
+MANIFEST = 'manifest.json'
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+LISTINGS = (
+    # (document prefix, grouping column, model the groups belong to)
+    ('books/', None, None),
+    ('books/category/{}/', 'category_id', Category),
+    ('books/author/{}/', 'author_id', Author),
+)
+
+
+def snapshot_root():
+    return Path(settings.CATALOG_SNAPSHOT_ROOT)
+
+
+def page_name(prefix, number):
+    return f'{prefix}page-{number}.json'
+
+
+class SnapshotWriter:
+    """Writes one snapshot directory: each document raw, gzipped and (with brotli installed) brotli-compressed."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.manifest = {}
+
+    def link(self, prefix, number, num_pages):
+        # Links stay within the snapshot; they are host-relative since the documents are shared by every host.
+        if not 1 <= number <= num_pages:
+            return None
+        return reverse('catalog-snapshot', kwargs={'name': page_name(prefix, number)})
+
+    def write_page(self, prefix, number, count, results):
+        num_pages = max(1, -(-count // PAGE_SIZE))
+        data = {
+            'count': count,
+            'next': self.link(prefix, number + 1, num_pages),
+            'previous': self.link(prefix, number - 1, num_pages),
+            'results': results,
+        }
+        self.write(page_name(prefix, number), JSONRenderer().render(data))
+
+    def write(self, name, content):
+        path = self.directory / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(content)
+        encodings = []
+        compressed = gzip.compress(content, compresslevel=9, mtime=0)
+        if len(compressed) < len(content):
+            path.with_name(path.name + '.gz').write_bytes(compressed)
+            encodings.append('gzip')
+        if brotli is not None:
+            compressed = brotli.compress(content)
+            if len(compressed) < len(content):
+                path.with_name(path.name + '.br').write_bytes(compressed)
+                encodings.append('br')
+        self.manifest[name] = {'etag': hashlib.sha256(content).hexdigest()[:32], 'encodings': encodings}
+
+
+def write_listing(writer, prefix, group, counts, representation, chunk_size):
+    """Page through every book ordered by (`group`,) ORDERING, rendering images one chunk of rows at a time."""
+    ordering = ([group] if group else []) + list(ORDERING)
+    columns = representation.columns() + ([group] if group else [])
+    rows = Book.objects.order_by(*ordering).values(*dict.fromkeys(columns)).iterator(chunk_size=chunk_size)
+
+    pages, pending = [], 0
+    key, number, page = object(), 0, []
+
+    def flush():
+        images = images_by_book({row['id'] for _, _, page in pages for row in page})
+        for group_id, number, page in pages:
+            writer.write_page(prefix.format(group_id), number, counts.get(group_id, 0),
+                              representation.render(page, images))
+        pages.clear()
+
+    for row in rows:
+        group_id = row[group] if group else None
+        if group and group_id is None:
+            continue
+        if group_id != key or len(page) == PAGE_SIZE:
+            if page:
+                pages.append((key, number, page))
+                pending += len(page)
+            number = 1 if group_id != key else number + 1
+            key, page = group_id, []
+            if pending >= chunk_size:
+                flush()
+                pending = 0
+        page.append(row)
+    if page:
+        pages.append((key, number, page))
+    flush()
+
+
+def build_snapshot(chunk_size=2000):
+    """
+    Render the catalog's anonymous list pages (all books, per category and
+    per author) into a fresh snapshot directory, then switch CURRENT to it.
+    Readers keep serving the previous snapshot until the switch, which is
+    a single atomic rename; older snapshots are removed afterwards.
+    Returns the new directory.
+    """
+    root = snapshot_root()
+    root.mkdir(parents=True, exist_ok=True)
+    name = f'{catalog_version()}-{uuid.uuid4().hex[:8]}'
+    directory = root / f'.{name}'
+    pointer = root / f'.{CURRENT}-{name}'
+    writer = SnapshotWriter(directory)
+    representation = BookRepresentation()
+
+    try:
+        for prefix, group, model in LISTINGS:
+            if group is None:
+                counts = {None: Book.objects.count()}
+            else:
+                counts = dict(Book.objects.filter(**{f'{group}__isnull': False}).order_by()
+                              .values_list(group).annotate(total=Count('id')))
+            write_listing(writer, prefix, group, counts, representation, chunk_size)
+            # An empty listing is still a valid first page, as it is in the API.
+            if group is None:
+                empty = [None] if not counts[None] else []
+            else:
+                grouped = Book.objects.filter(**{f'{group}__isnull': False}).values(group)
+                empty = model.objects.exclude(pk__in=grouped).values_list('pk', flat=True).iterator()
+            for group_id in empty:
+                writer.write_page(prefix.format(group_id), 1, 0, [])
+
+        (directory / MANIFEST).write_text(json.dumps(writer.manifest))
+        os.replace(directory, root / name)
+        previous = current_name(root)
+        pointer.write_text(name)
+        os.replace(pointer, root / CURRENT)
+    finally:
+        # Only a failed build leaves these behind; after the switch both have been renamed away.
+        shutil.rmtree(directory, ignore_errors=True)
+        pointer.unlink(missing_ok=True)
+
+    # The previous snapshot stays for requests that read CURRENT just before the switch.
+    for path in root.iterdir():
+        if path.is_dir() and path.name not in (name, previous) and not path.name.startswith('.'):
+            shutil.rmtree(path, ignore_errors=True)
+    return root / name
+
+
+def snapshot_version(directory):
+    # Snapshot directories are named `<catalog version>-<random suffix>`.
+    return int(directory.name.split('-', 1)[0])
+
+
+def current_name(root):
+    try:
+        return (root / CURRENT).read_text().strip()
+    except FileNotFoundError:
+        return None
+
+
+_manifests = {}
+
+
+def current_snapshot():
+    """(directory, manifest) of the snapshot CURRENT points to, or (None, None) before the first build."""
+    root = snapshot_root()
+    name = current_name(root)
+    if name is None:
+        return None, None
+    manifest = _manifests.get(name)
+    if manifest is None:
+        try:
+            manifest = json.loads((root / name / MANIFEST).read_text())
+        except FileNotFoundError:
+            return None, None
+        _manifests.clear()
+        _manifests[name] = manifest
+    return root / name, manifest
+
+
+def schedule_rebuild():
+    """
+    Queue a snapshot rebuild for the task worker. Writes that land while one
+    is already waiting share it; a write during a running build queues the
+    next one, so the last snapshot always follows the last write.
+    """
+    if not Task.objects.filter(name=TASKS[0], status=Task.PENDING).exists():
+        enqueue(TASKS[0])
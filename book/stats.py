@@ -0,0 +1,172 @@
+from datetime import timedelta
+from collections import Counter, defaultdict
+from django.conf import settings
+from django.utils import timezone
+from django.db import connection, transaction
+from django.db.models import Count, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, TruncMonth
+from book.models import ActiveLoanDay, Book, BorrowRecord, CategoryMonthlyBorrows, Member
+from book.overdue import is_overdue
+from tasks.models import Task
+from tasks.queue import enqueue
+
+# Counting loans is handed to the task worker, keeping the shared per-day and per-month rows out of the borrow transaction.
+TASKS = ('book.record_borrows', 'book.record_returns')
+
+
+def month_of(day):
+    return day.replace(day=1)
+
+
+def months_back(day, months):
+    month = month_of(day)
+    for _ in range(months - 1):
+        month = month_of(month - timedelta(days=1))
+    return month
+
+
+def _increment(model, key_fields, counts, value_field, conflict_fields=None, conflict_where=''):
+    """
+    Add `counts` ({key tuple: n}) to `value_field` of the rows keyed on
+    `key_fields`, inserting the rows that do not exist yet, as one
+    INSERT ... ON CONFLICT DO UPDATE statement (PostgreSQL and SQLite).
+    """
+    if not counts:
+        return
+    quote = connection.ops.quote_name
+    fields = [model._meta.get_field(name) for name in key_fields]
+    value_column = quote(model._meta.get_field(value_field).column)
+    table = quote(model._meta.db_table)
+    columns = ', '.join([quote(field.column) for field in fields] + [value_column])
+    conflict = ', '.join(quote(model._meta.get_field(name).column) for name in conflict_fields or key_fields)
+    row = '(' + ', '.join(['%s'] * (len(fields) + 1)) + ')'
+    params = []
+    for key, count in counts.items():
+        params += [field.get_db_prep_value(value, connection) for field, value in zip(fields, key)] + [count]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} ({columns}) VALUES {", ".join([row] * len(counts))} '
+            f'ON CONFLICT ({conflict}) {conflict_where} '
+            f'DO UPDATE SET {value_column} = {table}.{value_column} + EXCLUDED.{value_column}',
+            params,
+        )
+
+
+def _decrement(queryset_for, counts, value_field):
+    by_amount = defaultdict(list)
+    for key, count in counts.items():
+        by_amount[count].append(key)
+    for amount, keys in by_amount.items():
+        queryset_for(keys).update(**{value_field: F(value_field) - amount})
+
+
+def record_borrows(member_id, category_ids, borrow_date):
+    """
+    Queue the counting of new loans to `member_id`, one per entry of
+    `category_ids` (the borrowed books' categories). Book.borrow_count is
+    bumped by the circulation UPDATE that claims the books. Call inside that
+    transaction.
+    """
+    if category_ids:
+        enqueue(TASKS[0], {'member_id': member_id, 'category_ids': list(category_ids), 'borrow_date': borrow_date.isoformat()})
+
+
+def record_returns(member_id, borrow_dates):
+    """Queue the closing of loans of `member_id` borrowed on `borrow_dates` (one entry per loan)."""
+    if borrow_dates:
+        enqueue(TASKS[1], {'member_id': member_id, 'borrow_dates': [day.isoformat() for day in borrow_dates]})
+
+
+def apply_borrows(member_id, category_ids, borrow_date):
+    if not category_ids:
+        return
+    total = len(category_ids)
+    Member.objects.filter(pk=member_id).update(
+        borrow_count=F('borrow_count') + total, active_loan_count=F('active_loan_count') + total)
+
+    month = month_of(borrow_date)
+    months = Counter((category_id, month) for category_id in category_ids if category_id is not None)
+    _increment(CategoryMonthlyBorrows, ['category', 'month'], months, 'borrow_count')
+    uncategorized = sum(category_id is None for category_id in category_ids)
+    if uncategorized:
+        _increment(CategoryMonthlyBorrows, ['month'], {(month,): uncategorized}, 'borrow_count',
+                   conflict_where='WHERE category_id IS NULL')
+    _increment(ActiveLoanDay, ['borrow_date'], {(borrow_date,): total}, 'active_count')
+
+
+def apply_returns(member_id, borrow_dates):
+    if not borrow_dates:
+        return
+    Member.objects.filter(pk=member_id).update(active_loan_count=F('active_loan_count') - len(borrow_dates))
+    _decrement(lambda days: ActiveLoanDay.objects.filter(borrow_date__in=days), Counter(borrow_dates), 'active_count')
+
+
+def rebuild_borrow_stats():
+    """Recompute every maintained borrowing statistic from BorrowRecord."""
+    with transaction.atomic():
+        # Queued counts are already part of the history being counted.
+        Task.objects.filter(name__in=TASKS, status__in=[Task.PENDING, Task.RUNNING]).delete()
+        borrows = (BorrowRecord.objects.filter(book=OuterRef('pk')).order_by()
+                   .values('book').annotate(total=Count('id')).values('total'))
+        Book.objects.update(borrow_count=Coalesce(Subquery(borrows), Value(0)))
+
+        member_records = BorrowRecord.objects.filter(member=OuterRef('pk')).order_by().values('member')
+        Member.objects.update(
+            borrow_count=Coalesce(Subquery(member_records.annotate(total=Count('id')).values('total')), Value(0)),
+            active_loan_count=Coalesce(Subquery(
+                member_records.filter(status='BORROWED').annotate(total=Count('id')).values('total')), Value(0)),
+        )
+
+        CategoryMonthlyBorrows.objects.all().delete()
+        monthly = (BorrowRecord.objects.annotate(month=TruncMonth('borrow_date')).order_by()
+                   .values('book__category', 'month').annotate(total=Count('id')))
+        CategoryMonthlyBorrows.objects.bulk_create(
+            (CategoryMonthlyBorrows(category_id=row['book__category'], month=row['month'], borrow_count=row['total'])
+             for row in monthly.iterator()),
+            batch_size=5000)
+
+        ActiveLoanDay.objects.all().delete()
+        active = (BorrowRecord.objects.filter(status='BORROWED').order_by()
+                  .values('borrow_date').annotate(total=Count('id')))
+        ActiveLoanDay.objects.bulk_create(
+            (ActiveLoanDay(borrow_date=row['borrow_date'], active_count=row['total']) for row in active.iterator()),
+            batch_size=5000)
+
+
+def most_borrowed_books(limit=10):
+    return list(Book.objects.filter(borrow_count__gt=0).order_by('-borrow_count', 'id')
+                .values('id', 'title', 'isbn', 'borrow_count')[:limit])
+
+
+def active_loans_by_member(limit=10):
+    members = (Member.objects.filter(active_loan_count__gt=0).order_by('-active_loan_count', 'id')
+               .values('id', 'user__username', 'active_loan_count')[:limit])
+    return [{'id': row['id'], 'name': row['user__username'], 'active_loans': row['active_loan_count']}
+            for row in members]
+
+
+def overdue_summary(today=None):
+    """
+    Loans out and loans past their due date. Overdue loans are counted with
+    is_overdue(), the definition /borrowrecords/overdue/ lists, as a range
+    over the active-loan due date index.
+    """
+    today = today or timezone.localdate()
+    return {
+        'loan_period_days': settings.LOAN_PERIOD_DAYS,
+        'due_before': today,
+        'active': ActiveLoanDay.objects.aggregate(active=Coalesce(Sum('active_count'), 0))['active'],
+        'overdue': BorrowRecord.objects.filter(is_overdue(today)).count(),
+    }
+
+
+def category_monthly_borrows(months=12, today=None):
+    since = months_back(today or timezone.localdate(), months)
+    rows = (CategoryMonthlyBorrows.objects.filter(month__gte=since, borrow_count__gt=0)
+            .order_by('month', 'category__name', 'category')
+            .values('month', 'category', 'category__name', 'borrow_count'))
+    return [{
+        'month': row['month'].strftime('%Y-%m'),
+        'category': None if row['category'] is None else {'id': row['category'], 'name': row['category__name']},
+        'borrows': row['borrow_count'],
+    } for row in rows]
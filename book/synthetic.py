@@ -0,0 +1,153 @@
+import random
+from datetime import timedelta
+from contextlib import contextmanager
+from django.conf import settings
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+from book.models import Author, Book, BorrowRecord, Category, Member
+from book.search import refresh_search_index
+from book.overdue import fine_for
+
+User = get_user_model()
+
+
+SYNTHETIC_ISBN_PREFIX = 'S'
+SYNTHETIC_AUTHOR_PREFIX = 'Synthetic Author'
+SYNTHETIC_CATEGORY_PREFIX = 'Synthetic Category'
+SYNTHETIC_USER_PREFIX = 'synthetic-member-'
+
+WORDS = (
+    'river shadow garden empire winter silver night ocean crown stone forest dragon '
+    'whisper glass iron golden memory island secret storm paper city mountain letter '
+    'journey kingdom daughter father light dark fire water house road song ghost war '
+    'summer autumn spring moon star sun wolf raven rose lion tiger bridge tower king '
+    'queen knight thief doctor engine machine garden orchard harbour desert valley'
+).split()
+
+
+def synthetic_books():
+    return Book.objects.filter(isbn__startswith=SYNTHETIC_ISBN_PREFIX)
+
+
+def random_text(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def generate_catalog(books, authors=100, categories=20, batch_size=5000, seed=0, log=None):
+    """
+    Top the synthetic catalog up to `books` rows using bulk inserts, then rebuild
+    the maintained counters and search index that bulk_create bypasses.
+    """
+    rng = random.Random(seed)
+
+    existing_categories = list(Category.objects.filter(name__startswith=SYNTHETIC_CATEGORY_PREFIX).values_list('id', flat=True))
+    Category.objects.bulk_create(
+        Category(name=f'{SYNTHETIC_CATEGORY_PREFIX} {i}') for i in range(len(existing_categories), categories))
+    category_ids = list(Category.objects.filter(name__startswith=SYNTHETIC_CATEGORY_PREFIX).values_list('id', flat=True))
+
+    existing_authors = Author.objects.filter(name__startswith=SYNTHETIC_AUTHOR_PREFIX).count()
+    Author.objects.bulk_create(
+        (Author(name=f'{SYNTHETIC_AUTHOR_PREFIX} {i} {random_text(rng, 1).title()}', biography=random_text(rng, 30))
+         for i in range(existing_authors, authors)),
+        batch_size=batch_size)
+    author_ids = list(Author.objects.filter(name__startswith=SYNTHETIC_AUTHOR_PREFIX).values_list('id', flat=True))
+
+    start = synthetic_books().count()
+    for offset in range(start, books, batch_size):
+        batch = [
+            Book(
+                title=random_text(rng, rng.randint(2, 6)).title(),
+                author_id=rng.choice(author_ids),
+                category_id=rng.choice(category_ids),
+                isbn=f'{SYNTHETIC_ISBN_PREFIX}{n:012d}',
+                availability_status=rng.random() > 0.2,
+            )
+            for n in range(offset, min(offset + batch_size, books))
+        ]
+        Book.objects.bulk_create(batch, batch_size=batch_size)
+        if log:
+            log(f'{offset + len(batch)}/{books} books')
+
+    if start < books:
+        Category.rebuild_book_counts(category_ids)
+        refresh_search_index(synthetic_books().values_list('id', flat=True))
+    return synthetic_books()
+
+
+def synthetic_members():
+    return Member.objects.filter(user__username__startswith=SYNTHETIC_USER_PREFIX)
+
+
+def synthetic_borrow_records():
+    return BorrowRecord.objects.filter(member__user__username__startswith=SYNTHETIC_USER_PREFIX)
+
+
+def generate_members(members, batch_size=5000):
+    start = synthetic_members().count()
+    for offset in range(start, members, batch_size):
+        stop = min(offset + batch_size, members)
+        User.objects.bulk_create(
+            (User(username=f'{SYNTHETIC_USER_PREFIX}{n}', email=f'{SYNTHETIC_USER_PREFIX}{n}@example.com', password='!')
+             for n in range(offset, stop)),
+            batch_size=batch_size)
+        users = User.objects.filter(username__in=[f'{SYNTHETIC_USER_PREFIX}{n}' for n in range(offset, stop)])
+        Member.objects.bulk_create((Member(user=user) for user in users), batch_size=batch_size)
+    return synthetic_members()
+
+
+@contextmanager
+def explicit_borrow_dates():
+    # bulk_create runs pre_save, which would stamp every synthetic record with today's date.
+    field = BorrowRecord._meta.get_field('borrow_date')
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+def generate_borrow_history(records, active_ratio=0.02, days=3 * 365, batch_size=10_000, seed=0, log=None):
+    """
+    Top synthetic borrow history up to `records` rows over the synthetic books
+    and members. Most rows are returned loans spread over the last `days` days;
+    about `active_ratio` of them are active loans, at most one per (book, member).
+    """
+    rng = random.Random(seed)
+    book_ids = list(synthetic_books().values_list('id', flat=True))
+    member_ids = list(synthetic_members().values_list('id', flat=True))
+    if not book_ids or not member_ids:
+        raise ValueError("Generate synthetic books and members before borrow history.")
+
+    active = set(synthetic_borrow_records().filter(status='BORROWED').values_list('book_id', 'member_id'))
+    today = timezone.now().date()
+    loan_period = timedelta(days=settings.LOAN_PERIOD_DAYS)
+    start = synthetic_borrow_records().count()
+    with explicit_borrow_dates():
+        for offset in range(start, records, batch_size):
+            batch = []
+            for _ in range(offset, min(offset + batch_size, records)):
+                book_id, member_id = rng.choice(book_ids), rng.choice(member_ids)
+                borrow_date = today - timedelta(days=rng.randint(0, days))
+                if rng.random() < active_ratio and (book_id, member_id) not in active:
+                    active.add((book_id, member_id))
+                    batch.append(BorrowRecord(book_id=book_id, member_id=member_id, borrow_date=borrow_date,
+                                              due_date=borrow_date + loan_period))
+                else:
+                    due_date = borrow_date + loan_period
+                    return_date = min(today, borrow_date + timedelta(days=rng.randint(1, 30)))
+                    batch.append(BorrowRecord(
+                        book_id=book_id, member_id=member_id, status='RETURNED', borrow_date=borrow_date,
+                        due_date=due_date, return_date=return_date, overdue=return_date > due_date,
+                        fine=fine_for(due_date, return_date)))
+            BorrowRecord.objects.bulk_create(batch, batch_size=batch_size)
+            if log:
+                log(f'{offset + len(batch)}/{records} borrow records')
+    return synthetic_borrow_records()
+
+
+def clear_catalog():
+    synthetic_borrow_records().delete()
+    User.objects.filter(username__startswith=SYNTHETIC_USER_PREFIX).delete()
+    synthetic_books().delete()
+    Author.objects.filter(name__startswith=SYNTHETIC_AUTHOR_PREFIX).delete()
+    Category.objects.filter(name__startswith=SYNTHETIC_CATEGORY_PREFIX).delete()
@@ -0,0 +1,66 @@
+import uuid
+from pathlib import Path
+from django.db import transaction
+from django.utils.dateparse import parse_date
+from django.core.files.base import ContentFile
+from book import recommendations, snapshots, stats
+from book.models import BookImage
+from tasks.queue import enqueue, staging_storage, task
+
+
+def queue_image_upload(image, upload):
+    """Stage `upload` and queue pushing it to Cloudinary as `image`'s picture; the request does no Cloudinary I/O."""
+    staged = staging_storage().save(f'book-images/{uuid.uuid4().hex}{Path(upload.name).suffix.lower()}', upload)
+    return enqueue('book.upload_image', {'image_id': image.pk, 'staged': staged}, key=f'book.upload_image:{staged}')
+
+
+@task('book.upload_image')
+def upload_image(image_id, staged):
+    """
+    Push a staged picture to Cloudinary as `image_id`'s original and store
+    its resized renditions and placeholder (book/images.py).
+    """
+    from cloudinary import uploader
+    from book import images
+
+    storage = staging_storage()
+    image = BookImage.objects.filter(pk=image_id).first()
+    stale = []
+    if image is not None:
+        with storage.open(staged) as file:
+            data = file.read()
+        stale = images.process(image, data)
+        field = BookImage._meta.get_field('image')
+        # The public id follows the image, so a retry after a lost response overwrites instead of uploading a copy.
+        image.image = uploader.upload_resource(
+            ContentFile(data, name=staged), public_id=f'book-images/{image_id}', overwrite=True, invalidate=True,
+            type=field.type, resource_type=field.resource_type)
+        image.save(update_fields=['image', 'image_url', *images.FIELDS])
+    transaction.on_commit(lambda: delete_files(storage, [staged]))
+    if stale:
+        transaction.on_commit(lambda: delete_files(images.image_storage(), stale))
+
+
+def delete_files(storage, names):
+    for name in names:
+        storage.delete(name)
+
+
+@task('book.record_borrows')
+def record_borrows(member_id, category_ids, borrow_date):
+    stats.apply_borrows(member_id, category_ids, parse_date(borrow_date))
+
+
+@task('book.record_returns')
+def record_returns(member_id, borrow_dates):
+    stats.apply_returns(member_id, [parse_date(day) for day in borrow_dates])
+
+
+@task('book.record_co_borrows')
+def record_co_borrows(member_id, record_ids):
+    recommendations.apply_borrows(member_id, record_ids)
+
+
+@task('book.build_catalog_snapshot')
+def build_catalog_snapshot():
+    snapshots.build_snapshot()
@@ -1,3 +1,1301 @@
-from django.test import TestCase
+import gzip
+import base64
+import json
+import tempfile
+import threading
+from decimal import Decimal
+from datetime import date, timedelta
+from importlib import import_module
+from io import BytesIO, StringIO
+from urllib.parse import urlencode
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+from django.db import connection
+from django.db.migrations.loader import MigrationLoader
+from django.core.cache import cache
+from PIL import ExifTags, Image
+from cloudinary import CloudinaryResource
+from django.utils import timezone
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.core.management import call_command
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.contrib.auth import get_user_model
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from book.models import ActiveLoanDay, Author, Book, BookImage, BorrowRecord, Category, CategoryMonthlyBorrows, CoBorrow, Hold, Member, SimilarBook
+from book import circulation, images, overdue, recommendations, snapshots
+from book.circulation import CirculationError
+from book.search import refresh_search_index, search_backend
+from book.synthetic import explicit_borrow_dates
+from book.catalog_io import CATALOG_FIELDS, CatalogImporter, export_lines, export_rows, read_rows
+from tasks.models import StagedFile, Task
+from tasks.queue import run_pending
 
-# Create your tests here.
+User = get_user_model()
+
+
+class KeysetPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(name='Author', biography='Bio')
+        category = Category.objects.create(name='Fiction')
+        for i in range(20):
+            # Duplicate titles and mixed availability exercise the id tie-breaker.
+            Book.objects.create(
+                title=f'Title {i % 7}', author=author, category=category,
+                isbn=f'978000000{i:04d}', availability_status=bool(i % 3))
+        cls.staff = User.objects.create_user(
+            username='staff', email='staff@example.com', password='pass', is_staff=True)
+        member = Member.objects.create(user=cls.staff)
+        for book in Book.objects.all()[:12]:
+            BorrowRecord.objects.create(book=book, member=member)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def walk(self, url):
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append(response.data)
+            url = response.data['next']
+        return pages
+
+    def test_page_number_mode_is_default(self):
+        response = self.client.get('/api/v1/books/')
+        self.assertEqual(response.data['count'], 20)
+        self.assertEqual(len(response.data['results']), 8)
+
+    def test_cursor_walk_matches_model_ordering(self):
+        pages = self.walk('/api/v1/books/?pagination=cursor')
+        ids = [book['id'] for page in pages for book in page['results']]
+        expected = list(Book.objects.order_by('availability_status', 'title', 'id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+        self.assertNotIn('count', pages[0])
+        self.assertIsNone(pages[0]['previous'])
+
+    def test_cursor_previous_link_returns_previous_page(self):
+        first = self.client.get('/api/v1/books/?pagination=cursor').data
+        second = self.client.get(first['next']).data
+        back = self.client.get(second['previous']).data
+        self.assertEqual([b['id'] for b in back['results']], [b['id'] for b in first['results']])
+
+    def test_deep_cursor_page_is_a_single_range_query(self):
+        pages = self.walk('/api/v1/books/?pagination=cursor')
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(pages[1]['next'])
+        sql = ' '.join(q['sql'].upper() for q in ctx.captured_queries)
+        self.assertNotIn('COUNT(', sql)
+        self.assertNotIn('OFFSET', sql)
+
+    def test_borrow_records_cursor_is_time_ordered(self):
+        self.client.force_authenticate(user=self.staff)
+        pages = self.walk('/api/v1/borrowrecords/?pagination=cursor')
+        ids = [record['id'] for page in pages for record in page['results']]
+        self.assertEqual(ids, list(BorrowRecord.objects.order_by('-borrow_date', '-id').values_list('id', flat=True)))
+
+    def test_malformed_cursor_is_not_found(self):
+        self.client.force_authenticate(user=self.staff)
+        positions = ['not json', '{"a": 1}', '[false, "Title 1"]', '[{}, "x", 1]', '[true, "T1", "abc"]',
+                     '["T1", "x", 1]', '[true, null, 1]']
+        for position in positions:
+            cursor = base64.b64encode(urlencode({'p': position}).encode()).decode()
+            response = self.client.get(f'/api/v1/books/?{urlencode({"cursor": cursor})}')
+            self.assertEqual(response.status_code, 404, position)
+        cursor = base64.b64encode(urlencode({'p': '["yesterday", 1]'}).encode()).decode()
+        self.assertEqual(self.client.get(f'/api/v1/borrowrecords/?{urlencode({"cursor": cursor})}').status_code, 404)
+
+
+class BookImageURLTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(name='Author', biography='Bio')
+        category = Category.objects.create(name='Fiction')
+        for i in range(8):
+            book = Book.objects.create(title=f'Book {i}', author=author, category=category, isbn=f'978100000{i:04d}')
+            BookImage.objects.create(book=book, image=f'image/upload/v1/books/cover-{i}.jpg')
+            BookImage.objects.create(book=book, image=f'image/upload/v1/books/back-{i}.jpg')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_url_is_resolved_once_on_save(self):
+        with mock.patch.object(CloudinaryResource, 'build_url', autospec=True, return_value='https://cdn/x.jpg') as build_url:
+            image = BookImage.objects.create(book=Book.objects.first(), image='image/upload/v1/books/new.jpg')
+        self.assertEqual(build_url.call_count, 1)
+        self.assertEqual(image.image_url, 'https://cdn/x.jpg')
+
+    def test_catalog_page_builds_no_urls(self):
+        with mock.patch.object(CloudinaryResource, 'build_url', autospec=True) as build_url, \
+                mock.patch('cloudinary.utils.cloudinary_url') as cloudinary_url, \
+                CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/v1/books/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(build_url.call_count, 0)
+        self.assertEqual(cloudinary_url.call_count, 0)
+        self.assertEqual(len(ctx.captured_queries), 3)
+        image = response.data['results'][0]['images'][0]['image']
+        self.assertEqual(image, BookImage.objects.get(pk=response.data['results'][0]['images'][0]['id']).image_url)
+
+    def test_rows_without_stored_url_fall_back_to_storage(self):
+        BookImage.objects.update(image_url='')
+        with mock.patch.object(CloudinaryResource, 'build_url', autospec=True, return_value='https://cdn/x.jpg') as build_url:
+            response = self.client.get(f'/api/v1/books/{Book.objects.first().pk}/')
+        self.assertEqual(build_url.call_count, 2)
+        self.assertEqual(response.data['images'][0]['image'], 'https://cdn/x.jpg')
+
+
+class FakeCloudinary:
+    """Stands in for cloudinary.uploader.upload_resource, keeping uploads in a local directory."""
+
+    def __init__(self, location):
+        self.storage = FileSystemStorage(location=location)
+        self.calls = []
+
+    def upload_resource(self, file, public_id, **options):
+        self.calls.append(public_id)
+        self.storage.delete(f'{public_id}.png')
+        self.storage.save(f'{public_id}.png', file)
+        return CloudinaryResource(public_id, version=str(len(self.calls)), format='png',
+                                  type=options['type'], resource_type=options['resource_type'])
+
+
+class BookImageUploadTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.book = Book.objects.create(title='Dune', isbn='9780000000001')
+        cls.staff = User.objects.create_user(username='staff', email='staff@example.com', password='pass', is_staff=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cloudinary = FakeCloudinary(f'{directory.name}/cloudinary')
+        patcher = mock.patch('cloudinary.uploader.upload_resource', side_effect=self.cloudinary.upload_resource)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.renditions = FileSystemStorage(location=f'{directory.name}/media', base_url='/media/')
+        storage = override_settings(BOOK_IMAGE_WIDTHS=[160, 320, 640], BOOK_IMAGE_STORAGE={
+            'BACKEND': 'django.core.files.storage.FileSystemStorage',
+            'OPTIONS': {'location': self.renditions.location, 'base_url': '/media/'},
+        })
+        storage.enable()
+        self.addCleanup(storage.disable)
+
+    def upload(self, url=None, method='post'):
+        stream = BytesIO()
+        Image.new('RGB', (400, 600), 'red').save(stream, 'PNG')
+        upload = SimpleUploadedFile('cover.png', stream.getvalue(), content_type='image/png')
+        url = url or f'/api/v1/books/{self.book.pk}/images/'
+        return getattr(self.client, method)(url, {'image': upload}, format='multipart')
+
+    def test_upload_is_queued_and_pushed_by_the_worker(self):
+        response = self.upload()
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertIsNone(response.data['image'])
+        self.assertEqual(self.cloudinary.calls, [])
+        task = Task.objects.get(name='book.upload_image')
+        self.assertEqual(task.payload['image_id'], response.data['id'])
+        self.assertTrue(StagedFile.objects.filter(name=task.payload['staged']).exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(run_pending(), {'done': 1, 'retried': 0, 'failed': 0})
+        image = BookImage.objects.get(pk=response.data['id'])
+        self.assertEqual(self.cloudinary.calls, [f'book-images/{image.pk}'])
+        self.assertEqual(image.image.public_id, f'book-images/{image.pk}')
+        self.assertIn(f'book-images/{image.pk}.png', image.image_url)
+        self.assertFalse(StagedFile.objects.exists())
+        self.assertTrue(self.cloudinary.storage.exists(f'book-images/{image.pk}.png'))
+
+        self.assertEqual((image.width, image.height), (400, 600))
+        self.assertTrue(image.placeholder.startswith('data:image/webp;base64,'))
+        self.assertEqual(sorted((variant['type'], variant['width'], variant['height']) for variant in image.variants), [
+            ('image/jpeg', 160, 240), ('image/jpeg', 320, 480), ('image/jpeg', 400, 600),
+            ('image/webp', 160, 240), ('image/webp', 320, 480), ('image/webp', 400, 600)])
+        for variant in image.variants:
+            self.assertTrue(self.renditions.exists(variant['name']))
+            with Image.open(self.renditions.path(variant['name'])) as rendition:
+                self.assertEqual((rendition.format, rendition.width), (variant['type'][6:].upper(), variant['width']))
+
+        data = self.client.get(f'/api/v1/books/{self.book.pk}/').data['images'][0]
+        webp = sorted((variant for variant in image.variants if variant['type'] == 'image/webp'), key=lambda v: v['width'])
+        self.assertEqual(data['sources'][0], {
+            'type': 'image/webp', 'srcset': ', '.join(f"{v['url']} {v['width']}w" for v in webp)})
+        self.assertEqual([source['type'] for source in data['sources']], ['image/webp', 'image/jpeg'])
+        self.assertTrue(webp[0]['url'].startswith(f'/media/book-images/{image.pk}/'))
+        self.assertEqual(self.client.get('/api/v1/books/').data['results'][0]['images'], [data])
+
+    def test_replacing_the_picture_keeps_the_old_one_until_uploaded(self):
+        image = BookImage.objects.create(book=self.book, image='image/upload/v1/books/old.png')
+        response = self.upload(f'/api/v1/books/{self.book.pk}/images/{image.pk}/', method='put')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.data['image'], image.image_url)
+        run_pending()
+        image.refresh_from_db()
+        self.assertEqual(image.image.public_id, f'book-images/{image.pk}')
+        self.assertEqual(image.width, 400)
+
+    def test_failed_upload_is_retried_with_backoff(self):
+        self.upload()
+        with mock.patch('cloudinary.uploader.upload_resource', side_effect=ConnectionError('offline')):
+            self.assertEqual(run_pending(), {'done': 0, 'retried': 1, 'failed': 0})
+        task = Task.objects.get()
+        self.assertEqual((task.status, task.attempts), ('PENDING', 1))
+        self.assertIn('offline', task.last_error)
+        self.assertGreater(task.run_at, timezone.now())
+        self.assertEqual(run_pending(), {'done': 0, 'retried': 0, 'failed': 0})
+
+        Task.objects.update(run_at=timezone.now())
+        run_pending()
+        self.assertEqual(Task.objects.get().status, 'DONE')
+        self.assertEqual(len(self.cloudinary.calls), 1)
+
+    def test_deleted_image_is_skipped(self):
+        response = self.upload()
+        BookImage.objects.filter(pk=response.data['id']).delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(run_pending()['done'], 1)
+        self.assertEqual(self.cloudinary.calls, [])
+        self.assertFalse(StagedFile.objects.exists())
+
+    def test_transparency_orientation_and_reprocessing(self):
+        stream = BytesIO()
+        exif = Image.Exif()
+        exif[ExifTags.Base.Orientation] = 6
+        Image.new('RGB', (900, 300), 'blue').save(stream, 'JPEG', exif=exif)
+        self.assertEqual(images.render(stream.getvalue())[:2], (300, 900))
+
+        stream = BytesIO()
+        Image.new('RGBA', (200, 100), (0, 0, 0, 0)).save(stream, 'PNG')
+        originals = {}
+        for i in range(3):
+            image = BookImage.objects.create(book=self.book, image=f'books/cover-{i}')
+            originals[image.pk] = stream.getvalue()
+        batch = list(BookImage.objects.order_by('id'))
+        processed, failed, stale = images.reprocess(batch, lambda image: originals[image.pk], workers=2)
+        self.assertEqual((len(processed), failed, stale), (3, {}, []))
+        image = BookImage.objects.get(pk=batch[0].pk)
+        self.assertEqual(sorted({(v['type'], v['width']) for v in image.variants}),
+                         [('image/png', 160), ('image/png', 200), ('image/webp', 160), ('image/webp', 200)])
+
+        originals[batch[0].pk] = b'not an image'
+        processed, failed, stale = images.reprocess(batch, lambda image: originals[image.pk])
+        self.assertEqual((len(processed), list(failed)), (2, [batch[0].pk]))
+        self.assertEqual(len(stale), 8)
+
+
+class CategoryBookCountTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.fiction = Category.objects.create(name='Fiction')
+        cls.history = Category.objects.create(name='History')
+        cls.author = Author.objects.create(name='Author', biography='Bio')
+
+    def setUp(self):
+        cache.clear()
+
+    def count(self, category):
+        category.refresh_from_db(fields=['book_count'])
+        return category.book_count
+
+    def create_book(self, isbn, category):
+        return Book.objects.create(title=isbn, author=self.author, category=category, isbn=isbn)
+
+    def test_create_and_delete(self):
+        book = self.create_book('1', self.fiction)
+        self.create_book('2', self.fiction)
+        self.assertEqual(self.count(self.fiction), 2)
+        book.delete()
+        self.assertEqual(self.count(self.fiction), 1)
+        Book.objects.all().delete()
+        self.assertEqual(self.count(self.fiction), 0)
+
+    def test_recategorise(self):
+        book = self.create_book('1', self.fiction)
+        book.category = self.history
+        book.save()
+        self.assertEqual((self.count(self.fiction), self.count(self.history)), (0, 1))
+        book = Book.objects.get(pk=book.pk)
+        book.category = None
+        book.save()
+        self.assertEqual(self.count(self.history), 0)
+
+    def test_recategorise_instance_loaded_with_deferred_category(self):
+        book = self.create_book('1', self.fiction)
+        book = Book.objects.only('id', 'isbn').get(pk=book.pk)
+        book.category = self.history
+        book.save()
+        self.assertEqual((self.count(self.fiction), self.count(self.history)), (0, 1))
+        Book.objects.only('id').get(pk=book.pk).delete()
+        self.assertEqual(self.count(self.history), 0)
+
+    def test_unrelated_save_does_not_touch_counts(self):
+        book = self.create_book('1', self.fiction)
+        with CaptureQueriesContext(connection) as ctx:
+            book.availability_status = False
+            book.save(update_fields=['availability_status'])
+        self.assertFalse(any('book_category' in q['sql'] for q in ctx.captured_queries))
+        self.assertEqual(self.count(self.fiction), 1)
+
+    def test_rebuild_command(self):
+        self.create_book('1', self.fiction)
+        self.create_book('2', self.history)
+        Category.objects.update(book_count=42)
+        call_command('rebuild_category_counts', stdout=StringIO())
+        self.assertEqual((self.count(self.fiction), self.count(self.history)), (1, 1))
+
+    def test_category_endpoints_skip_aggregation(self):
+        self.create_book('1', self.fiction)
+        with CaptureQueriesContext(connection) as ctx:
+            response = APIClient().get('/api/v1/categories/')
+        self.assertNotIn('COUNT(', ctx.captured_queries[0]['sql'].upper())
+        self.assertEqual({c['name']: c['book_count'] for c in response.data}, {'Fiction': 1, 'History': 0})
+        book = APIClient().get(f'/api/v1/books/{Book.objects.get().pk}/').data
+        self.assertEqual(book['category']['book_count'], 1)
+
+
+class FullTextSearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Fiction')
+        cls.tolkien = Author.objects.create(name='J. R. R. Tolkien', biography='Philologist and professor at Oxford.')
+        cls.austen = Author.objects.create(name='Jane Austen', biography='Novelist of the English gentry.')
+        cls.hobbit = Book.objects.create(title='The Hobbit', author=cls.tolkien, category=category, isbn='1')
+        cls.rings = Book.objects.create(title='The Fellowship of the Ring', author=cls.tolkien, category=category, isbn='2')
+        cls.pride = Book.objects.create(title='Pride and Prejudice', author=cls.austen, category=category, isbn='3')
+
+    def setUp(self):
+        cache.clear()
+
+    def search(self, query, url='/api/v1/books/'):
+        response = APIClient().get(url, {'search': query})
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results'] if 'results' in response.data else response.data
+        return [row['id'] for row in results]
+
+    def test_uses_full_text_index(self):
+        self.assertEqual(search_backend(), 'sqlite')
+        with CaptureQueriesContext(connection) as ctx:
+            self.search('hobbit')
+        self.assertTrue(any('MATCH' in q['sql'] for q in ctx.captured_queries))
+
+    def test_matches_title_author_and_biography(self):
+        self.assertEqual(self.search('hobbit'), [self.hobbit.pk])
+        self.assertEqual(sorted(self.search('tolkien')), sorted([self.hobbit.pk, self.rings.pk]))
+        self.assertEqual(self.search('gentry'), [self.pride.pk])
+
+    def test_title_match_ranks_above_author_match(self):
+        ring = Book.objects.create(title='Ring of Fire', author=self.austen, category=self.pride.category, isbn='4')
+        Author.objects.filter(pk=self.tolkien.pk).update(biography='Wrote about a ring.')
+        refresh_search_index()
+        self.assertEqual(self.search('ring')[0], ring.pk)
+
+    def test_stemming_and_prefix_matching(self):
+        self.assertEqual(self.search('rings'), [self.rings.pk])
+        self.assertEqual(self.search('prej'), [])
+        response = APIClient().get('/api/v1/books/', {'search': 'prej', 'fuzzy': 'true'})
+        self.assertEqual([row['id'] for row in response.data['results']], [self.pride.pk])
+
+    def test_index_follows_writes(self):
+        self.hobbit.title = 'There and Back Again'
+        self.hobbit.save()
+        self.assertEqual(self.search('hobbit'), [])
+        self.assertEqual(self.search('again'), [self.hobbit.pk])
+        self.tolkien.name = 'John Ronald Reuel Tolkien'
+        self.tolkien.save()
+        self.assertEqual(sorted(self.search('reuel')), sorted([self.hobbit.pk, self.rings.pk]))
+        self.pride.delete()
+        self.assertEqual(self.search('austen'), [])
+
+    def test_punctuation_only_query_returns_nothing(self):
+        self.assertEqual(self.search('"*'), [])
+
+    def test_author_search_covers_biography(self):
+        self.assertEqual(self.search('oxford', url='/api/v1/authors/'), [self.tolkien.pk])
+
+
+class BorrowReturnTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(name='Author', biography='Bio')
+        category = Category.objects.create(name='Fiction')
+        cls.book = Book.objects.create(title='Book', author=author, category=category, isbn='1')
+        BookImage.objects.create(book=cls.book, image='books/cover')
+        cls.user = User.objects.create_user(username='reader', email='reader@example.com', password='pass')
+        cls.member = Member.objects.create(user=cls.user)
+        other = User.objects.create_user(username='other', email='other@example.com', password='pass')
+        cls.other = Member.objects.create(user=other)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def borrow(self):
+        return self.client.post(f'/api/v1/books/{self.book.pk}/borrow/')
+
+    def give_back(self):
+        return self.client.post(f'/api/v1/books/{self.book.pk}/return/')
+
+    def test_borrow_then_return_updates_record_in_place(self):
+        response = self.borrow()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['book']['availability_status'], False)
+        response = self.give_back()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'RETURNED')
+        self.assertEqual(BorrowRecord.objects.count(), 1)
+        record = BorrowRecord.objects.get()
+        self.assertEqual((record.status, record.return_date), ('RETURNED', timezone.localdate()))
+        self.book.refresh_from_db()
+        self.assertTrue(self.book.availability_status)
+
+    def test_member_can_borrow_again_after_returning(self):
+        self.borrow()
+        self.give_back()
+        self.assertEqual(self.borrow().status_code, 201)
+        self.assertEqual(BorrowRecord.objects.filter(status='BORROWED').count(), 1)
+
+    def test_rejections(self):
+        self.borrow()
+        self.assertEqual(self.borrow().data, {"error": "You already borrowed this book"})
+        self.client.force_authenticate(user=self.other.user)
+        response = self.borrow()
+        self.assertEqual((response.status_code, response.data), (400, {"error": "Book is currently not available"}))
+        response = self.give_back()
+        self.assertEqual(response.status_code, 404)
+
+    def test_failed_borrow_leaves_no_trace(self):
+        BorrowRecord.objects.create(book=self.book, member=self.member)
+        self.assertEqual(self.borrow().status_code, 400)
+        self.book.refresh_from_db()
+        self.assertTrue(self.book.availability_status)
+        self.assertEqual(BorrowRecord.objects.count(), 1)
+
+    def test_bounded_queries(self):
+        self.client.force_authenticate(user=User.objects.select_related('member').get(pk=self.user.pk))
+        with CaptureQueriesContext(connection) as borrow:
+            self.borrow()
+        with CaptureQueriesContext(connection) as give_back:
+            self.give_back()
+        writes = [q['sql'] for q in borrow.captured_queries + give_back.captured_queries
+                  if q['sql'].startswith(('UPDATE', 'INSERT'))]
+        maintained = ('availability_status', 'borrowrecord', 'tasks_task')
+        self.assertTrue(all(any(table in sql for table in maintained) for sql in writes))
+        statements = lambda ctx: [q for q in ctx.captured_queries if 'SAVEPOINT' not in q['sql']]
+        # Loan writes plus the queued statistics and co-borrowing tasks; a return also looks up the book's hold queue.
+        self.assertLessEqual(len(statements(borrow)), 6)
+        self.assertLessEqual(len(statements(give_back)), 7)
+
+
+    def test_migration_collapses_loans_returned_on_a_later_day(self):
+        collapse = import_module('book.migrations.0010_collapse_returned_borrow_records').collapse_returned_records
+        state_apps = MigrationLoader(connection).project_state(('book', '0009_borrow_indexes')).apps
+        other_book = Book.objects.create(title='Other', author=self.book.author, isbn='2')
+        # Baseline rows: the RETURNED copy was stamped with the return day by auto_now_add.
+        rows = [(self.book, self.member, 'BORROWED', '2020-01-01', None),
+                (other_book, self.member, 'BORROWED', '2020-01-02', None),
+                (self.book, self.other, 'BORROWED', '2020-01-03', None),
+                (self.book, self.member, 'RETURNED', '2020-01-05', '2020-01-05'),
+                (self.book, self.other, 'RETURNED', '2020-01-03', '2020-01-03')]
+        for book, member, status, borrow_date, return_date in rows:
+            record = BorrowRecord.objects.create(book=book, member=member, status=status, return_date=return_date)
+            BorrowRecord.objects.filter(pk=record.pk).update(borrow_date=borrow_date)
+
+        collapse(state_apps, None)
+
+        self.assertEqual(
+            list(BorrowRecord.objects.order_by('id').values_list('book_id', 'member_id', 'status', 'borrow_date', 'return_date')),
+            [(self.book.pk, self.member.pk, 'RETURNED', date(2020, 1, 1), date(2020, 1, 5)),
+             (other_book.pk, self.member.pk, 'BORROWED', date(2020, 1, 2), None),
+             (self.book.pk, self.other.pk, 'RETURNED', date(2020, 1, 3), date(2020, 1, 3))])
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentBorrowTests(TransactionTestCase):
+    """
+    PostgreSQL only: SQLite's in-memory test database is shared between
+    threads through a table-level lock that fails with "database table is
+    locked" instead of waiting, so concurrent writers cannot be exercised.
+    """
+
+    CLIENTS = 200
+
+    def test_exactly_one_concurrent_borrow_succeeds(self):
+        author = Author.objects.create(name='Author', biography='Bio')
+        book = Book.objects.create(title='Popular', author=author, isbn='1')
+        members = []
+        for i in range(self.CLIENTS):
+            user = User.objects.create_user(username=f'u{i}', email=f'u{i}@example.com', password='pass')
+            members.append(Member.objects.create(user=user))
+        barrier = threading.Barrier(self.CLIENTS)
+
+        def attempt(member):
+            barrier.wait()
+            try:
+                circulation.borrow_book(book, member)
+                return 'borrowed'
+            except CirculationError:
+                return 'rejected'
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=self.CLIENTS) as pool:
+            outcomes = list(pool.map(attempt, members))
+
+        self.assertEqual(outcomes.count('borrowed'), 1)
+        self.assertEqual(BorrowRecord.objects.filter(book=book, status='BORROWED').count(), 1)
+        self.assertFalse(Book.objects.get(pk=book.pk).availability_status)
+
+
+class ResponseCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(name='Author', biography='Bio')
+        cls.category = Category.objects.create(name='Fiction')
+        cls.book = Book.objects.create(title='Book', author=cls.author, category=cls.category, isbn='1')
+        cls.user = User.objects.create_user(username='reader', email='reader@example.com', password='pass')
+        Member.objects.create(user=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_repeat_request_is_served_from_cache(self):
+        first = self.client.get('/api/v1/books/')
+        with CaptureQueriesContext(connection) as ctx:
+            second = self.client.get('/api/v1/books/')
+        self.assertEqual(len(ctx.captured_queries), 0)
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(first['ETag'], second['ETag'])
+
+    def test_query_params_are_part_of_the_key(self):
+        self.client.get('/api/v1/books/')
+        response = self.client.get('/api/v1/books/', {'availability_status': 'false'})
+        self.assertEqual(response.data['count'], 0)
+
+    def test_conditional_requests(self):
+        response = self.client.get(f'/api/v1/authors/{self.author.pk}/')
+        with CaptureQueriesContext(connection) as ctx:
+            not_modified = self.client.get(f'/api/v1/authors/{self.author.pk}/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(len(ctx.captured_queries), 0)
+        since = self.client.get(f'/api/v1/authors/{self.author.pk}/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(since.status_code, 304)
+        changed = self.client.get(f'/api/v1/authors/{self.author.pk}/', HTTP_IF_NONE_MATCH='"stale"')
+        self.assertEqual(changed.status_code, 200)
+
+    def test_catalog_writes_invalidate(self):
+        self.client.get('/api/v1/categories/')
+        with self.captureOnCommitCallbacks(execute=True):
+            Book.objects.create(title='Another', author=self.author, category=self.category, isbn='2')
+        response = self.client.get('/api/v1/categories/')
+        self.assertEqual(response.data[0]['book_count'], 2)
+
+    def test_borrow_invalidates(self):
+        self.assertTrue(self.client.get(f'/api/v1/books/{self.book.pk}/').data['availability_status'])
+        self.client.force_authenticate(user=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/v1/books/{self.book.pk}/borrow/')
+        self.client.force_authenticate(user=None)
+        self.assertFalse(self.client.get(f'/api/v1/books/{self.book.pk}/').data['availability_status'])
+
+    def test_errors_are_not_cached(self):
+        self.assertEqual(self.client.get('/api/v1/books/999/').status_code, 404)
+        with self.captureOnCommitCallbacks(execute=True):
+            Book.objects.create(id=999, title='Late', author=self.author, isbn='3')
+        self.assertEqual(self.client.get('/api/v1/books/999/').status_code, 200)
+
+
+class CatalogImportExportTests(TestCase):
+
+    CSV = (
+        'isbn,title,author,author_biography,category,availability_status,images\n'
+        '111,Dune,Frank Herbert,Journalist.,Science Fiction,true,books/dune|books/dune-back\n'
+        '222,Children of Dune,frank herbert,,science fiction,,\n'
+        ',Missing ISBN,Someone,,Other,,\n'
+        '333,Emma,Jane Austen,,Classics,maybe,\n'
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(
+            username='staff', email='staff@example.com', password='pass', is_staff=True)
+        cls.existing_author = Author.objects.create(name='Frank Herbert', biography='Existing.')
+
+    def setUp(self):
+        cache.clear()
+
+    def run_import(self, text, fmt='csv', chunk_size=2):
+        return CatalogImporter(chunk_size=chunk_size).run(read_rows(StringIO(text), fmt))
+
+    def test_import_creates_resolves_and_reports(self):
+        report = self.run_import(self.CSV)
+        self.assertEqual((report.rows, report.created, report.updated, report.failed), (4, 2, 0, 2))
+        self.assertEqual([error['line'] for error in report.errors], [4, 5])
+        self.assertEqual(Author.objects.count(), 1)
+        self.assertEqual(Category.objects.get().name, 'Science Fiction')
+        self.assertEqual(Category.objects.get().book_count, 2)
+        self.assertEqual(BookImage.objects.filter(book__isbn='111').count(), 2)
+        results = APIClient().get('/api/v1/books/', {'search': 'dune'}).data['results']
+        self.assertEqual({row['isbn'] for row in results}, {'111', '222'})
+
+    def test_reimport_upserts_by_isbn(self):
+        self.run_import(self.CSV)
+        report = self.run_import(
+            '{"isbn": "111", "title": "Dune (Revised)", "author": "Jane Austen", "category": "Classics", '
+            '"availability_status": false, "images": ["books/dune"]}\n'
+            '{"isbn": "444", "title": "Persuasion", "author": "Jane Austen"}\n'
+            'not json\n', fmt='jsonl')
+        self.assertEqual((report.created, report.updated, report.failed, report.images), (1, 1, 1, 0))
+        dune = Book.objects.get(isbn='111')
+        self.assertEqual((dune.title, dune.author.name, dune.category.name, dune.availability_status),
+                         ('Dune (Revised)', 'Jane Austen', 'Classics', False))
+        self.assertEqual({c.name: c.book_count for c in Category.objects.all()}, {'Science Fiction': 1, 'Classics': 1})
+
+    def test_reimport_keeps_lent_books_unavailable(self):
+        self.run_import(self.CSV)
+        member = Member.objects.create(user=User.objects.create_user(
+            username='reader', email='reader@example.com', password='pass'))
+        circulation.borrow_book(Book.objects.get(isbn='111'), member)
+        self.run_import(
+            '{"isbn": "111", "title": "Dune", "availability_status": true}\n'
+            '{"isbn": "222", "title": "Dune Messiah", "availability_status": false}\n', fmt='jsonl')
+        self.assertEqual(dict(Book.objects.values_list('isbn', 'availability_status')), {'111': False, '222': False})
+
+    def test_chunk_cost_is_independent_of_chunk_size(self):
+        rows = ''.join(f'{i},Book {i},Author {i % 3},,Category {i % 2},,\n' for i in range(200))
+        header = 'isbn,title,author,author_biography,category,availability_status,images\n'
+        with CaptureQueriesContext(connection) as small:
+            self.run_import(header + rows[:rows.index('10,')], chunk_size=1000)
+        with CaptureQueriesContext(connection) as large:
+            self.run_import(header + rows, chunk_size=1000)
+        self.assertLessEqual(len(large.captured_queries), len(small.captured_queries) + 2)
+
+    def test_export_round_trips(self):
+        self.run_import(self.CSV)
+        lines = list(export_lines(export_rows(chunk_size=1), 'jsonl'))
+        self.assertEqual(len(lines), 2)
+        Book.objects.all().delete()
+        report = self.run_import(''.join(lines), fmt='jsonl')
+        self.assertEqual((report.created, report.failed), (2, 0))
+        self.assertEqual(BookImage.objects.filter(book__isbn='111').count(), 2)
+
+    def test_api_is_admin_only_and_streams(self):
+        client = APIClient()
+        upload = SimpleUploadedFile('catalog.csv', self.CSV.encode(), content_type='text/csv')
+        self.assertIn(client.post('/api/v1/catalog/import/', {'file': upload}).status_code, (401, 403))
+        client.force_authenticate(user=self.staff)
+        upload.seek(0)
+        response = client.post('/api/v1/catalog/import/', {'file': upload})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created'], 2)
+        response = client.get('/api/v1/catalog/export/', {'file_format': 'csv'})
+        self.assertTrue(response.streaming)
+        body = b''.join(response.streaming_content).decode()
+        self.assertEqual(body.splitlines()[0], ','.join(CATALOG_FIELDS))
+        self.assertEqual(len(body.splitlines()), 3)
+
+    def test_api_rejects_undecodable_files(self):
+        client = APIClient()
+        client.force_authenticate(user=self.staff)
+        upload = SimpleUploadedFile('catalog.csv', self.CSV.encode() + b'444,\xff\xfe,,,,,\n', content_type='text/csv')
+        response = client.post('/api/v1/catalog/import/', {'file': upload})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], 'The catalog must be UTF-8 encoded.')
+
+
+class BulkCirculationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(name='Author', biography='Bio')
+        cls.books = [Book.objects.create(title=f'Book {i}', author=author, isbn=f'90{i}') for i in range(6)]
+        cls.staff = User.objects.create_user(
+            username='desk', email='desk@example.com', password='pass', is_staff=True)
+        user = User.objects.create_user(username='reader', email='reader@example.com', password='pass')
+        cls.member = Member.objects.create(user=user)
+        other = User.objects.create_user(username='other', email='other@example.com', password='pass')
+        cls.other = Member.objects.create(user=other)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.staff)
+
+    def post(self, url, books=(), isbns=(), member=None):
+        return self.client.post(f'/api/v1/borrowrecords/{url}/', {
+            'member': (member or self.member).pk, 'books': list(books), 'isbns': list(isbns)}, format='json')
+
+    def test_staff_only(self):
+        self.client.force_authenticate(user=self.member.user)
+        self.assertEqual(self.post('bulk-borrow', books=[self.books[0].pk]).status_code, 403)
+
+    def test_bulk_borrow_applies_single_item_rules(self):
+        circulation.borrow_book(self.books[1], self.other)
+        circulation.borrow_book(self.books[2], self.member)
+        response = self.post('bulk-borrow', books=[self.books[0].pk, self.books[1].pk, self.books[2].pk, 9999, self.books[0].pk],
+                             isbns=[self.books[3].isbn])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['borrowed'], response.data['failed']), (2, 4))
+        self.assertEqual([r['status'] for r in response.data['results']],
+                         ['borrowed', 'failed', 'failed', 'failed', 'failed', 'borrowed'])
+        self.assertEqual([r.get('error') for r in response.data['results'][1:5]], [
+            "Book is currently not available", "You already borrowed this book", "Book not found",
+            "Book listed more than once"])
+        self.assertEqual(response.data['results'][5]['isbn'], self.books[3].isbn)
+        self.assertEqual(
+            set(BorrowRecord.objects.filter(member=self.member, status='BORROWED').values_list('book_id', flat=True)),
+            {self.books[0].pk, self.books[2].pk, self.books[3].pk})
+        self.assertFalse(Book.objects.get(pk=self.books[3].pk).availability_status)
+
+    def test_bulk_return_updates_in_place(self):
+        self.post('bulk-borrow', books=[book.pk for book in self.books[:3]])
+        response = self.post('bulk-return', books=[self.books[0].pk, self.books[1].pk, self.books[4].pk])
+        self.assertEqual((response.data['returned'], response.data['failed']), (2, 1))
+        self.assertEqual(BorrowRecord.objects.count(), 3)
+        self.assertEqual(BorrowRecord.objects.filter(status='RETURNED').count(), 2)
+        self.assertEqual(list(Book.objects.filter(availability_status=False).values_list('pk', flat=True)), [self.books[2].pk])
+
+    def test_query_count_is_independent_of_stack_size(self):
+        with CaptureQueriesContext(connection) as one:
+            self.post('bulk-borrow', books=[self.books[0].pk])
+        with CaptureQueriesContext(connection) as many:
+            self.post('bulk-borrow', books=[book.pk for book in self.books[1:]])
+        self.assertEqual(len(one.captured_queries), len(many.captured_queries))
+
+    def test_validation(self):
+        self.assertEqual(self.post('bulk-borrow').status_code, 400)
+        response = self.post('bulk-borrow', books=list(range(201)))
+        self.assertEqual(response.status_code, 400)
+
+
+class CompactListTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(name='Frank Herbert', biography='A long biography.')
+        cls.category = Category.objects.create(name='Science Fiction')
+        cls.book = Book.objects.create(title='Dune', author=cls.author, category=cls.category, isbn='9780000000001')
+        cls.image = BookImage.objects.create(book=cls.book, image='books/dune')
+        cls.user = User.objects.create_user(username='reader', email='reader@example.com', password='pass')
+        cls.member = Member.objects.create(user=cls.user)
+        cls.record = BorrowRecord.objects.create(book=cls.book, member=cls.member)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_book_list_matches_detail_by_default(self):
+        book = self.client.get('/api/v1/books/').data['results'][0]
+        self.assertEqual(book['author'], {'id': self.author.pk, 'name': 'Frank Herbert', 'biography': 'A long biography.'})
+        self.assertEqual(book['category'], {'id': self.category.pk, 'name': 'Science Fiction', 'book_count': 1,
+                                            'loan_period_days': None})
+        self.assertEqual(book['images'], [{'id': self.image.pk, 'image': self.image.image_url, 'width': None,
+                                           'height': None, 'placeholder': None, 'sources': []}])
+        self.assertEqual(book, self.client.get(f'/api/v1/books/{self.book.pk}/').data)
+
+    def test_expand_opts_into_trimming(self):
+        book = self.client.get('/api/v1/books/?expand=').data['results'][0]
+        self.assertEqual(book['author'], {'id': self.author.pk, 'name': 'Frank Herbert'})
+        self.assertEqual(book['category'], {'id': self.category.pk, 'name': 'Science Fiction'})
+        book = self.client.get('/api/v1/books/?expand=author').data['results'][0]
+        self.assertEqual(book['author']['biography'], 'A long biography.')
+        self.assertNotIn('book_count', book['category'])
+
+    def test_fields_limits_keys_and_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/v1/books/?fields=id,title')
+        self.assertEqual(response.data['results'], [{'id': self.book.pk, 'title': 'Dune'}])
+        self.assertFalse(any('book_bookimage' in query['sql'] for query in ctx.captured_queries))
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get('/api/v1/books/?fields=id,price')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('fields', response.data)
+
+    def test_cursor_pagination_uses_rows(self):
+        for i in range(8):
+            Book.objects.create(title=f'Emma {i}', author=self.author, category=self.category, isbn=f'97800000001{i:02d}')
+        first = self.client.get('/api/v1/books/?pagination=cursor&fields=title')
+        self.assertEqual(first.data['results'][0], {'title': 'Dune'})
+        second = self.client.get(first.data['next'])
+        self.assertEqual(second.data['results'], [{'title': 'Emma 7'}])
+
+    def test_borrow_record_list(self):
+        self.client.force_authenticate(self.user)
+        record = self.client.get('/api/v1/borrowrecords/').json()['results'][0]
+        self.assertEqual(record, self.client.get(f'/api/v1/borrowrecords/{self.record.pk}/').json())
+        self.assertEqual(record['member']['email'], 'reader@example.com')
+        self.assertEqual(record['display_date'], record['borrow_date'])
+
+        record = self.client.get('/api/v1/borrowrecords/?expand=book.author').data['results'][0]
+        self.assertEqual(record['member'], {'id': self.member.pk, 'name': 'reader'})
+        self.assertEqual(record['book']['author']['biography'], 'A long biography.')
+        self.assertNotIn('book_count', record['book']['category'])
+
+
+class BorrowStatsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(name='Author', biography='Bio')
+        cls.fiction = Category.objects.create(name='Fiction')
+        cls.books = [Book.objects.create(title=f'Book {i}', author=author, category=cls.fiction if i else None,
+                                         isbn=f'97800000000{i:02d}') for i in range(3)]
+        cls.staff = User.objects.create_user(username='staff', email='staff@example.com', password='pass', is_staff=True)
+        cls.user = User.objects.create_user(username='reader', email='reader@example.com', password='pass')
+        cls.member = Member.objects.create(user=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def snapshot(self):
+        return (
+            list(Book.objects.order_by('id').values_list('borrow_count', flat=True)),
+            list(Member.objects.order_by('id').values_list('borrow_count', 'active_loan_count')),
+            sorted(CategoryMonthlyBorrows.objects.values_list('category_id', 'month', 'borrow_count'), key=str),
+            sorted(ActiveLoanDay.objects.filter(active_count__gt=0).values_list('borrow_date', 'active_count')),
+        )
+
+    def test_circulation_keeps_stats_in_step_with_rebuild(self):
+        circulation.borrow_book(self.books[1], self.member)
+        circulation.bulk_borrow(self.member, book_ids=[self.books[0].pk, self.books[2].pk])
+        circulation.return_book(self.books[1], self.member)
+        circulation.bulk_return(self.member, book_ids=[self.books[0].pk])
+        circulation.borrow_book(self.books[1], self.member)
+        self.assertEqual(self.snapshot()[1], [(0, 0)])
+
+        run_pending()
+        incremental = self.snapshot()
+        self.assertEqual(incremental[0], [1, 2, 1])
+        self.assertEqual(incremental[1], [(4, 2)])
+        month = timezone.localdate().replace(day=1)
+        self.assertEqual(incremental[2], sorted([(None, month, 1), (self.fiction.pk, month, 3)], key=str))
+        self.assertEqual(incremental[3], [(BorrowRecord.objects.first().borrow_date, 2)])
+        call_command('rebuild_borrow_stats', stdout=StringIO())
+        self.assertEqual(self.snapshot(), incremental)
+
+    def test_reports(self):
+        with explicit_borrow_dates():
+            BorrowRecord.objects.create(book=self.books[1], member=self.member,
+                                        borrow_date=timezone.localdate() - timedelta(days=30),
+                                        due_date=timezone.localdate() - timedelta(days=16))
+        circulation.borrow_book(self.books[2], self.member)
+        call_command('rebuild_borrow_stats', stdout=StringIO())
+
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get('/api/v1/reports/').status_code, 403)
+
+        self.client.force_authenticate(self.staff)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/v1/reports/')
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(ctx.captured_queries), 5)
+        self.assertEqual([book['id'] for book in response.data['most_borrowed']], [self.books[1].pk, self.books[2].pk])
+        self.assertEqual(response.data['active_loans'], [{'id': self.member.pk, 'name': 'reader', 'active_loans': 2}])
+        self.assertEqual((response.data['overdue']['active'], response.data['overdue']['overdue']), (2, 1))
+        self.assertEqual(sum(row['borrows'] for row in response.data['category_monthly']), 2)
+
+        self.assertEqual(len(self.client.get('/api/v1/reports/most-borrowed/?limit=1').data), 1)
+        self.assertEqual(self.client.get('/api/v1/reports/most-borrowed/?limit=0').status_code, 400)
+
+
+class RecommendationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(name='Author', biography='Bio')
+        cls.books = [Book.objects.create(title=f'Book {i}', author=author, isbn=f'97800000001{i:02d}') for i in range(5)]
+        cls.members = [Member.objects.create(user=User.objects.create_user(
+            username=f'reader{i}', email=f'reader{i}@example.com', password='pass')) for i in range(3)]
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def snapshot(self):
+        return (sorted(CoBorrow.objects.values_list('book_id', 'other_id', 'members')),
+                sorted((book, similar, round(score, 6), rank) for book, similar, score, rank in
+                       SimilarBook.objects.values_list('book_id', 'similar_id', 'score', 'rank')))
+
+    def borrow_and_return(self, member, *books):
+        circulation.bulk_borrow(member, book_ids=[book.pk for book in books])
+        circulation.bulk_return(member, book_ids=[book.pk for book in books])
+
+    @override_settings(RECOMMENDATIONS_TOP_K=2, RECOMMENDATIONS_MEMBER_BOOKS=3)
+    def test_incremental_updates_match_rebuild(self):
+        a, b, c, d, e = self.books
+        self.borrow_and_return(self.members[0], a, b)
+        self.borrow_and_return(self.members[0], c)
+        self.borrow_and_return(self.members[1], b)
+        self.borrow_and_return(self.members[1], a, b)
+        circulation.borrow_book(c, self.members[1])
+        circulation.reserve_book(c, self.members[2])
+        circulation.return_book(c, self.members[1])
+        # Past RECOMMENDATIONS_MEMBER_BOOKS: d is not counted.
+        circulation.borrow_book(d, self.members[0])
+        circulation.borrow_book(e, self.members[2])
+        # Tasks of earlier borrows may run after later ones.
+        queued = Task.objects.filter(name__in=recommendations.TASKS).order_by('id').values_list('id', flat=True)
+        for n, task_id in enumerate(queued):
+            Task.objects.filter(pk=task_id).update(run_at=timezone.now() - timedelta(seconds=n))
+        run_pending()
+
+        matrix = self.snapshot()[0]
+        pairs = {(book, other): members for book, other, members in matrix}
+        self.assertEqual((pairs[(a.pk, a.pk)], pairs[(a.pk, b.pk)], pairs[(b.pk, a.pk)], pairs[(b.pk, b.pk)]), (2, 2, 2, 2))
+        self.assertEqual((pairs[(c.pk, c.pk)], pairs[(c.pk, e.pk)], pairs[(e.pk, e.pk)]), (3, 1, 1))
+        self.assertNotIn((d.pk, d.pk), pairs)
+        self.assertEqual(SimilarBook.objects.filter(book=c).count(), 2)
+
+        call_command('rebuild_recommendations', stdout=StringIO())
+        self.assertEqual(self.snapshot()[0], matrix)
+        self.assertEqual(SimilarBook.objects.count(), 7)
+        self.assertEqual([row['id'] for row in recommendations.similar_books(a.pk)], [b.pk, c.pk])
+        self.assertEqual([row['id'] for row in recommendations.similar_books(c.pk)], [a.pk, b.pk])
+
+    def test_similar_endpoint(self):
+        a, b, c, d, _ = self.books
+        for member, books in zip(self.members, [(a, b, c), (a, b), (a, d)]):
+            self.borrow_and_return(member, *books)
+        run_pending()
+
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/v1/books/{a.pk}/similar/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(row['id'], row['title'], row['score']) for row in response.data], [
+            (b.pk, 'Book 1', round(2 / 6 ** 0.5, 4)), (c.pk, 'Book 2', round(1 / 3 ** 0.5, 4)),
+            (d.pk, 'Book 3', round(1 / 3 ** 0.5, 4))])
+        self.assertEqual(self.client.get(f'/api/v1/books/{self.books[4].pk}/similar/').data, [])
+        self.assertEqual(self.client.get('/api/v1/books/0/similar/').status_code, 404)
+
+    def test_rebuild_drops_queued_borrows(self):
+        circulation.borrow_book(self.books[0], self.members[0])
+        recommendations.rebuild()
+        self.assertFalse(Task.objects.filter(name__in=recommendations.TASKS).exists())
+        self.assertEqual(list(CoBorrow.objects.values_list('members', flat=True)), [1])
+
+
+class BorrowHistoryExportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(name='Author', biography='Bio')
+        cls.staff = User.objects.create_user(username='staff', email='staff@example.com', password='pass', is_staff=True)
+        cls.user = User.objects.create_user(username='reader', email='reader@example.com', password='pass')
+        member = Member.objects.create(user=cls.user)
+        today = timezone.localdate()
+        with explicit_borrow_dates():
+            for i in range(5):
+                book = Book.objects.create(title=f'Book, {i}', author=author, isbn=f'97800000000{i:02d}')
+                BorrowRecord.objects.create(
+                    book=book, member=member, borrow_date=today - timedelta(days=10 * i),
+                    status='RETURNED' if i % 2 else 'BORROWED', return_date=today if i % 2 else None)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def export(self, query=''):
+        response = self.client.get(f'/api/v1/borrowrecords/export/{query}')
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_csv_export_streams_flat_rows(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response, content = self.export()
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = content.splitlines()
+        self.assertEqual(lines[0], ','.join(['id', 'status', 'borrow_date', 'return_date', 'book_id', 'isbn',
+                                             'title', 'member_id', 'username', 'email']))
+        self.assertEqual(len(lines), 6)
+        self.assertIn('"Book, 4"', lines[1])
+        self.assertLessEqual(len(ctx.captured_queries), 1)
+
+    def test_filters(self):
+        _, content = self.export('?file_format=jsonl&status=BORROWED')
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual({row['status'] for row in rows}, {'BORROWED'})
+        self.assertEqual(len(rows), 3)
+
+        since = timezone.localdate() - timedelta(days=15)
+        _, content = self.export(f'?file_format=jsonl&borrowed_from={since.isoformat()}')
+        self.assertEqual([json.loads(line)['title'] for line in content.splitlines()], ['Book, 1', 'Book, 0'])
+
+    def test_rejections(self):
+        self.assertEqual(self.client.get('/api/v1/borrowrecords/export/?borrowed_to=yesterday').status_code, 400)
+        self.assertEqual(self.client.get('/api/v1/borrowrecords/export/?status=LOST').status_code, 400)
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get('/api/v1/borrowrecords/export/').status_code, 403)
+
+
+class CatalogSnapshotTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Fiction')
+        cls.empty_category = Category.objects.create(name='Empty')
+        cls.author = Author.objects.create(name='Author', biography='Bio')
+        for i in range(11):
+            book = Book.objects.create(title=f'Book {i:02d}', author=cls.author if i % 2 else None,
+                                       category=cls.category, isbn=f'97822222222{i:02d}')
+            BookImage.objects.create(book=book, image=f'books/cover-{i}')
+
+    def setUp(self):
+        cache.clear()
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        settings = override_settings(CATALOG_SNAPSHOTS=True, CATALOG_SNAPSHOT_ROOT=root.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        snapshots.build_snapshot(chunk_size=5)
+        self.client = APIClient()
+
+    def test_pages_match_the_api_without_queries(self):
+        cases = [
+            ('books/page-1.json', '/api/v1/books/'),
+            ('books/page-2.json', '/api/v1/books/?page=2'),
+            (f'books/category/{self.category.pk}/page-2.json', f'/api/v1/books/?category={self.category.pk}&page=2'),
+            (f'books/category/{self.empty_category.pk}/page-1.json', f'/api/v1/books/?category={self.empty_category.pk}'),
+            (f'books/author/{self.author.pk}/page-1.json', f'/api/v1/books/?author={self.author.pk}'),
+        ]
+        for name, api_url in cases:
+            with self.subTest(name=name):
+                expected = self.client.get(api_url).json()
+                with CaptureQueriesContext(connection) as ctx:
+                    response = self.client.get(f'/api/v1/snapshots/{name}')
+                self.assertEqual(len(ctx.captured_queries), 0)
+                self.assertEqual(response.status_code, 200)
+                data = json.loads(b''.join(response.streaming_content))
+                self.assertEqual(data['results'], expected['results'])
+                self.assertEqual(data['count'], expected['count'])
+                self.assertEqual(data['next'] is None, expected['next'] is None)
+
+    def test_precompressed_variant_and_strong_etag(self):
+        plain = self.client.get('/api/v1/snapshots/books/page-1.json')
+        packed = self.client.get('/api/v1/snapshots/books/page-1.json', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(packed['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(b''.join(packed.streaming_content)), b''.join(plain.streaming_content))
+        self.assertNotEqual(packed['ETag'], plain['ETag'])
+        self.assertFalse(plain['ETag'].startswith('W/'))
+
+        response = self.client.get('/api/v1/snapshots/books/page-1.json', HTTP_IF_NONE_MATCH=plain['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_rebuilt_after_catalog_writes(self):
+        for i in range(2):
+            with self.captureOnCommitCallbacks(execute=True):
+                Book.objects.create(title=f'New {i}', category=self.category, isbn=f'978222222229{i}')
+        # Both writes share the one rebuild waiting in the queue.
+        self.assertEqual(Task.objects.filter(name__in=snapshots.TASKS, status=Task.PENDING).count(), 1)
+        self.assertEqual(run_pending(names=snapshots.TASKS)['done'], 1)
+        data = json.loads(b''.join(self.client.get('/api/v1/snapshots/books/page-1.json').streaming_content))
+        self.assertEqual(data['count'], 13)
+
+    def test_failed_build_leaves_no_temporary_files(self):
+        root = snapshots.snapshot_root()
+        before = sorted(path.name for path in root.iterdir())
+        with mock.patch('book.snapshots.write_listing', side_effect=OSError('disk full')):
+            with self.assertRaises(OSError):
+                snapshots.build_snapshot()
+        self.assertEqual(sorted(path.name for path in root.iterdir()), before)
+        self.assertEqual(self.client.get('/api/v1/snapshots/books/page-1.json').status_code, 200)
+
+    def test_missing_pages_and_disabled_mode(self):
+        self.assertEqual(self.client.get('/api/v1/snapshots/books/page-9.json').status_code, 404)
+        self.assertEqual(self.client.get('/api/v1/snapshots/../manifest.json').status_code, 404)
+        with override_settings(CATALOG_SNAPSHOTS=False):
+            self.assertEqual(self.client.get('/api/v1/snapshots/books/page-1.json').status_code, 404)
+
+
+class HoldQueueTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Fiction')
+        cls.book = Book.objects.create(title='Book', category=category, isbn='1')
+        cls.other_book = Book.objects.create(title='Other', category=category, isbn='2')
+        cls.members = []
+        for i in range(4):
+            user = User.objects.create_user(username=f'reader{i}', email=f'reader{i}@example.com', password='pass')
+            cls.members.append(Member.objects.create(user=user))
+        cls.staff = User.objects.create_user(username='staff', email='staff@example.com', password='pass', is_staff=True)
+        Member.objects.create(user=cls.staff)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def as_member(self, index):
+        self.client.force_authenticate(user=self.members[index].user)
+
+    def post(self, member, action, book=None):
+        self.as_member(member)
+        return self.client.post(f'/api/v1/books/{(book or self.book).pk}/{action}/')
+
+    def test_reserve_only_books_that_are_out(self):
+        self.assertEqual(self.post(1, 'reserve').data, {"error": "Book is available, borrow it instead"})
+        self.post(0, 'borrow')
+        self.assertEqual(self.post(0, 'reserve').data, {"error": "You already borrowed this book"})
+        response = self.post(1, 'reserve')
+        self.assertEqual((response.status_code, response.data['position']), (201, 1))
+        self.assertEqual(self.post(1, 'reserve').data, {"error": "You already reserved this book"})
+        self.assertEqual(self.post(2, 'reserve').data['position'], 2)
+
+    def test_return_goes_to_the_first_holder_in_the_same_transaction(self):
+        self.post(0, 'borrow')
+        for member in (1, 2, 3):
+            self.post(member, 'reserve')
+        self.as_member(2)
+        self.assertEqual(self.client.delete(f'/api/v1/books/{self.book.pk}/reserve/').status_code, 204)
+
+        with mock.patch.object(circulation.hold_fulfilled, 'send') as send:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.post(0, 'return')
+        self.assertEqual(response.status_code, 200)
+        self.book.refresh_from_db()
+        self.assertFalse(self.book.availability_status)
+        self.assertEqual(self.book.borrow_count, 2)
+        loan = BorrowRecord.objects.get(book=self.book, status='BORROWED')
+        self.assertEqual(loan.member, self.members[1])
+        hold = Hold.objects.get(member=self.members[1])
+        self.assertEqual((hold.status, hold.borrow_record), ('FULFILLED', loan))
+        self.assertEqual(send.call_args.kwargs['holds'], [hold])
+        run_pending()
+        self.members[1].refresh_from_db()
+        self.assertEqual(self.members[1].active_loan_count, 1)
+
+        self.post(1, 'return')
+        self.assertEqual(BorrowRecord.objects.get(book=self.book, status='BORROWED').member, self.members[3])
+        self.post(3, 'return')
+        self.book.refresh_from_db()
+        self.assertTrue(self.book.availability_status)
+
+    def test_promotion_cost_does_not_depend_on_queue_length(self):
+        def returned_queries(book, holders):
+            circulation.borrow_book(book, self.members[0])
+            for member in self.members[1:1 + holders]:
+                circulation.reserve_book(book, member)
+            with CaptureQueriesContext(connection) as ctx:
+                circulation.return_book(book, self.members[0])
+            return len(ctx.captured_queries)
+
+        self.assertEqual(returned_queries(self.book, 1), returned_queries(self.other_book, 3))
+
+    def test_bulk_return_promotes_holders(self):
+        circulation.bulk_borrow(self.members[0], book_ids=[self.book.pk, self.other_book.pk])
+        circulation.reserve_book(self.book, self.members[1])
+        results = circulation.bulk_return(self.members[0], book_ids=[self.book.pk, self.other_book.pk])
+        self.assertEqual([result['status'] for result in results], ['returned', 'returned'])
+        self.assertEqual(BorrowRecord.objects.get(book=self.book, status='BORROWED').member, self.members[1])
+        self.assertEqual(list(Book.objects.filter(availability_status=True)), [self.other_book])
+
+
+@override_settings(LOAN_PERIOD_DAYS=14, OVERDUE_FINE_PER_DAY=Decimal('0.50'), OVERDUE_FINE_MAX=Decimal('5.00'))
+class OverdueLoanTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.short = Category.objects.create(name='Reference', loan_period_days=3)
+        cls.books = [Book.objects.create(title=f'Book {i}', category=cls.short if i % 2 else None, isbn=f'{i}')
+                     for i in range(6)]
+        user = User.objects.create_user(username='reader', email='reader@example.com', password='pass')
+        cls.member = Member.objects.create(user=user)
+        cls.staff = User.objects.create_user(username='staff', email='staff@example.com', password='pass', is_staff=True)
+
+    def setUp(self):
+        cache.clear()
+        self.today = timezone.localdate()
+
+    def loan(self, book, days_late):
+        return BorrowRecord.objects.create(book=book, member=self.member,
+                                           due_date=self.today - timedelta(days=days_late))
+
+    def test_due_date_follows_the_category_loan_period(self):
+        single = circulation.borrow_book(self.books[1], self.member)
+        circulation.bulk_borrow(self.member, book_ids=[self.books[2].pk, self.books[3].pk])
+        due = dict(BorrowRecord.objects.values_list('book_id', 'due_date'))
+        self.assertEqual(single.due_date, self.today + timedelta(days=3))
+        self.assertEqual(due[self.books[2].pk], self.today + timedelta(days=14))
+        self.assertEqual(due[self.books[3].pk], self.today + timedelta(days=3))
+
+    def test_batch_flags_overdue_loans_and_accrues_fines(self):
+        late = [self.loan(self.books[0], 2), self.loan(self.books[1], 30), self.loan(self.books[2], 1)]
+        on_time = self.loan(self.books[3], 0)
+        returned = self.loan(self.books[4], 5)
+        BorrowRecord.objects.filter(pk=returned.pk).update(status='RETURNED')
+
+        with mock.patch.object(overdue.loans_overdue, 'send') as send:
+            totals = overdue.process_overdue_loans(self.today, chunk_size=2)
+        self.assertEqual(totals, {'overdue': 3, 'flagged': 3, 'updated': 3})
+        self.assertEqual(sorted(pk for call in send.call_args_list for pk in call.kwargs['record_ids']),
+                         sorted(record.pk for record in late))
+        fines = dict(BorrowRecord.objects.filter(overdue=True).values_list('id', 'fine'))
+        self.assertEqual(fines, {late[0].pk: Decimal('1.00'), late[1].pk: Decimal('5.00'), late[2].pk: Decimal('0.50')})
+        self.assertFalse(BorrowRecord.objects.filter(pk__in=[on_time.pk, returned.pk], overdue=True).exists())
+
+        self.assertEqual(overdue.process_overdue_loans(self.today)['updated'], 0)
+        out = StringIO()
+        call_command('process_overdue_loans', date=str(self.today + timedelta(days=1)), stdout=out)
+        self.assertIn(f"{'newly overdue':<16} {1:>10}", out.getvalue())
+        self.assertEqual(BorrowRecord.objects.get(pk=late[0].pk).fine, Decimal('1.50'))
+
+    def test_return_settles_the_fine(self):
+        circulation.bulk_borrow(self.member, book_ids=[self.books[0].pk, self.books[2].pk])
+        BorrowRecord.objects.filter(book=self.books[0]).update(due_date=self.today - timedelta(days=4))
+        record = circulation.return_book(self.books[0], self.member)
+        record.refresh_from_db()
+        self.assertEqual((record.overdue, record.fine), (True, Decimal('2.00')))
+        circulation.bulk_return(self.member, book_ids=[self.books[2].pk])
+        record = BorrowRecord.objects.get(book=self.books[2])
+        self.assertEqual((record.status, record.overdue, record.fine), ('RETURNED', False, Decimal('0.00')))
+
+    def test_staff_list_of_overdue_loans(self):
+        records = [self.loan(book, days) for book, days in zip(self.books, (1, 9, 3, 0, 12))]
+        client = APIClient()
+        client.force_authenticate(user=self.member.user)
+        self.assertEqual(client.get('/api/v1/borrowrecords/overdue/').status_code, 403)
+
+        client.force_authenticate(user=self.staff)
+        response = client.get('/api/v1/borrowrecords/overdue/?fields=id,due_date')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['id'] for row in response.data['results']],
+                         [records[4].pk, records[1].pk, records[2].pk, records[0].pk])
+        self.assertIsNone(response.data['next'])
+
+    def test_overdue_report_matches_overdue_list(self):
+        # Reference books are due after 3 days, the others after LOAN_PERIOD_DAYS (14).
+        for book, days_ago in zip(self.books, (5, 5, 20, 1)):
+            with explicit_borrow_dates():
+                borrowed = self.today - timedelta(days=days_ago)
+                BorrowRecord.objects.create(book=book, member=self.member, borrow_date=borrowed,
+                                            due_date=overdue.due_date(overdue.loan_period(book), borrowed))
+        call_command('rebuild_borrow_stats', stdout=StringIO())
+        client = APIClient()
+        client.force_authenticate(user=self.staff)
+        listed = client.get('/api/v1/borrowrecords/overdue/').data['results']
+        report = client.get('/api/v1/reports/overdue/').data
+        self.assertEqual(sorted(row['book']['id'] for row in listed), [self.books[1].pk, self.books[2].pk])
+        self.assertEqual((report['active'], report['overdue']), (4, 2))
+
+    def test_list_and_detail_render_the_fine_alike(self):
+        record = self.loan(self.books[0], 3)
+        BorrowRecord.objects.filter(pk=record.pk).update(fine=Decimal('0.75'))
+        client = APIClient()
+        client.force_authenticate(user=self.staff)
+        listed = client.get('/api/v1/borrowrecords/').json()['results'][0]
+        detail = client.get(f'/api/v1/borrowrecords/{record.pk}/').json()
+        self.assertEqual((listed['fine'], detail['fine']), (0.75, 0.75))
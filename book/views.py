@@ -1,30 +1,44 @@
 from rest_framework import status
-from django.utils import timezone
-from django.db.models import Count
+from django.conf import settings
+from django.db import transaction
+from django.utils.http import quote_etag
+from django.views.decorators.http import require_safe
+from django.http import FileResponse, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.utils.dateparse import parse_date
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.viewsets import ModelViewSet
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.viewsets import ModelViewSet, ViewSet
+from rest_framework.parsers import MultiPartParser
+from rest_framework.exceptions import NotFound, PermissionDenied, ValidationError
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework.filters import SearchFilter, OrderingFilter
+from rest_framework.filters import OrderingFilter
 from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from book.models import Author, Book, BorrowRecord, Member, Category, BookImage
-from book.serializers import AuthorSerializer, BookSerializer, BorrowRecordSerializer, CategorySerializer, MemberSerializer, BookImageSerializer
-from book.paginations import DefaultPagination
+from book.serializers import AuthorSerializer, BookSerializer, BorrowRecordSerializer, CategorySerializer, HoldSerializer, MemberSerializer, BookImageSerializer, BulkCirculationSerializer
+from book.paginations import BookPagination, BorrowRecordPagination, OverdueLoanPagination
+from book.search import FullTextSearchFilter
+from book.cache import CachedResponseMixin, is_not_modified, set_validators
+from book.representations import BookRepresentation, BorrowRecordRepresentation, CompactListMixin
+from book.catalog_io import FORMATS, HISTORY_FIELDS, CatalogImporter, detect_format, export_history, export_lines, export_rows, read_rows, text_stream
+from book import circulation, recommendations, snapshots, stats
+from book.overdue import is_overdue
+from book.tasks import queue_image_upload
+from book.circulation import CirculationError
 
-class BookViewSet(ModelViewSet):
-    queryset = Book.objects.select_related('author', 'category').all()
+class BookViewSet(CachedResponseMixin, CompactListMixin, ModelViewSet):
+    queryset = Book.objects.select_related('author', 'category').prefetch_related('images').defer('search_vector')
     serializer_class = BookSerializer
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    representation_class = BookRepresentation
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter, OrderingFilter]
     filterset_fields = ['category', 'author', 'availability_status']
-    pagination_class = DefaultPagination
+    pagination_class = BookPagination
     search_fields = ['title', 'author__name']
     ordering_fields = ['availability_status', 'title']
 
     def get_permissions(self):
         if self.action in ['create', 'update_status', 'destroy']:
             return [IsAdminUser()]
-        if self.action in ['borrow', 'return_book']:
+        if self.action in ['borrow', 'return_book', 'reserve']:
             return [IsAuthenticated()]
         return [AllowAny()]
 
@@ -33,19 +47,10 @@ class BookViewSet(ModelViewSet):
         book = self.get_object()
         member = request.user.member
 
-        if BorrowRecord.objects.filter(book=book, member=member, status="BORROWED").exists():
-            return Response({"error": "You already borrowed this book"}, status=status.HTTP_400_BAD_REQUEST)
-        if not book.availability_status:
-            return Response({"error": "Book is currently not available"}, status=status.HTTP_400_BAD_REQUEST)
-
-        borrow_record = BorrowRecord.objects.create(
-            book=book,
-            member=member,
-            status='BORROWED'
-        )
-
-        book.availability_status = False
-        book.save()
+        try:
+            borrow_record = circulation.borrow_book(book, member)
+        except CirculationError as error:
+            return Response({"error": error.message}, status=error.status_code)
         serializer = BorrowRecordSerializer(borrow_record)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
@@ -55,22 +60,40 @@ class BookViewSet(ModelViewSet):
         member = request.user.member
 
         try:
-            borrow_record = BorrowRecord.objects.get(book=book, member=member, status='BORROWED')
-        except BorrowRecord.DoesNotExist:
-            return Response({"error": "You have no active borrow for this book"}, status=status.HTTP_404_NOT_FOUND)
-        BorrowRecord.objects.create(
-            book=book,
-            member=member,
-            status='RETURNED',
-            borrow_date=borrow_record.borrow_date,
-            return_date=timezone.now()
-        )
-
-        book.availability_status = True
-        book.save()
+            borrow_record = circulation.return_book(book, member)
+        except CirculationError as error:
+            return Response({"error": error.message}, status=error.status_code)
         serializer = BorrowRecordSerializer(borrow_record)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    @action(detail=True, methods=['post', 'delete'])
+    def reserve(self, request, pk=None):
+        """Join the hold queue of a book that is out (DELETE leaves it). The book is checked out to you when it comes back."""
+        book = self.get_object()
+        member = request.user.member
+
+        try:
+            if request.method == 'DELETE':
+                circulation.cancel_hold(book, member)
+                return Response(status=status.HTTP_204_NO_CONTENT)
+            hold = circulation.reserve_book(book, member)
+        except CirculationError as error:
+            return Response({"error": error.message}, status=error.status_code)
+        serializer = HoldSerializer(hold)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        """Members who borrowed this book also borrowed these, best match first (book/recommendations.py)."""
+        try:
+            book_id = int(pk)
+        except ValueError:
+            raise NotFound()
+        books = recommendations.similar_books(book_id)
+        # Only a book without recommendations costs a second query.
+        if not books and not Book.objects.filter(pk=book_id).exists():
+            raise NotFound()
+        return Response(books)
 
 
 class BookImageViewSet(ModelViewSet):
@@ -81,13 +104,27 @@ class BookImageViewSet(ModelViewSet):
         return BookImage.objects.filter(book_id=self.kwargs.get('book_pk'))
     
     def perform_create(self, serializer):
-        serializer.save(book_id=self.kwargs.get('book_pk'))
+        # The image is created without a picture (`image` is null) until the task worker has uploaded it.
+        upload = serializer.validated_data.pop('image')
+        with transaction.atomic():
+            image = serializer.save(book_id=self.kwargs.get('book_pk'), image='')
+            queue_image_upload(image, upload)
+
+    def perform_update(self, serializer):
+        # The current picture is served until the new one is uploaded.
+        upload = serializer.validated_data.pop('image', None)
+        with transaction.atomic():
+            image = serializer.save()
+            if upload is not None:
+                queue_image_upload(image, upload)
 
 
 
-class AuthorViewSet(ModelViewSet):
+class AuthorViewSet(CachedResponseMixin, ModelViewSet):
     queryset = Author.objects.all()
     serializer_class = AuthorSerializer
+    filter_backends = [FullTextSearchFilter]
+    search_fields = ['name', 'biography']
 
     def get_permissions(self):
         if self.action in ['create', 'update_status', 'destroy']:
@@ -100,9 +137,11 @@ class AuthorViewSet(ModelViewSet):
         return super().create(request, *args, **kwargs)
 
 
-class BorrowRecordViewSet(ModelViewSet):
+class BorrowRecordViewSet(CompactListMixin, ModelViewSet):
     serializer_class = BorrowRecordSerializer 
+    representation_class = BorrowRecordRepresentation
     permission_classes = [IsAuthenticated]
+    pagination_class = BorrowRecordPagination
 
     def get_queryset(self):
         if getattr(self, 'swagger_fake_view', False):
@@ -111,14 +150,89 @@ class BorrowRecordViewSet(ModelViewSet):
         user = self.request.user
         if not user.is_authenticated:
             return BorrowRecord.objects.none()
+        queryset = BorrowRecord.objects.select_related(
+            'book__author', 'book__category', 'member__user'
+        ).prefetch_related('book__images').defer('book__search_vector').order_by('-borrow_date', '-id')
+        if self.action == 'overdue':
+            queryset = queryset.filter(is_overdue())
         if user.is_staff:
-            return BorrowRecord.objects.select_related('book', 'member', 'member__user')
-        return BorrowRecord.objects.select_related('book', 'member', 'member__user').filter(member__user=user)
+            return queryset
+        member_id = getattr(user, 'member_id', None)
+        if member_id is not None:
+            return queryset.filter(member_id=member_id)
+        return queryset.filter(member__user_id=user.pk)
+
+    def get_permissions(self):
+        if self.action in ['bulk_borrow', 'bulk_return', 'export', 'overdue']:
+            return [IsAdminUser()]
+        return super().get_permissions()
+
+    def get_serializer_class(self):
+        if self.action in ['bulk_borrow', 'bulk_return']:
+            return BulkCirculationSerializer
+        return super().get_serializer_class()
+
+    @action(detail=False, methods=['post'], url_path='bulk-borrow')
+    def bulk_borrow(self, request):
+        return self.bulk_circulation(request, circulation.bulk_borrow, 'borrowed')
+
+    @action(detail=False, methods=['post'], url_path='bulk-return')
+    def bulk_return(self, request):
+        return self.bulk_circulation(request, circulation.bulk_return, 'returned')
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        fmt = request.query_params.get('file_format', 'csv')
+        if fmt not in FORMATS:
+            return Response({"error": f"file_format must be one of {', '.join(FORMATS)}."}, status=status.HTTP_400_BAD_REQUEST)
+
+        records = BorrowRecord.objects.order_by('borrow_date', 'id')
+        record_status = request.query_params.get('status')
+        if record_status:
+            if record_status not in dict(BorrowRecord.STATUS_CHOICES):
+                return Response({"error": "status must be BORROWED or RETURNED."}, status=status.HTTP_400_BAD_REQUEST)
+            records = records.filter(status=record_status)
+        for param, lookup in (('borrowed_from', 'borrow_date__gte'), ('borrowed_to', 'borrow_date__lte')):
+            value = request.query_params.get(param)
+            if value:
+                try:
+                    day = parse_date(value)
+                except ValueError:
+                    day = None
+                if day is None:
+                    return Response({"error": f"{param} must be a date (YYYY-MM-DD)."}, status=status.HTTP_400_BAD_REQUEST)
+                records = records.filter(**{lookup: day})
+
+        content_type = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+        response = StreamingHttpResponse(export_lines(export_history(records), fmt, HISTORY_FIELDS), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="borrow-history.{fmt}"'
+        return response
+
+    @action(detail=False, methods=['get'], pagination_class=OverdueLoanPagination)
+    def overdue(self, request):
+        """Loans past their due date, longest overdue first. Each page is one range read on the active-loan due date index."""
+        return self.list(request)
+
+    def bulk_circulation(self, request, operation, success):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        member = serializer.validated_data['member']
+        try:
+            results = operation(member, serializer.validated_data['books'], serializer.validated_data['isbns'])
+        except CirculationError as error:
+            return Response({"error": error.message}, status=error.status_code)
+        succeeded = sum(result['status'] == success for result in results)
+        return Response({
+            "member": member.pk,
+            success: succeeded,
+            "failed": len(results) - succeeded,
+            "results": results,
+        }, status=status.HTTP_200_OK)
 
 
 
-class CategoryViewSet(ModelViewSet):
-    queryset = Category.objects.annotate(book_count=Count('books')).all()
+class CategoryViewSet(CachedResponseMixin, ModelViewSet):
+    queryset = Category.objects.all()
     serializer_class = CategorySerializer
 
     def get_permissions(self):
@@ -143,3 +257,107 @@ class MemberViewSet(ModelViewSet):
 
     def perform_create(self, serializer):
         serializer.save()
+
+
+class CatalogViewSet(ViewSet):
+    permission_classes = [IsAdminUser]
+    parser_classes = [MultiPartParser]
+
+    @action(detail=False, methods=['post'], url_path='import')
+    def import_catalog(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"error": "Upload a CSV or JSONL catalog in the `file` field."}, status=status.HTTP_400_BAD_REQUEST)
+        fmt = request.query_params.get('file_format') or detect_format(upload.name)
+        if fmt not in FORMATS:
+            return Response({"error": f"file_format must be one of {', '.join(FORMATS)}."}, status=status.HTTP_400_BAD_REQUEST)
+
+        importer = CatalogImporter()
+        try:
+            report = importer.run(read_rows(text_stream(upload.file), fmt))
+        except UnicodeDecodeError:
+            # Rows before the bad bytes were imported; report them alongside the error.
+            return Response({"error": "The catalog must be UTF-8 encoded.", **importer.report.as_dict()},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response(report.as_dict(), status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        fmt = request.query_params.get('file_format', 'csv')
+        if fmt not in FORMATS:
+            return Response({"error": f"file_format must be one of {', '.join(FORMATS)}."}, status=status.HTTP_400_BAD_REQUEST)
+
+        content_type = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+        response = StreamingHttpResponse(export_lines(export_rows(), fmt), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="catalog.{fmt}"'
+        return response
+
+
+class ReportViewSet(ViewSet):
+    """Circulation reports read from the statistics maintained in book/stats.py."""
+    permission_classes = [IsAdminUser]
+
+    def get_limit(self, request, name='limit', default=10, maximum=100):
+        try:
+            value = int(request.query_params.get(name, default))
+        except ValueError:
+            value = 0
+        if not 1 <= value <= maximum:
+            raise ValidationError({name: f"Must be an integer between 1 and {maximum}."})
+        return value
+
+    def list(self, request):
+        return Response({
+            "most_borrowed": stats.most_borrowed_books(),
+            "active_loans": stats.active_loans_by_member(),
+            "overdue": stats.overdue_summary(),
+            "category_monthly": stats.category_monthly_borrows(),
+        })
+
+    @action(detail=False, methods=['get'], url_path='most-borrowed')
+    def most_borrowed(self, request):
+        return Response(stats.most_borrowed_books(self.get_limit(request)))
+
+    @action(detail=False, methods=['get'], url_path='active-loans')
+    def active_loans(self, request):
+        return Response(stats.active_loans_by_member(self.get_limit(request)))
+
+    @action(detail=False, methods=['get'])
+    def overdue(self, request):
+        return Response(stats.overdue_summary())
+
+    @action(detail=False, methods=['get'], url_path='category-monthly')
+    def category_monthly(self, request):
+        months = self.get_limit(request, name='months', default=12, maximum=120)
+        return Response(stats.category_monthly_borrows(months))
+
+
+
+@require_safe
+def catalog_snapshot(request, name):
+    """
+    Serve a pre-rendered catalog page straight from the current snapshot:
+    no database queries, no serializers. Picks the brotli or gzip variant
+    the client accepts and answers If-None-Match from the manifest.
+    """
+    if not settings.CATALOG_SNAPSHOTS:
+        return JsonResponse({"error": "Catalog snapshots are disabled."}, status=status.HTTP_404_NOT_FOUND)
+    directory, manifest = snapshots.current_snapshot()
+    document = manifest.get(name) if manifest else None
+    if document is None:
+        return JsonResponse({"error": "No such catalog snapshot page."}, status=status.HTTP_404_NOT_FOUND)
+
+    accepted = {part.split(';')[0].strip() for part in request.headers.get('Accept-Encoding', '').split(',')}
+    encoding, suffix = next(((encoding, suffix) for encoding, suffix in snapshots.ENCODINGS
+                             if encoding in accepted and encoding in document['encodings']), (None, ''))
+    # Each encoding is a different representation, so it gets its own strong validator.
+    etag = quote_etag(f"{document['etag']}-{encoding}" if encoding else document['etag'])
+    version = snapshots.snapshot_version(directory)
+    if is_not_modified(request, etag, int(version / 1000)):
+        response = HttpResponseNotModified()
+    else:
+        response = FileResponse(open(directory / f'{name}{suffix}', 'rb'), content_type='application/json')
+        if encoding:
+            response['Content-Encoding'] = encoding
+    response['Vary'] = 'Accept-Encoding'
+    return set_validators(response, etag, version)
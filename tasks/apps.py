@@ -0,0 +1,13 @@
+from django.apps import AppConfig
+
+
+class TasksConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'tasks'
+
+    def ready(self):
+        from django.utils.module_loading import autodiscover_modules
+
+        # Handlers live in each app's tasks.py, registered with @task.
+        import tasks.mail  # noqa: F401
+        autodiscover_modules('tasks')
@@ -0,0 +1,54 @@
+import base64
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+from tasks.queue import enqueue, task
+
+
+def serialize(message):
+    attachments = []
+    for attachment in message.attachments:
+        filename, content, mimetype = attachment
+        if isinstance(content, bytes):
+            attachments.append([filename, base64.b64encode(content).decode(), mimetype, True])
+        else:
+            attachments.append([filename, content, mimetype, False])
+    return {
+        'subject': message.subject,
+        'body': message.body,
+        'content_subtype': message.content_subtype,
+        'from_email': message.from_email,
+        'to': list(message.to),
+        'cc': list(message.cc),
+        'bcc': list(message.bcc),
+        'reply_to': list(message.reply_to),
+        'headers': dict(message.extra_headers),
+        'alternatives': [list(alternative) for alternative in getattr(message, 'alternatives', [])],
+        'attachments': attachments,
+    }
+
+
+class QueuedEmailBackend(BaseEmailBackend):
+    """
+    Queues every message as a `tasks.send_email` task instead of talking to
+    the mail server during the request; the worker sends it through
+    TASKS_EMAIL_BACKEND. Messages are queued with the request's transaction.
+    """
+
+    def send_messages(self, email_messages):
+        for message in email_messages:
+            enqueue('tasks.send_email', serialize(message))
+        return len(email_messages)
+
+
+@task('tasks.send_email')
+def send_email(subject, body, content_subtype, from_email, to, cc, bcc, reply_to, headers, alternatives, attachments):
+    message = EmailMultiAlternatives(
+        subject, body, from_email, to, bcc, connection=get_connection(settings.TASKS_EMAIL_BACKEND),
+        headers=headers, cc=cc, reply_to=reply_to)
+    message.content_subtype = content_subtype
+    for content, mimetype in alternatives:
+        message.attach_alternative(content, mimetype)
+    for filename, content, mimetype, encoded in attachments:
+        message.attach(filename, base64.b64decode(content) if encoded else content, mimetype)
+    message.send()
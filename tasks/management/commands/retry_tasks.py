@@ -0,0 +1,21 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from tasks.queue import purge, retry_failed
+
+
+class Command(BaseCommand):
+    help = ("Queue failed background tasks again with a fresh set of attempts. --purge-days also deletes "
+            "tasks that finished longer ago than that.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--name', action='append', dest='names', help="Only retry tasks with this name (repeatable).")
+        parser.add_argument('--purge-days', type=int, help="Delete tasks that finished more than this many days ago.")
+
+    def handle(self, *args, **options):
+        if options['purge_days'] is not None:
+            if options['purge_days'] < 0:
+                raise CommandError("--purge-days must not be negative.")
+            deleted = purge(timedelta(days=options['purge_days']))
+            self.stdout.write(f"Deleted {deleted} finished tasks.")
+        retried = retry_failed(options['names'])
+        self.stdout.write(self.style.SUCCESS(f"Queued {retried} failed tasks again."))
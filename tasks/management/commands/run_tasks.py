@@ -0,0 +1,44 @@
+import time
+from django.db import close_old_connections
+from django.core.management.base import BaseCommand, CommandError
+from tasks.queue import run_pending
+
+
+class Command(BaseCommand):
+    help = ("Run queued background tasks (image uploads, emails, statistics). Keeps polling for new tasks "
+            "until stopped; with --once it drains what is due and exits, e.g. from cron.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Exit once no task is due.")
+        parser.add_argument('--batch-size', type=int, default=20, help="Tasks claimed per transaction.")
+        parser.add_argument('--max-tasks', type=int, help="Exit after running this many tasks.")
+        parser.add_argument('--sleep', type=float, default=2.0, help="Seconds to wait when no task is due.")
+        parser.add_argument('--name', action='append', dest='names', help="Only run tasks with this name (repeatable).")
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be positive.")
+        if options['max_tasks'] is not None and options['max_tasks'] < 1:
+            raise CommandError("--max-tasks must be positive.")
+
+        remaining = options['max_tasks']
+        totals = {'done': 0, 'retried': 0, 'failed': 0}
+        try:
+            while remaining is None or remaining > 0:
+                close_old_connections()
+                batch = run_pending(options['batch_size'], limit=remaining, names=options['names'])
+                ran = sum(batch.values())
+                for outcome, count in batch.items():
+                    totals[outcome] += count
+                if remaining is not None:
+                    remaining -= ran
+                if ran and options['verbosity'] > 1:
+                    self.stdout.write(f"{totals['done']} done, {totals['retried']} retried, {totals['failed']} failed")
+                if not ran:
+                    if options['once']:
+                        break
+                    time.sleep(options['sleep'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(
+            f"Ran tasks: {totals['done']} done, {totals['retried']} retried, {totals['failed']} failed."))
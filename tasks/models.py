@@ -0,0 +1,46 @@
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+
+class Task(models.Model):
+    """A side effect deferred out of the request, run by the handler registered for `name` (see tasks/queue.py)."""
+    PENDING = 'PENDING'
+    RUNNING = 'RUNNING'
+    DONE = 'DONE'
+    FAILED = 'FAILED'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True, help_text="Keyword arguments for the handler.")
+    key = models.CharField(max_length=200, unique=True, null=True, blank=True, help_text="Idempotency key: a task with the same key is only queued once.")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now, help_text="When the task is next due; while it runs, when the worker's lease on it expires.")
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['run_at', 'id'], condition=Q(status__in=['PENDING', 'RUNNING']), name='task_due_idx'),
+            models.Index(fields=['status', 'finished_at'], condition=Q(status__in=['DONE', 'FAILED']), name='task_finished_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status.lower()})"
+
+
+class StagedFile(models.Model):
+    """A file a request handed to a task, kept in the database so any instance running the task can read it."""
+    name = models.CharField(max_length=255, unique=True)
+    content = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,148 @@
+import time
+import random
+import traceback
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+from django.db import transaction
+from django.db.models import F, Q
+from django.core.files.storage import storages
+from tasks.models import Task
+
+
+_handlers = {}
+
+
+class LeaseExpired(Exception):
+    """The task was claimed again by another worker while this one ran it."""
+
+
+def task(name):
+    """Register the decorated function as the handler of `name` tasks; it is called with the payload as keyword arguments."""
+    def register(handler):
+        _handlers[name] = handler
+        return handler
+    return register
+
+
+def staging_storage():
+    """Where requests leave files for tasks to pick up (TASKS_STAGING_STORAGE)."""
+    return storages.create_storage(settings.TASKS_STAGING_STORAGE)
+
+
+def enqueue(name, payload=None, key=None, delay=0, max_attempts=None):
+    """
+    Queue a `name` task. Call it in the transaction of the write it follows
+    up on: the task row commits or rolls back with that write. With a `key`,
+    queueing the same key again returns the existing task instead of adding
+    another, whatever state that one is in.
+    """
+    fields = {
+        'name': name,
+        'payload': payload or {},
+        'run_at': timezone.now() + timedelta(seconds=delay),
+        'max_attempts': max_attempts or settings.TASKS_MAX_ATTEMPTS,
+    }
+    if key is None:
+        return Task.objects.create(**fields)
+    return Task.objects.get_or_create(key=key, defaults=fields)[0]
+
+
+def is_due(now=None):
+    """Tasks waiting to run, and running ones whose worker's lease ran out: a range over the task_due_idx index."""
+    return Q(status__in=[Task.PENDING, Task.RUNNING], run_at__lte=now or timezone.now())
+
+
+def retry_delay(attempts):
+    """Exponential backoff from TASKS_RETRY_DELAY, capped at TASKS_RETRY_MAX_DELAY, with jitter so failures spread out."""
+    delay = min(settings.TASKS_RETRY_DELAY * 2 ** (attempts - 1), settings.TASKS_RETRY_MAX_DELAY)
+    return timedelta(seconds=delay * random.uniform(0.8, 1.0))
+
+
+def claim(batch_size, names=None):
+    """
+    Take up to `batch_size` due tasks, oldest first. Claiming moves run_at to
+    the end of a TASKS_LEASE_SECONDS lease, so a task whose worker dies is
+    due again once the lease is up. Concurrent workers skip each other's
+    locked rows on PostgreSQL; SQLite serializes the claim transactions.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        due = Task.objects.filter(is_due(now))
+        if names:
+            due = due.filter(name__in=names)
+        ids = list(due.order_by('run_at', 'id').select_for_update(skip_locked=True).values_list('id', flat=True)[:batch_size])
+        Task.objects.filter(pk__in=ids).update(
+            status=Task.RUNNING, attempts=F('attempts') + 1, run_at=now + timedelta(seconds=settings.TASKS_LEASE_SECONDS))
+    return list(Task.objects.filter(pk__in=ids).order_by('id'))
+
+
+def _settle(task, **fields):
+    # Only the worker holding the current lease may record the outcome.
+    return Task.objects.filter(pk=task.pk, status=Task.RUNNING, attempts=task.attempts).update(**fields)
+
+
+def run(task):
+    """
+    Run a claimed task. The handler's database writes commit together with
+    the task being marked done, so they apply exactly once; side effects
+    outside the database may repeat when a task is retried and should be
+    idempotent. Returns the task's new status.
+    """
+    handler = _handlers.get(task.name)
+    try:
+        if handler is None:
+            raise LookupError(f"No handler is registered for {task.name!r} tasks.")
+        with transaction.atomic():
+            handler(**task.payload)
+            if not _settle(task, status=Task.DONE, finished_at=timezone.now(), last_error=''):
+                raise LeaseExpired(task.pk)
+        return Task.DONE
+    except LeaseExpired:
+        return Task.RUNNING
+    except Exception:
+        error = traceback.format_exc()
+        now = timezone.now()
+        if handler is None or task.attempts >= task.max_attempts:
+            _settle(task, status=Task.FAILED, finished_at=now, last_error=error)
+            return Task.FAILED
+        _settle(task, status=Task.PENDING, run_at=now + retry_delay(task.attempts), last_error=error)
+        return Task.PENDING
+
+
+def run_pending(batch_size=20, limit=None, deadline=None, names=None):
+    """
+    Run due tasks until none are left, `limit` tasks have run or the
+    time.monotonic() `deadline` has passed. Returns how many tasks finished,
+    went back to wait for a retry and failed for good.
+    """
+    totals = {'done': 0, 'retried': 0, 'failed': 0}
+    outcomes = {Task.DONE: 'done', Task.PENDING: 'retried', Task.FAILED: 'failed'}
+    ran = 0
+    while limit is None or ran < limit:
+        if deadline is not None and time.monotonic() >= deadline:
+            break
+        tasks = claim(batch_size if limit is None else min(batch_size, limit - ran), names)
+        if not tasks:
+            break
+        for claimed in tasks:
+            outcome = outcomes.get(run(claimed))
+            if outcome:
+                totals[outcome] += 1
+        ran += len(tasks)
+    return totals
+
+
+def retry_failed(names=None):
+    """Queue failed tasks again with a fresh set of attempts."""
+    failed = Task.objects.filter(status=Task.FAILED)
+    if names:
+        failed = failed.filter(name__in=names)
+    return failed.update(status=Task.PENDING, attempts=0, run_at=timezone.now(), finished_at=None)
+
+
+def purge(older_than):
+    """Delete tasks that finished (done or failed) more than `older_than` ago; their keys can then be queued again."""
+    cutoff = timezone.now() - older_than
+    deleted, _ = Task.objects.filter(status__in=[Task.DONE, Task.FAILED], finished_at__lt=cutoff).delete()
+    return deleted
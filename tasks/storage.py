@@ -0,0 +1,36 @@
+from django.db.models.functions import Length
+from django.core.files.base import ContentFile
+from django.core.files.storage import Storage
+from django.utils.deconstruct import deconstructible
+from tasks.models import StagedFile
+
+
+@deconstructible
+class DatabaseStorage(Storage):
+    """
+    Keeps files in the StagedFile table. Uploads staged here are committed
+    with the request's own writes and readable by whichever instance runs
+    the task, which a serverless instance's local disk is not.
+    """
+
+    def _open(self, name, mode='rb'):
+        content = StagedFile.objects.filter(name=name).values_list('content', flat=True).first()
+        if content is None:
+            raise FileNotFoundError(name)
+        return ContentFile(bytes(content), name=name)
+
+    def _save(self, name, content):
+        StagedFile.objects.create(name=name, content=b''.join(content.chunks()))
+        return name
+
+    def delete(self, name):
+        StagedFile.objects.filter(name=name).delete()
+
+    def exists(self, name):
+        return StagedFile.objects.filter(name=name).exists()
+
+    def size(self, name):
+        size = StagedFile.objects.filter(name=name).values_list(Length('content'), flat=True).first()
+        if size is None:
+            raise FileNotFoundError(name)
+        return size
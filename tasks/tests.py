@@ -0,0 +1,160 @@
+from io import StringIO
+from datetime import timedelta
+from unittest import mock
+from django.core import mail
+from django.conf import settings
+from django.utils import timezone
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from tasks import queue
+from tasks.models import Task
+from tasks.storage import DatabaseStorage
+
+User = get_user_model()
+
+
+@override_settings(TASKS_MAX_ATTEMPTS=3, TASKS_RETRY_DELAY=10, TASKS_RETRY_MAX_DELAY=60)
+class TaskQueueTests(TestCase):
+
+    def setUp(self):
+        self.calls = []
+        handlers = {'test.record': lambda **payload: self.calls.append(payload), 'test.fail': self.fail_task,
+                    'test.signup': self.signup}
+        patcher = mock.patch.dict(queue._handlers, handlers)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def signup(self):
+        n = User.objects.count()
+        User.objects.create_user(username=f'user{n}', email=f'user{n}@example.com', password='pass')
+
+    def fail_task(self, **payload):
+        User.objects.create_user(username='partial', email='partial@example.com', password='pass')
+        raise RuntimeError('boom')
+
+    def test_tasks_run_in_order_once(self):
+        queue.enqueue('test.record', {'n': 1})
+        queue.enqueue('test.record', {'n': 2})
+        queue.enqueue('test.record', {'n': 3}, delay=60)
+        self.assertEqual(queue.run_pending(), {'done': 2, 'retried': 0, 'failed': 0})
+        self.assertEqual(self.calls, [{'n': 1}, {'n': 2}])
+        self.assertEqual(queue.run_pending(), {'done': 0, 'retried': 0, 'failed': 0})
+        self.assertEqual(Task.objects.filter(status='DONE').count(), 2)
+
+    def test_idempotency_key_queues_once(self):
+        first = queue.enqueue('test.record', {'n': 1}, key='welcome:1')
+        queue.run_pending()
+        self.assertEqual(queue.enqueue('test.record', {'n': 1}, key='welcome:1'), first)
+        queue.run_pending()
+        self.assertEqual(self.calls, [{'n': 1}])
+
+    def test_failures_roll_back_and_retry_with_backoff_until_failed(self):
+        task = queue.enqueue('test.fail')
+        delays = []
+        for attempt in range(1, 4):
+            outcome = queue.run_pending()
+            task.refresh_from_db()
+            self.assertEqual(task.attempts, attempt)
+            self.assertFalse(User.objects.filter(username='partial').exists())
+            if attempt < 3:
+                self.assertEqual(outcome['retried'], 1)
+                delays.append((task.run_at - timezone.now()).total_seconds())
+                Task.objects.update(run_at=timezone.now())
+        self.assertEqual((task.status, outcome['failed']), ('FAILED', 1))
+        self.assertIn('RuntimeError: boom', task.last_error)
+        self.assertTrue(7 < delays[0] <= 10 and 15 < delays[1] <= 20, delays)
+
+        self.assertEqual(queue.retry_failed(), 1)
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.attempts), ('PENDING', 0))
+
+    def test_unknown_task_fails_at_once(self):
+        task = queue.enqueue('test.missing')
+        self.assertEqual(queue.run_pending()['failed'], 1)
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.attempts), ('FAILED', 1))
+
+    def test_task_of_a_dead_worker_is_claimed_again_after_its_lease(self):
+        queue.enqueue('test.signup')
+        stale = queue.claim(10)[0]
+        self.assertEqual(queue.run_pending(), {'done': 0, 'retried': 0, 'failed': 0})
+
+        Task.objects.update(run_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(queue.run_pending()['done'], 1)
+        # The first worker finishing late records nothing and its writes roll back.
+        self.assertEqual(queue.run(stale), 'RUNNING')
+        self.assertEqual(User.objects.count(), 1)
+        self.assertEqual(Task.objects.get().attempts, 2)
+
+    def test_purge_and_run_tasks_command(self):
+        for n in range(3):
+            queue.enqueue('test.record', {'n': n})
+        out = StringIO()
+        call_command('run_tasks', once=True, stdout=out)
+        self.assertIn('3 done', out.getvalue())
+        Task.objects.update(finished_at=timezone.now() - timedelta(days=8))
+        call_command('retry_tasks', purge_days=7, stdout=StringIO())
+        self.assertFalse(Task.objects.exists())
+
+    def test_database_storage(self):
+        storage = DatabaseStorage()
+        name = storage.save('staged/cover.png', ContentFile(b'png-bytes'))
+        self.assertEqual((storage.size(name), storage.open(name).read()), (9, b'png-bytes'))
+        storage.delete(name)
+        self.assertFalse(storage.exists(name))
+
+
+@override_settings(EMAIL_BACKEND='tasks.mail.QueuedEmailBackend',
+                   TASKS_EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class QueuedEmailTests(TestCase):
+
+    def test_mail_is_sent_by_the_worker(self):
+        message = mail.EmailMultiAlternatives('Welcome', 'Hello', 'library@example.com', ['reader@example.com'])
+        message.attach_alternative('<p>Hello</p>', 'text/html')
+        message.attach('card.bin', b'\x00\x01', 'application/octet-stream')
+        message.send()
+        self.assertEqual(len(mail.outbox), 0)
+
+        queue.run_pending()
+        self.assertEqual(len(mail.outbox), 1)
+        sent = mail.outbox[0]
+        self.assertEqual((sent.subject, sent.to, sent.from_email), ('Welcome', ['reader@example.com'], 'library@example.com'))
+        self.assertEqual(sent.alternatives[0][0], '<p>Hello</p>')
+        self.assertEqual(sent.attachments[0][1], b'\x00\x01')
+
+    @override_settings(DJOSER={**settings.DJOSER, 'PASSWORD_RESET_CONFIRM_URL': 'reset/{uid}/{token}'})
+    def test_password_reset_mail_is_queued(self):
+        User.objects.create_user(username='reader', email='reader@example.com', password='pass')
+        response = APIClient().post('/api/v1/auth/users/reset_password/', {'email': 'reader@example.com'})
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual((len(mail.outbox), Task.objects.filter(name='tasks.send_email').count()), (0, 1))
+        queue.run_pending()
+        self.assertEqual(mail.outbox[0].to, ['reader@example.com'])
+
+
+class TaskEndpointTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        patcher = mock.patch.dict(queue._handlers, {'test.noop': lambda: None})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        queue.enqueue('test.noop')
+
+    @override_settings(TASKS_CRON_SECRET='s3cret')
+    def test_cron_secret_runs_due_tasks(self):
+        self.assertEqual(self.client.get('/api/v1/tasks/run/').status_code, 401)
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertEqual(self.client.get('/api/v1/tasks/run/').status_code, 401)
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer s3cret')
+        response = self.client.get('/api/v1/tasks/run/')
+        self.assertEqual((response.status_code, response.data['done']), (200, 1))
+        self.assertEqual(self.client.get('/api/v1/tasks/').status_code, 401)
+
+    def test_staff_see_counts(self):
+        staff = User.objects.create_user(username='staff', email='staff@example.com', password='pass', is_staff=True)
+        self.client.force_authenticate(staff)
+        self.assertEqual(self.client.get('/api/v1/tasks/').data, {'PENDING': 1, 'RUNNING': 0, 'DONE': 0, 'FAILED': 0})
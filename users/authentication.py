@@ -0,0 +1,113 @@
+from django.conf import settings
+from django.db.models import F
+from django.core.cache import cache
+from django.utils.dateparse import parse_date
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from django.contrib.auth import get_user_model
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+
+User = get_user_model()
+
+TOKEN_VERSION_KEY = 'auth:token-version:{}'
+INACTIVE = -1
+
+
+def cache_token_version(user_id, version, is_active=True):
+    # Inactive users are cached as a version no token carries, so they are rejected without a query.
+    # The entry expires so a worker whose cache missed a revocation picks it up within the timeout.
+    cache.set(TOKEN_VERSION_KEY.format(user_id), version if is_active else INACTIVE,
+              timeout=settings.JWT_TOKEN_VERSION_CACHE_TIMEOUT)
+
+
+def revoke_user_tokens(user_id):
+    """Invalidate every token issued to the user so far."""
+    User.objects.filter(pk=user_id).update(token_version=F('token_version') + 1)
+    row = User.objects.filter(pk=user_id).values_list('token_version', 'is_active').first()
+    if row is None:
+        cache.delete(TOKEN_VERSION_KEY.format(user_id))
+    else:
+        cache_token_version(user_id, *row)
+
+
+class ClaimsUser:
+    """
+    Request user built from token claims with no query. Anything the claims do
+    not cover is read from the real User, loaded on first use, so views that
+    need profile fields keep working.
+    """
+    is_authenticated = True
+    is_anonymous = False
+    is_active = True
+
+    def __init__(self, token):
+        self.__dict__.update(
+            token=token,
+            id=token[api_settings.USER_ID_CLAIM],
+            pk=token[api_settings.USER_ID_CLAIM],
+            member_id=token.get('member_id'),
+        )
+        if 'is_staff' in token:
+            self.__dict__['is_staff'] = token['is_staff']
+
+    @cached_property
+    def user(self):
+        return User.objects.get(pk=self.pk)
+
+    @cached_property
+    def member(self):
+        from book.models import Member
+
+        if self.member_id is None:
+            return self.user.member
+        user = User(pk=self.pk, username=self.token.get('username', ''), email=self.token.get('email', ''))
+        return Member(pk=self.member_id, user=user, membership_date=parse_date(self.token.get('member_since') or ''))
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.user, name)
+
+    def __setattr__(self, name, value):
+        if name in self.__dict__ or name in ('user', 'member'):
+            self.__dict__[name] = value
+        else:
+            setattr(self.user, name, value)
+
+    def __eq__(self, other):
+        return isinstance(other, (ClaimsUser, User)) and other.pk == self.pk
+
+    def __hash__(self):
+        return hash(self.pk)
+
+    def __str__(self):
+        return self.token.get('username') or str(self.pk)
+
+
+class StatelessJWTAuthentication(JWTStatelessUserAuthentication):
+    """
+    JWT authentication that trusts the token's claims instead of loading the
+    user on every request. Revocation is checked against the user's token
+    version, read from the cache; the database is only consulted on a miss.
+    """
+
+    def get_user(self, validated_token):
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        user_id = validated_token[api_settings.USER_ID_CLAIM]
+        version = cache.get(TOKEN_VERSION_KEY.format(user_id))
+        if version is None:
+            row = User.objects.filter(pk=user_id).values_list('token_version', 'is_active').first()
+            if row is None:
+                raise AuthenticationFailed(_("User not found"), code='user_not_found')
+            cache_token_version(user_id, *row)
+            version = row[0] if row[1] else INACTIVE
+
+        if version == INACTIVE:
+            raise AuthenticationFailed(_("User is inactive"), code='user_inactive')
+        if validated_token.get('ver', 0) != version:
+            raise AuthenticationFailed(_("Token has been revoked"), code='token_revoked')
+        return ClaimsUser(validated_token)
@@ -0,0 +1,57 @@
+import time
+import statistics
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.core.management.base import BaseCommand
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from book import synthetic
+from book.models import Member
+from book.views import BorrowRecordViewSet
+from users.authentication import StatelessJWTAuthentication
+from users.serializers import TokenObtainPairSerializer
+
+
+class Command(BaseCommand):
+    help = "Compare the database-backed and stateless JWT modes on an authenticated endpoint."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--history', type=int, default=10_000, help="Synthetic borrow records to create first.")
+        parser.add_argument('--clear', action='store_true', help="Delete the synthetic data afterwards.")
+
+    def handle(self, *args, **options):
+        synthetic.generate_catalog(2_000)
+        synthetic.generate_members(500)
+        synthetic.generate_borrow_history(options['history'])
+        member = Member.objects.filter(pk__in=synthetic.synthetic_members()).select_related('user').first()
+        token = TokenObtainPairSerializer.get_token(member.user).access_token
+        factory = APIRequestFactory()
+
+        self.stdout.write(f"{'mode':<12} {'auth µs':>10} {'request µs':>12} {'p95 µs':>10} {'auth q/req':>11} {'q/req':>7}")
+        for label, authentication in (('database', JWTAuthentication), ('stateless', StatelessJWTAuthentication)):
+            view = BorrowRecordViewSet.as_view({'get': 'list'}, authentication_classes=[authentication])
+            auth_timings, timings, auth_queries, queries = [], [], 0, 0
+            for _ in range(options['requests']):
+                request = factory.get('/api/v1/borrowrecords/', HTTP_AUTHORIZATION=f'JWT {token}')
+                with CaptureQueriesContext(connection) as ctx:
+                    started = time.perf_counter()
+                    authentication().authenticate(Request(request))
+                    auth_timings.append((time.perf_counter() - started) * 1_000_000)
+                auth_queries += len(ctx.captured_queries)
+
+                with CaptureQueriesContext(connection) as ctx:
+                    started = time.perf_counter()
+                    view(request)
+                    timings.append((time.perf_counter() - started) * 1_000_000)
+                queries += len(ctx.captured_queries)
+            timings.sort()
+            p95 = timings[int(len(timings) * 0.95) - 1]
+            count = options['requests']
+            self.stdout.write(
+                f"{label:<12} {statistics.mean(auth_timings):>10.1f} {statistics.mean(timings):>12.1f} "
+                f"{p95:>10.1f} {auth_queries / count:>11.2f} {queries / count:>7.2f}")
+
+        if options['clear']:
+            synthetic.clear_catalog()
@@ -1,3 +1,5 @@
+from book.models import Member
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer as BaseTokenObtainPairSerializer
 from djoser.serializers import UserCreateSerializer as BaseUserCreateSerializer, UserSerializer as BaseUserSerializer
 
 
@@ -10,4 +12,20 @@ class UserSerializer(BaseUserSerializer):
     class Meta(BaseUserSerializer.Meta):
         ref_name = 'CustomUser'
         fields = ['id', 'username', 'email', 'first_name', 'last_name', 'phone_number', 'address']
-        
+
+
+class TokenObtainPairSerializer(BaseTokenObtainPairSerializer):
+    """Adds the claims StatelessJWTAuthentication needs to build request.user without a query."""
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token['ver'] = user.token_version
+        token['is_staff'] = user.is_staff
+        token['username'] = user.username
+        token['email'] = user.email
+        member = Member.objects.filter(user=user).values_list('id', 'membership_date').first()
+        if member is not None:
+            token['member_id'] = member[0]
+            token['member_since'] = member[1].isoformat()
+        return token
@@ -0,0 +1,35 @@
+from django.core.cache import cache
+from django.dispatch import receiver
+from django.db.models import DEFERRED
+from django.db.models.signals import post_delete, post_init, post_save
+from users.models import User
+from users.authentication import TOKEN_VERSION_KEY, revoke_user_tokens
+
+# Changing any of these invalidates the claims or the credentials behind existing tokens.
+TOKEN_FIELDS = ('password', 'is_active', 'is_staff', 'username', 'email')
+
+
+@receiver(post_init, sender=User)
+def remember_token_fields(sender, instance, **kwargs):
+    instance._loaded_token_fields = tuple(instance.__dict__.get(field, DEFERRED) for field in TOKEN_FIELDS)
+
+
+@receiver(post_save, sender=User)
+def revoke_tokens_on_change(sender, instance, created, raw=False, **kwargs):
+    current = tuple(instance.__dict__.get(field, DEFERRED) for field in TOKEN_FIELDS)
+    changed = any(value is not DEFERRED and loaded is not DEFERRED and value != loaded
+                  for value, loaded in zip(current, instance._loaded_token_fields))
+    instance._loaded_token_fields = current
+    if not raw and not created and changed:
+        revoke_user_tokens(instance.pk)
+        instance.refresh_from_db(fields=['token_version'])
+
+
+@receiver(post_delete, sender='book.Member')
+def revoke_tokens_on_member_delete(sender, instance, **kwargs):
+    revoke_user_tokens(instance.user_id)
+
+
+@receiver(post_delete, sender=User)
+def forget_token_version(sender, instance, **kwargs):
+    cache.delete(TOKEN_VERSION_KEY.format(instance.pk))
@@ -1,3 +1,96 @@
+from unittest import mock
+from django.db import connection
+from django.core.cache import cache
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from book.models import Author, Book, BorrowRecord, Category, Member
+from book.views import BookViewSet, BorrowRecordViewSet
+from users.models import User
+from users.authentication import TOKEN_VERSION_KEY, StatelessJWTAuthentication
+from users.serializers import TokenObtainPairSerializer
 
-# Create your tests here.
+
+@mock.patch.object(BookViewSet, 'authentication_classes', [StatelessJWTAuthentication])
+@mock.patch.object(BorrowRecordViewSet, 'authentication_classes', [StatelessJWTAuthentication])
+class StatelessJWTAuthenticationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader', email='reader@example.com', password='pass')
+        cls.member = Member.objects.create(user=cls.user)
+        other = Member.objects.create(user=User.objects.create_user(
+            username='other', email='other@example.com', password='pass'))
+        author = Author.objects.create(name='Author', biography='Bio')
+        category = Category.objects.create(name='Category')
+        cls.book = Book.objects.create(title='Dune', author=author, category=category, isbn='9780000000001')
+        cls.other_book = Book.objects.create(title='Emma', author=author, category=category, isbn='9780000000002')
+        BorrowRecord.objects.create(book=cls.other_book, member=other)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def authenticate(self, user=None):
+        token = TokenObtainPairSerializer.get_token(user or self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'JWT {token}')
+        return token
+
+    def test_token_carries_claims(self):
+        token = self.authenticate()
+        self.assertEqual(token['member_id'], self.member.pk)
+        self.assertFalse(token['is_staff'])
+        self.assertEqual(token['ver'], 0)
+
+    def test_obtained_tokens_carry_claims(self):
+        response = self.client.post('/api/v1/auth/jwt/create/', {'username': 'reader', 'password': 'pass'})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(AccessToken(response.data['access'])['member_id'], self.member.pk)
+
+    def test_no_auth_queries_in_steady_state(self):
+        self.authenticate()
+        self.client.get('/api/v1/borrowrecords/')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/v1/borrowrecords/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 0)
+        sql = '\n'.join(query['sql'] for query in ctx.captured_queries)
+        self.assertNotIn('users_user', sql)
+        self.assertNotIn('"book_member"', sql)
+
+    def test_borrow_uses_member_claim(self):
+        self.authenticate()
+        self.client.get('/api/v1/borrowrecords/')
+        response = self.client.post(f'/api/v1/books/{self.book.pk}/borrow/')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.data['member']['name'], 'reader')
+        self.assertTrue(BorrowRecord.objects.filter(book=self.book, member=self.member, status='BORROWED').exists())
+
+    def test_password_change_revokes_tokens(self):
+        self.authenticate()
+        self.assertEqual(self.client.get('/api/v1/borrowrecords/').status_code, 200)
+        self.user.set_password('new-pass')
+        self.user.save()
+        self.assertEqual(self.client.get('/api/v1/borrowrecords/').status_code, 401)
+        self.authenticate(User.objects.get(pk=self.user.pk))
+        self.assertEqual(self.client.get('/api/v1/borrowrecords/').status_code, 200)
+
+    def test_deactivated_user_is_rejected(self):
+        self.authenticate()
+        self.user.is_active = False
+        self.user.save(update_fields=['is_active'])
+        self.assertEqual(self.client.get('/api/v1/borrowrecords/').status_code, 401)
+
+    @mock.patch.object(cache, 'set', wraps=cache.set)
+    def test_token_version_is_cached_briefly(self, cache_set):
+        self.authenticate()
+        self.assertEqual(self.client.get('/api/v1/borrowrecords/').status_code, 200)
+        cache_set.assert_called_with(TOKEN_VERSION_KEY.format(self.user.pk), 0, timeout=60)
+
+    def test_token_without_member_claim_falls_back_to_lookup(self):
+        token = AccessToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'JWT {token}')
+        response = self.client.get('/api/v1/borrowrecords/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 0)